@@ -0,0 +1,107 @@
+"""BlogPost loading 방식별 row 수와 실행 시간 비교
+
+tag 가 0, 5, 50 개인 post 목록을 가져올 때
+joinedload(tags) (이전 기본값) 와 loading profile 을 비교한다.
+
+Use:
+    PYTHONPATH=src/blog python src/bench/bench_loading.py
+"""
+import os
+import sys
+import time
+import statistics
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+from database import Database
+from database.model import BlogPost
+from service.blog import BlogService
+from service.cache import NullCache
+
+POSTS = 100
+REPEAT = 5
+ARTICLE = "lorem ipsum dolor sit amet " * 80
+
+
+def seed(bs: BlogService, tag_count: int) -> int:
+    email = f"tags{tag_count}@example.com"
+    author_id = bs.add_author(email, f"tags{tag_count}")
+    tags = [f"tag{idx}" for idx in range(tag_count)]
+    bs.bulk_import(
+        {
+            "type": "post",
+            "title": f"title {idx}",
+            "article": ARTICLE,
+            "author_email": email,
+            "tags": tags,
+        }
+        for idx in range(POSTS)
+    )
+    return author_id
+
+
+def joined(bs: BlogService, author):
+    with bs.db.session_scope() as s:
+        return (
+            s.query(BlogPost)
+            .filter(BlogPost.author_id == author.id)
+            .options(joinedload(BlogPost.tags))
+            .order_by(BlogPost.id.desc())
+            .limit(POSTS)
+            .all()
+        )
+
+
+def measure(db: Database, func):
+    """statement 수, 가져온 row 수, 실행 시간 중간값(ms)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    rows = 0
+    with db.engine.connect() as conn:
+        for statement, parameters in statements:
+            rows += conn.exec_driver_sql(
+                f"SELECT COUNT(*) FROM ({statement}) AS counted", parameters
+            ).scalar()
+
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(statements), rows, statistics.median(timings)
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "bench_loading.db")
+    db = Database(f"sqlite:///{path}")
+    db.create_all()
+    bs = BlogService(cache=NullCache())
+    bs.db = db
+
+    print(f"{POSTS} posts per listing, median of {REPEAT} runs")
+    print(f"{'tags':>5} {'strategy':>10} {'queries':>8} {'rows':>8} {'ms':>9}")
+    for tag_count in [0, 5, 50]:
+        author = bs.get_author_by_id(seed(bs, tag_count))
+        strategies = {
+            "joined": lambda: joined(bs, author),
+            "summary": lambda: bs.get_posts_by_author(author, POSTS, profile="summary"),
+            "card": lambda: bs.get_posts_by_author(author, POSTS, profile="card"),
+            "full": lambda: bs.get_posts_by_author(author, POSTS, profile="full"),
+        }
+        for name, func in strategies.items():
+            queries, rows, ms = measure(db, func)
+            print(f"{tag_count:>5} {name:>10} {queries:>8} {rows:>8} {ms:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
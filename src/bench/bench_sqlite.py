@@ -0,0 +1,110 @@
+"""sqlite 성능 설정 전후 read/write 처리량 비교
+
+DB_SQLITE_TUNING 을 끈 경우(rollback journal, PRAGMA 기본값, writer 직렬화 없음)와
+켠 경우(WAL, PRAGMA, WriterQueue)에 read 만, write 만, read 와 write 를 동시에 실행해서
+초당 처리량과 database is locked 등 오류 수를 비교한다.
+
+Use:
+    PYTHONPATH=src/blog python src/bench/bench_sqlite.py
+    PYTHONPATH=src/blog python src/bench/bench_sqlite.py --seconds 5 --readers 8 --writers 4
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+from typing import Callable, List
+from sqlalchemy.exc import SQLAlchemyError
+from database import Database
+from service.blog import BlogService
+from service.cache import NullCache
+from service.views import ViewCounter
+import datagen
+
+
+def _service(tuning: bool) -> BlogService:
+    os.environ["DB_SQLITE_TUNING"] = "true" if tuning else "false"
+    db = Database(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    db.create_all()
+    bs = BlogService(cache=NullCache(), view_counter=ViewCounter(db))
+    bs.db = db
+    datagen.seed(bs, datagen.SIZES["small"])
+    return bs
+
+
+def _run(workers: List[Callable], seconds: float) -> List[dict]:
+    """worker 마다 thread 하나로 seconds 동안 반복 실행한 횟수와 오류 수"""
+    results = [{"ops": 0, "errors": 0} for _ in workers]
+    deadline = time.perf_counter() + seconds
+
+    def loop(idx: int, func: Callable):
+        rng = random.Random(idx)
+        while time.perf_counter() < deadline:
+            try:
+                func(rng)
+                results[idx]["ops"] += 1
+            except SQLAlchemyError:
+                results[idx]["errors"] += 1
+
+    threads = [
+        threading.Thread(target=loop, args=(idx, func))
+        for idx, func in enumerate(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def measure(tuning: bool, args) -> dict:
+    bs = _service(tuning)
+    spec = datagen.SIZES["small"]
+    author = bs.get_author_by_id(1)
+
+    def read(rng):
+        bs.get_post_by_id(rng.randrange(1, spec.posts + 1))
+        bs.get_posts_by_author_page(author, limit=10)
+
+    def write(rng):
+        post_id = rng.randrange(1, spec.posts + 1)
+        bs.add_comment(post_id, author, "bench")
+        bs.mod_post_partial(post_id, new_title=f"title {rng.random()}")
+
+    row = {}
+    for name, readers, writers in [
+        ("read", args.readers, 0),
+        ("write", 0, args.writers),
+        ("mixed", args.readers, args.writers),
+    ]:
+        results = _run([read] * readers + [write] * writers, args.seconds)
+        row[name] = {
+            "read_ops_per_sec": sum(r["ops"] for r in results[:readers]) / args.seconds,
+            "write_ops_per_sec": sum(r["ops"] for r in results[readers:])
+            / args.seconds,
+            "errors": sum(r["errors"] for r in results),
+        }
+    bs.view_counter.stop()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'':10}{'workload':10}{'read ops/s':>12}{'write ops/s':>13}{'errors':>8}")
+    for tuning in [False, True]:
+        for name, result in measure(tuning, args).items():
+            print(
+                f"{'tuned' if tuning else 'default':10}{name:10}"
+                f"{result['read_ops_per_sec']:12.1f}"
+                f"{result['write_ops_per_sec']:13.1f}{result['errors']:8d}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""benchmark 용 결정적 data 생성기
+
+같은 seed 와 크기면 항상 같은 data 를 만든다. tag 는 Zipf 분포로 뽑아서
+소수의 인기 tag 에 post 가 몰리도록 한다.
+"""
+import random
+import datetime
+from typing import Iterator, List
+from sqlalchemy import func, select, update
+from database.model import BlogPost, Comment
+from service.blog import BlogService
+
+
+CATEGORIES = ["python", "javascript", "go", "rust", "java", "c++", "devops", "db"]
+WORDS = (
+    "python pip wheel database index query cache async engine pool session "
+    "cursor page tag author post comment search token latency thread worker"
+).split()
+
+
+class DatasetSpec(object):
+    def __init__(
+        self,
+        name: str,
+        authors: int,
+        posts: int,
+        tags: int,
+        tags_per_post: int = 5,
+        comments: int = 0,
+        seed: int = 42,
+    ):
+        self.name = name
+        self.authors = authors
+        self.posts = posts
+        self.tags = tags
+        self.tags_per_post = tags_per_post
+        self.comments = comments
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+SIZES = {
+    "small": DatasetSpec("small", authors=20, posts=1000, tags=100, comments=2000),
+    "medium": DatasetSpec("medium", authors=200, posts=10000, tags=1000, comments=20000),
+    "large": DatasetSpec(
+        "large", authors=2000, posts=100000, tags=5000, comments=200000
+    ),
+}
+
+
+def author_email(idx: int) -> str:
+    return f"author{idx}@example.com"
+
+
+def tag_name(idx: int) -> str:
+    return f"tag{idx}"
+
+
+class ZipfSampler(object):
+    """rank k 가 1 / k^s 에 비례하는 확률로 뽑힌다."""
+
+    def __init__(self, n: int, rng: random.Random, s: float = 1.1):
+        self.population = list(range(n))
+        self.weights = [1 / (k + 1) ** s for k in range(n)]
+        self.rng = rng
+
+    def sample(self, k: int) -> List[int]:
+        picked = self.rng.choices(self.population, self.weights, k=k)
+        return list(dict.fromkeys(picked))
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def records(spec: DatasetSpec) -> Iterator[dict]:
+    """bulk_import 에 넣을 record"""
+    rng = random.Random(spec.seed)
+    tags = ZipfSampler(spec.tags, rng)
+    start = datetime.datetime(2020, 1, 1)
+    for name in CATEGORIES:
+        yield {"type": "category", "name": name}
+    for idx in range(spec.authors):
+        yield {"type": "author", "email": author_email(idx), "name": f"author{idx}"}
+    for idx in range(spec.posts):
+        yield {
+            "type": "post",
+            "title": sentence(rng, 6),
+            "article": sentence(rng, 200),
+            "author_email": author_email(rng.randrange(spec.authors)),
+            "category": rng.choice(CATEGORIES),
+            "tags": [tag_name(tag) for tag in tags.sample(spec.tags_per_post)],
+            "date_published": start + datetime.timedelta(minutes=idx * 7),
+        }
+
+
+def seed(bs: BlogService, spec: DatasetSpec, batch_size: int = 2000):
+    """빈 database 에 spec 만큼 data 를 넣는다."""
+    report = bs.bulk_import(records(spec), batch_size=batch_size)
+    if report.errors:
+        raise RuntimeError(f"seed failed: {report.errors[0]}")
+
+    rng = random.Random(spec.seed + 1)
+    with bs.db.session_scope() as s:
+        post_ids = [row[0] for row in s.execute(select(BlogPost.id))]
+        author_ids = [row[0] for row in s.execute(select(BlogPost.author_id).distinct())]
+        rows = []
+        for _ in range(spec.comments):
+            rows.append(
+                {
+                    "post_id": rng.choice(post_ids),
+                    "author_id": rng.choice(author_ids),
+                    "content": sentence(rng, 12),
+                }
+            )
+            if len(rows) >= batch_size:
+                s.execute(Comment.__table__.insert(), rows)
+                rows = []
+        if rows:
+            s.execute(Comment.__table__.insert(), rows)
+        counts = (
+            select(func.count(Comment.id))
+            .where(Comment.post_id == BlogPost.id)
+            .scalar_subquery()
+        )
+        s.execute(update(BlogPost.__table__).values(comment_count=counts))
+    return report
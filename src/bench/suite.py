@@ -0,0 +1,457 @@
+"""BlogService benchmark suite
+
+dataset 크기별로 public method 의 p50/p99 latency 와 처리량을 측정하고
+결과를 JSON 으로 저장한다. baseline 과 비교해서 single thread p50 이 느려진 method 가 있으면 exit code 1 로 종료한다.
+
+sqlite 는 항상 실행하고 BENCH_MYSQL_URL 이 있으면 연결 가능한 경우 mysql 도 실행한다.
+
+Use:
+    PYTHONPATH=src/blog python src/bench/suite.py --sizes small --compare src/bench/baseline.json
+    PYTHONPATH=src/blog python src/bench/suite.py --sizes small --update-baseline src/bench/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from sqlalchemy.exc import SQLAlchemyError
+from database import Database
+from service.blog import BlogService
+from service.cache import NullCache
+from service.page_cache import PostPageCache
+from service.views import ViewCounter
+import datagen
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+DEFAULT_TOLERANCE = 1.0
+# 이보다 작은 차이는 측정 오차로 본다.
+MIN_DELTA_MS = 1.0
+# concurrent 결과는 GIL 과 scheduling 영향으로 편차가 커서 기록만 하고 비교하지 않는다.
+GATED_MODES = ("single",)
+
+
+class Context(object):
+    """benchmark operation 이 공유하는 상태"""
+
+    def __init__(self, bs: BlogService, spec: datagen.DatasetSpec):
+        self.bs = bs
+        self.spec = spec
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.comment_ids: List[int] = []
+        with bs.db.session_scope() as s:
+            self.category_ids = {
+                name: id
+                for id, name in s.execute("SELECT id, name FROM blog_category")
+            }
+        self.authors = [
+            bs.get_author_by_email(datagen.author_email(idx))
+            for idx in range(min(spec.authors, 50))
+        ]
+
+    def unique(self) -> int:
+        return next(self.counter)
+
+    def post_id(self, rng: random.Random) -> int:
+        return rng.randint(1, self.spec.posts)
+
+    def author(self, rng: random.Random):
+        return rng.choice(self.authors)
+
+    def category_name(self, rng: random.Random) -> str:
+        return rng.choice(datagen.CATEGORIES)
+
+    def tag_names(self, rng: random.Random, n: int = 5) -> List[str]:
+        return [datagen.tag_name(rng.randrange(self.spec.tags)) for _ in range(n)]
+
+
+def _add_comment(ctx: Context, rng):
+    comment_id = ctx.bs.add_comment(ctx.post_id(rng), ctx.author(rng), "bench")
+    with ctx.lock:
+        ctx.comment_ids.append(comment_id)
+
+
+def _delete_comment(ctx: Context, rng):
+    with ctx.lock:
+        comment_id = ctx.comment_ids.pop() if ctx.comment_ids else None
+    if comment_id is None:
+        _add_comment(ctx, rng)
+        return
+    ctx.bs.delete_comment(comment_id)
+
+
+def _mod_author(ctx: Context, rng):
+    # mod_author_partial 이 version 을 올리므로 최신 author 를 읽어서 바꾼다.
+    author = ctx.bs.get_author_by_id(ctx.author(rng).id)
+    author.first_name = f"bench{ctx.unique()}"
+    ctx.bs.mod_author(author)
+
+
+def _deep_page(method: Callable, arg, pages: int = 5):
+    """cursor 를 따라 pages 만큼 넘긴다."""
+    cursor = None
+    for _ in range(pages):
+        page = method(arg, limit=20, cursor=cursor)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+
+# (이름, 읽기 전용 여부, 함수)
+OPERATIONS = [
+    ("get_author_by_id", True, lambda c, r: c.bs.get_author_by_id(c.author(r).id)),
+    (
+        "get_author_by_email",
+        True,
+        lambda c, r: c.bs.get_author_by_email(
+            datagen.author_email(r.randrange(c.spec.authors))
+        ),
+    ),
+    (
+        "get_category_by_id",
+        True,
+        lambda c, r: c.bs.get_category_by_id(r.choice(list(c.category_ids.values()))),
+    ),
+    ("get_category_by_name", True, lambda c, r: c.bs.get_category_by_name(
+        c.category_name(r)
+    )),
+    ("get_post_by_id", True, lambda c, r: c.bs.get_post_by_id(c.post_id(r))),
+    ("get_post_page", True, lambda c, r: c.bs.get_post_page(c.post_id(r))),
+    ("get_post_summary", True, lambda c, r: c.bs.get_post_summary(c.post_id(r))),
+    ("get_post_article", True, lambda c, r: c.bs.get_post_article(c.post_id(r))),
+    (
+        "get_posts_by_author",
+        True,
+        lambda c, r: c.bs.get_posts_by_author(c.author(r), 20, r.randrange(100)),
+    ),
+    (
+        "get_posts_by_category_name",
+        True,
+        lambda c, r: c.bs.get_posts_by_category_name(
+            c.category_name(r), 20, r.randrange(100)
+        ),
+    ),
+    (
+        "get_posts_by_author_page",
+        True,
+        lambda c, r: _deep_page(c.bs.get_posts_by_author_page, c.author(r)),
+    ),
+    (
+        "get_posts_by_category_name_page",
+        True,
+        lambda c, r: _deep_page(
+            c.bs.get_posts_by_category_name_page, c.category_name(r)
+        ),
+    ),
+    (
+        "get_post_summaries_by_author",
+        True,
+        lambda c, r: _deep_page(c.bs.get_post_summaries_by_author, c.author(r)),
+    ),
+    (
+        "get_post_summaries_by_category_name",
+        True,
+        lambda c, r: _deep_page(
+            c.bs.get_post_summaries_by_category_name, c.category_name(r)
+        ),
+    ),
+    ("get_recent_posts", True, lambda c, r: c.bs.get_recent_posts(limit=20)),
+    # datagen 의 post 는 2020-01-01 부터 7분 간격
+    ("get_archive_posts", True, lambda c, r: _deep_page(c.bs.get_archive_posts, 2020)),
+    ("get_archive_months", True, lambda c, r: c.bs.get_archive_months()),
+    (
+        "get_posts_by_tags",
+        True,
+        lambda c, r: c.bs.get_posts_by_tags(c.tag_names(r, 3), limit=20),
+    ),
+    (
+        "get_posts_by_tags_all",
+        True,
+        lambda c, r: c.bs.get_posts_by_tags(
+            [datagen.tag_name(0), datagen.tag_name(r.randrange(1, 10))],
+            mode="all",
+            limit=20,
+        ),
+    ),
+    ("get_comments", True, lambda c, r: c.bs.get_comments(c.post_id(r), limit=20)),
+    (
+        "get_comments_by_posts",
+        True,
+        lambda c, r: c.bs.get_comments_by_posts(
+            [c.post_id(r) for _ in range(20)], limit_per_post=3
+        ),
+    ),
+    (
+        "search_posts",
+        True,
+        lambda c, r: c.bs.search_posts(" ".join(r.sample(datagen.WORDS, 2))),
+    ),
+    ("get_most_viewed_posts", True, lambda c, r: c.bs.get_most_viewed_posts(10)),
+    ("get_tags", True, lambda c, r: c.bs.get_tags()),
+    ("get_top_tags", True, lambda c, r: c.bs.get_top_tags(20)),
+    ("get_tags_page", True, lambda c, r: c.bs.get_tags_page(limit=20)),
+    ("add_view", False, lambda c, r: c.bs.add_view(c.post_id(r))),
+    (
+        "add_author",
+        False,
+        lambda c, r: c.bs.add_author(f"bench{c.unique()}@example.com", "bench"),
+    ),
+    (
+        "mod_author_partial",
+        False,
+        lambda c, r: c.bs.mod_author_partial(c.author(r).id, first_name="bench"),
+    ),
+    ("mod_author", False, _mod_author),
+    ("add_category", False, lambda c, r: c.bs.add_category(f"bench{c.unique()}")),
+    (
+        "add_post",
+        False,
+        lambda c, r: c.bs.add_post(
+            "bench", datagen.sentence(r, 200), c.author(r), tags=c.tag_names(r)
+        ),
+    ),
+    (
+        "mod_post_partial",
+        False,
+        lambda c, r: c.bs.mod_post_partial(
+            c.post_id(r), new_title="bench", new_tags=c.tag_names(r)
+        ),
+    ),
+    ("reconcile_post_counts", False, lambda c, r: c.bs.reconcile_post_counts()),
+    ("add_comment", False, _add_comment),
+    ("delete_comment", False, _delete_comment),
+    (
+        "bulk_import",
+        False,
+        lambda c, r: c.bs.bulk_import(
+            {
+                "type": "post",
+                "title": "bulk",
+                "article": "bulk",
+                "author_email": datagen.author_email(0),
+                "tags": c.tag_names(r),
+            }
+            for _ in range(50)
+        ),
+    ),
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(timings: List[float], elapsed: float, errors: int) -> dict:
+    return {
+        "count": len(timings),
+        "p50_ms": percentile(timings, 50) * 1000 if timings else None,
+        "p99_ms": percentile(timings, 99) * 1000 if timings else None,
+        "ops_per_sec": len(timings) / elapsed if elapsed else 0.0,
+        "errors": errors,
+    }
+
+
+def run_single(ctx: Context, func, iterations: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    timings, errors = [], 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        op_start = time.perf_counter()
+        try:
+            func(ctx, rng)
+            timings.append(time.perf_counter() - op_start)
+        except SQLAlchemyError:
+            errors += 1
+    return summarize(timings, time.perf_counter() - start, errors)
+
+
+def run_concurrent(
+    ctx: Context, func, iterations: int, workers: int, seed: int
+) -> dict:
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        timings, errors = [], 0
+        for _ in range(iterations // workers):
+            op_start = time.perf_counter()
+            try:
+                func(ctx, rng)
+                timings.append(time.perf_counter() - op_start)
+            except SQLAlchemyError:
+                errors += 1
+        return timings, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(worker, [seed + idx for idx in range(workers)]))
+    elapsed = time.perf_counter() - start
+    timings = [timing for result in results for timing in result[0]]
+    return summarize(timings, elapsed, sum(result[1] for result in results))
+
+
+def best_of(rounds: int, run: Callable[[], dict]) -> dict:
+    """rounds 번 측정해서 p50 이 가장 낮은 결과
+
+    다른 process 때문에 생기는 잡음을 줄인다.
+    """
+    results = [run() for _ in range(rounds)]
+    return min(results, key=lambda result: result["p50_ms"] or float("inf"))
+
+
+def run_dataset(
+    label: str, db: Database, spec: datagen.DatasetSpec, args
+) -> Dict[str, dict]:
+    db.drop_all()
+    db.create_all()
+    bs = BlogService(
+        cache=NullCache(),
+        view_counter=ViewCounter(db),
+        page_cache=PostPageCache(maxsize=0),
+    )
+    bs.db = db
+    start = time.perf_counter()
+    datagen.seed(bs, spec)
+    print(f"[{label}/{spec.name}] seeded in {time.perf_counter() - start:.1f}s")
+
+    ctx = Context(bs, spec)
+    results = {}
+    for idx, (name, read_only, func) in enumerate(OPERATIONS):
+        if args.only and name not in args.only:
+            continue
+        key = f"{label}/{spec.name}/single/{name}"
+        results[key] = best_of(
+            args.rounds,
+            lambda: run_single(ctx, func, args.iterations, spec.seed + idx),
+        )
+        print_result(key, results[key])
+        if read_only and args.workers > 1:
+            key = f"{label}/{spec.name}/concurrent{args.workers}/{name}"
+            results[key] = best_of(
+                args.rounds,
+                lambda: run_concurrent(
+                    ctx, func, args.iterations, args.workers, spec.seed + idx
+                ),
+            )
+            print_result(key, results[key])
+    bs.view_counter.stop()
+    return results
+
+
+def print_result(key: str, result: dict):
+    if result["p50_ms"] is None:
+        print(f"{key:<70} errors={result['errors']}")
+        return
+    print(
+        f"{key:<70} p50={result['p50_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+        f"{result['ops_per_sec']:9.1f} ops/s errors={result['errors']}"
+    )
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """baseline 보다 p50 이 tolerance 이상 느려진 항목"""
+    regressions = []
+    for key, base in baseline["results"].items():
+        if key.split("/")[2] not in GATED_MODES:
+            continue
+        result = current["results"].get(key)
+        if result is None or result["p50_ms"] is None or base["p50_ms"] is None:
+            continue
+        limit = base["p50_ms"] * (1 + tolerance)
+        if result["p50_ms"] > limit and result["p50_ms"] - base["p50_ms"] > MIN_DELTA_MS:
+            regressions.append(
+                f"{key}: p50 {result['p50_ms']:.2f}ms > baseline "
+                f"{base['p50_ms']:.2f}ms (+{tolerance:.0%})"
+            )
+    return regressions
+
+
+def targets() -> List:
+    """benchmark 할 database 목록. mysql 은 연결 가능한 경우만 포함한다."""
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    dbs = [("sqlite", Database(f"sqlite:///{path}"))]
+    mysql_url = os.environ.get("BENCH_MYSQL_URL")
+    if mysql_url:
+        db = Database(mysql_url)
+        try:
+            with db.engine.connect():
+                pass
+            dbs.append(("mysql", db))
+        except SQLAlchemyError as e:
+            print(f"skip mysql: {e}")
+    return dbs
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["small"], choices=datagen.SIZES)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="측정할 method 이름")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="비교할 baseline JSON")
+    parser.add_argument("--update-baseline", help="결과를 baseline 으로 저장")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=float(os.environ.get("BENCH_TOLERANCE", DEFAULT_TOLERANCE)),
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {}
+    for label, db in targets():
+        for size in args.sizes:
+            results.update(run_dataset(label, db, datagen.SIZES[size], args))
+
+    output = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "workers": args.workers,
+            "rounds": args.rounds,
+            "sizes": {size: datagen.SIZES[size].to_dict() for size in args.sizes},
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.update_baseline, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.update_baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"no baseline at {args.compare}; run with --update-baseline first")
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, output, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,30 @@
 import os
+import time
+import atexit
 import logging
-from typing import Generator
-from sqlalchemy import create_engine
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+from sqlalchemy import create_engine, event, exc, insert
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.exc import SQLAlchemyError
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from .model import Base
+from . import search  # noqa: F401 검색 index 를 table 과 같이 만들도록 event 등록
+from . import migrate
+from .profiler import QueryProfiler, default_profiler, profiler_for
+from .replica import ROUND_ROBIN, ReplicaSet
+from .sqlite_tuning import (
+    WriterQueue,
+    install_pragmas,
+    is_file_sqlite,
+    optimize,
+    sqlite_pragmas,
+)
 
 
 log = logging.getLogger(f"app.{__name__}")
@@ -14,61 +32,590 @@ log = logging.getLogger(f"app.{__name__}")
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 
 
-class Singleton(type):
-    """Singleton.
-    @see: http://stackoverflow.com/questions/6760685/creating-a-singleton-in-python
+def _env_bool(name: str, default: str = "false") -> bool:
+    return os.environ.get(name, default).lower() in ["1", "true", "yes"]
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+class TimedQueuePool(QueuePool):
+    """connection 을 얻기까지 기다린 시간을 기록하는 QueuePool.
+
+    pool 이 고갈되면 checkout 이 대기하게 되므로 대기 시간으로 pool 부족을 확인한다.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.wait_count += 1
+                self.wait_time_total += elapsed
+                self.wait_time_max = max(self.wait_time_max, elapsed)
+
+
+def _install_fork_guard(engine: Engine):
+    """다른 process 에서 만들어진 connection 을 사용하지 않도록 한다.
+
+    prefork worker 가 부모 process 의 socket 을 공유하지 않게 checkout 시점에 pid 를 비교해서
+    다른 process 의 connection 은 버리고 새로 연결한다.
     """
 
-    _instances = {}
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        connection_record.info["pid"] = os.getpid()
 
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info["pid"] != pid:
+            connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+            raise exc.DisconnectionError(
+                "Connection record belongs to pid %s, attempting to check out in pid %s"
+                % (connection_record.info["pid"], pid)
+            )
 
 
-class Database(object):
+class _EngineRegistry(object):
+    """connection string 별로 engine 과 sessionmaker 를 process 내에서 공유한다.
 
-    __metaclass__ = Singleton
+    fork 된 process 에서는 부모의 engine 을 버리고 새로 만든다.
+    """
 
     def __init__(self):
-        connection_string = self._get_connection_string()
-        ECHO_SQL = bool(
-            os.environ.get("ECHO_SQL", "false").lower() in ["1", "true", "yes"]
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._engines: Dict[str, Engine] = {}
+        self._sessions: Dict[str, sessionmaker] = {}
+        self._writers: Dict[str, WriterQueue] = {}
+
+    def get(self, connection_string: str):
+        with self._lock:
+            if self._pid != os.getpid():
+                # 부모 process 의 socket 을 닫지 않도록 dispose 하지 않고 참조만 버린다.
+                self._engines.clear()
+                self._sessions.clear()
+                self._writers.clear()
+                self._pid = os.getpid()
+            if connection_string not in self._engines:
+                engine = create_engine(
+                    connection_string, **_engine_options(connection_string)
+                )
+                _install_fork_guard(engine)
+                if is_file_sqlite(connection_string) and _env_bool(
+                    "DB_SQLITE_TUNING", "true"
+                ):
+                    install_pragmas(engine, sqlite_pragmas())
+                    self._writers[connection_string] = WriterQueue()
+                    atexit.register(optimize, engine, os.getpid())
+                if _env_bool("DB_PROFILE"):
+                    default_profiler().attach(engine)
+                self._engines[connection_string] = engine
+                self._sessions[connection_string] = sessionmaker(
+                    autocommit=False,
+                    autoflush=False,
+                    bind=engine,
+                    expire_on_commit=False,
+                )
+            return self._engines[connection_string], self._sessions[connection_string]
+
+    def writer(self, connection_string: str) -> Optional[WriterQueue]:
+        """sqlite 성능 설정을 사용하는 engine 의 WriterQueue. 없으면 None"""
+        with self._lock:
+            return self._writers.get(connection_string)
+
+    def dispose(self):
+        """등록된 engine 을 모두 닫는다. sqlite 는 닫기 전에 PRAGMA optimize 를 실행한다."""
+        with self._lock:
+            for connection_string, engine in self._engines.items():
+                if connection_string in self._writers:
+                    optimize(engine)
+                engine.dispose()
+            self._engines.clear()
+            self._sessions.clear()
+            self._writers.clear()
+
+
+_registry = _EngineRegistry()
+
+
+def _engine_options(connection_string: str) -> dict:
+    """환경변수로부터 engine/pool 설정을 만든다.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE
+    """
+    options = {
+        "echo": _env_bool("ECHO_SQL"),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING"),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", -1),
+    }
+    if connection_string.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in connection_string or connection_string == "sqlite://":
+            # memory database 는 connection 마다 별개의 database 이므로 pool 을 바꾸지 않는다.
+            return options
+    options["poolclass"] = TimedQueuePool
+    options["pool_size"] = _env_int("DB_POOL_SIZE", 5)
+    options["max_overflow"] = _env_int("DB_MAX_OVERFLOW", 10)
+    options["pool_timeout"] = _env_int("DB_POOL_TIMEOUT", 30)
+    return options
+
+
+def insert_ignore(table, dialect_name: str, index_elements: List[str]):
+    """unique 충돌이 나는 row 는 무시하는 INSERT 문을 만든다.
+
+    sqlite 는 ON CONFLICT DO NOTHING, mysql 은 ON DUPLICATE KEY UPDATE 를 사용한다.
+    동시에 같은 row 를 입력해도 unique 제약 오류가 발생하지 않는다.
+
+    Args:
+        table: 입력할 Table
+        dialect_name (str): engine dialect 이름
+        index_elements (List[str]): unique 제약 column 이름
+
+    Returns:
+        insert statement
+    """
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(
+            index_elements=index_elements
         )
-        self.engine = create_engine(
-            connection_string, connect_args={"check_same_thread": False}, echo=ECHO_SQL,
+    elif dialect_name == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            {name: stmt.inserted[name] for name in index_elements}
         )
-        self.Session = sessionmaker(
-            autocommit=False, autoflush=False, bind=self.engine, expire_on_commit=False
+    return insert(table)
+
+
+def insert_or_add(table, dialect_name: str, index_elements: List[str], column: str):
+    """unique 충돌이 나면 기존 row 의 column 에 입력 값을 더하는 INSERT 문을 만든다.
+
+    sqlite 는 ON CONFLICT DO UPDATE, mysql 은 ON DUPLICATE KEY UPDATE 를 사용한다.
+    여러 row 를 한번에 입력해도 row 마다 더하는 값이 다를 수 있다.
+
+    Args:
+        table: 입력할 Table
+        dialect_name (str): engine dialect 이름
+        index_elements (List[str]): unique 제약 column 이름
+        column (str): 더할 column 이름
+
+    Returns:
+        insert statement
+    """
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: table.c[column] + stmt.excluded[column]},
+        )
+    elif dialect_name == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            {column: table.c[column] + stmt.inserted[column]}
+        )
+    return insert(table)
+
+
+_replica_sets: Dict[tuple, ReplicaSet] = {}
+_replica_sets_lock = threading.Lock()
+
+# 같은 thread/task 에서 마지막으로 write 한 시각. 직후의 read 는 primary 로 보낸다.
+_last_write: ContextVar[Optional[float]] = ContextVar("blog_last_write", default=None)
+_use_primary: ContextVar[bool] = ContextVar("blog_use_primary", default=False)
+
+
+class _Transaction(object):
+    """Database.transaction 으로 시작한 여러 session_scope 가 공유하는 session"""
+
+    def __init__(self, engine: Engine, session: Session):
+        self.engine = engine
+        self.session = session
+        self.after_commit: List[Callable[[], None]] = []
+        # identity map 은 weak reference 라서 service method 가 돌려준 id 만 남으면
+        # 객체가 사라진다. transaction 동안은 다시 조회할 때 재사용하도록 붙잡아 둔다.
+        self._objects = set()
+        event.listen(session, "pending_to_persistent", self._keep)
+        event.listen(session, "loaded_as_persistent", self._keep)
+
+    def _keep(self, session: Session, instance):
+        self._objects.add(instance)
+
+    def has_pending_write(self) -> bool:
+        """sqlite connection 이 write 를 시작해서 commit 전까지 write lock 을 잡고 있는지 여부
+
+        pysqlite 는 INSERT, UPDATE, DELETE 전에만 transaction 을 시작한다.
+        """
+        if self.engine.dialect.name != "sqlite" or not self.session.in_transaction():
+            return False
+        return self.session.connection().connection.dbapi_connection.in_transaction
+
+
+class IndependentWriteError(RuntimeError):
+    """sqlite 에서 이미 write 한 transaction 안의 independent block 이 write 하려는 경우
+
+    sqlite 는 writer 가 하나뿐이라 바깥 transaction 의 commit 을 기다리다
+    busy_timeout 뒤에 database is locked 로 실패한다.
+    """
+
+
+_transaction: ContextVar[Optional[_Transaction]] = ContextVar(
+    "blog_transaction", default=None
+)
+# independent block 이 잠시 멈춘 바깥 transaction
+_suspended: ContextVar[Tuple[_Transaction, ...]] = ContextVar(
+    "blog_suspended_transactions", default=()
+)
+
+
+def in_transaction() -> bool:
+    """같은 thread/task 에서 Database.transaction 이 진행 중인지 여부"""
+    return _transaction.get() is not None
+
+
+def after_commit(callback: Callable[[], None]):
+    """transaction 중이면 commit 후에, 아니면 바로 callback 을 실행한다."""
+    transaction = _transaction.get()
+    if transaction is None:
+        callback()
+    else:
+        transaction.after_commit.append(callback)
+
+
+def _replica_set(connection_string: str, urls: List[str]) -> ReplicaSet:
+    """primary 와 replica 목록 별로 replica 상태를 process 내에서 공유한다.
+
+    DB_REPLICA_POLICY, DB_REPLICA_EJECT_SECONDS
+    """
+    key = (connection_string, tuple(urls))
+    with _replica_sets_lock:
+        if key not in _replica_sets:
+            _replica_sets[key] = ReplicaSet(
+                urls,
+                policy=os.environ.get("DB_REPLICA_POLICY", ROUND_ROBIN),
+                eject_seconds=float(os.environ.get("DB_REPLICA_EJECT_SECONDS", 30)),
+            )
+        return _replica_sets[key]
+
+
+def dispose_engines():
+    """process 가 공유하는 engine 을 모두 닫는다."""
+    _registry.dispose()
+
+
+class Database(object):
+    """
+    Args:
+        connection_string (str): primary connection string. None 이면 환경변수로 만든다.
+        replica_urls (List[str]): read replica connection string.
+            None 이고 connection_string 도 None 이면 환경변수로 만든다.
+    """
+
+    def __init__(self, connection_string: str = None, replica_urls: List[str] = None):
+        if replica_urls is None and connection_string is None:
+            replica_urls = self._get_replica_urls()
+        self.connection_string = connection_string or self._get_connection_string()
+        self.engine, self.Session = _registry.get(self.connection_string)
+        self.writer = _registry.writer(self.connection_string)
+        self.replicas = (
+            _replica_set(self.connection_string, replica_urls) if replica_urls else None
         )
+        self.sticky_seconds = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", 5))
+
+    def _mysql_url(self, mysql_host: str) -> str:
+        db_name = os.environ.get("MYSQL_DATABASE")
+        user_name = os.environ.get("MYSQL_USERNAME")
+        password = os.environ.get("MYSQL_PASSWORD")
+        return f"mysql+pymysql://{user_name}:{password}@{mysql_host}/{db_name}?charset=utf8mb4"
 
     def _get_connection_string(self):
         dbms = os.environ.get("DBMS", "sqlite")
         if dbms == "sqlite":
             return SQLALCHEMY_DATABASE_URL
         elif dbms == "mysql":
-            db_name = os.environ.get("MYSQL_DATABASE")
-            user_name = os.environ.get("MYSQL_USERNAME")
-            password = os.environ.get("MYSQL_PASSWORD")
-            mysql_host = os.environ.get("MYSQL_HOST")
-            return f"mysql+pymysql://{user_name}:{password}@{mysql_host}/{db_name}?charset=utf8mb4"
+            return self._mysql_url(os.environ.get("MYSQL_HOST"))
         else:
             raise ValueError
 
+    def _get_replica_urls(self) -> List[str]:
+        """DB_REPLICA_URLS(쉼표로 구분한 connection string) 또는
+        mysql 인 경우 MYSQL_REPLICA_HOSTS(쉼표로 구분한 host) 로 replica 목록을 만든다.
+        """
+        urls = os.environ.get("DB_REPLICA_URLS", "")
+        if urls:
+            return [url.strip() for url in urls.split(",") if url.strip()]
+        hosts = os.environ.get("MYSQL_REPLICA_HOSTS", "")
+        if os.environ.get("DBMS") == "mysql" and hosts:
+            return [self._mysql_url(host.strip()) for host in hosts.split(",")]
+        return []
+
+    def _read_your_writes(self) -> bool:
+        if _use_primary.get():
+            return True
+        last_write = _last_write.get()
+        return last_write is not None and time.monotonic() - last_write < self.sticky_seconds
+
+    def _session(self, read_only: bool):
+        """session 과 session 이 연결된 replica. primary 면 replica 는 None"""
+        if read_only and self.replicas is not None and not self._read_your_writes():
+            for replica in self.replicas.candidates():
+                session = _registry.get(replica.url)[1]()
+                try:
+                    session.connection()
+                    return session, replica
+                except exc.DBAPIError as e:
+                    session.close()
+                    self.replicas.eject(replica, e)
+        return self.Session(), None
+
     @contextmanager
-    def session_scope(self) -> Generator[Session, None, None]:
-        """Provide a transactional scope around a series of operations."""
-        session = self.Session()
+    def session_scope(self, read_only: bool = False) -> Generator[Session, None, None]:
+        """Provide a transactional scope around a series of operations.
+
+        read_only 이면 replica 에서 session 을 만든다. 연결에 실패한 replica 는 제외하고
+        다음 replica 를, 모두 실패하면 primary 를 사용한다.
+        같은 thread/task 에서 write 한 뒤 DB_REPLICA_STICKY_SECONDS 동안은
+        replication 지연 때문에 자신이 쓴 data 를 못 읽지 않도록 primary 를 사용한다.
+
+        Args:
+            read_only (bool): replica 를 사용해도 되는 조회 전용 session 인지 여부
+        """
+        transaction = _transaction.get()
+        if transaction is not None and transaction.engine is self.engine:
+            # transaction 의 session 을 같이 사용한다. commit 은 transaction 이 끝날 때 한다.
+            # 다음 query 가 변경 내용을 보고 입력한 id 를 돌려줄 수 있도록 flush 만 한다.
+            yield transaction.session
+            transaction.session.flush()
+            return
+
+        if not read_only:
+            self._check_suspended()
+        if not read_only and self.writer is not None:
+            with self.writer.hold():
+                with self._session_scope(read_only) as session:
+                    yield session
+            return
+        with self._session_scope(read_only) as session:
+            yield session
+
+    @contextmanager
+    def _session_scope(self, read_only: bool) -> Generator[Session, None, None]:
+        session, replica = self._session(read_only)
+        if replica is not None:
+            self.replicas.acquire(replica)
         try:
             yield session
             session.commit()
         except SQLAlchemyError as e:
             log.error("Database Error. %s", e)
             session.rollback()
+            if (
+                replica is not None
+                and isinstance(e, exc.DBAPIError)
+                and e.connection_invalidated
+            ):
+                self.replicas.eject(replica, e)
             raise
         finally:
             session.close()
+            if replica is not None:
+                self.replicas.release(replica)
+        if not read_only:
+            _last_write.set(time.monotonic())
+
+    @contextmanager
+    def transaction(self) -> Generator[Session, None, None]:
+        """이 block 안의 session_scope 가 하나의 session 을 공유하고 마지막에 한번 commit 한다.
+
+        같은 session 의 identity map 을 사용하므로 block 안에서 입력/변경한 객체를
+        다시 조회할 때 query 를 실행하지 않는다. read_only session 도 primary 의
+        같은 session 을 사용하므로 block 안에서 쓴 내용을 읽을 수 있다.
+        block 에서 exception 이 발생하면 전체를 rollback 한다.
+        이미 transaction 중이면 바깥 transaction 에 포함된다.
+
+        Use:
+        >>> with db.transaction():
+        ...     author_id = BlogService().add_author("a@b.c", "a")
+        ...     BlogService().mod_author_partial(author_id, name="b")
+        """
+        current = _transaction.get()
+        if current is not None and current.engine is self.engine:
+            yield current.session
+            return
+
+        self._check_suspended()
+        if self.writer is not None:
+            with self.writer.hold():
+                with self._transaction() as session:
+                    yield session
+            return
+        with self._transaction() as session:
+            yield session
+
+    @contextmanager
+    def _transaction(self) -> Generator[Session, None, None]:
+        transaction = _Transaction(self.engine, self.Session())
+        token = _transaction.set(transaction)
+        try:
+            yield transaction.session
+            transaction.session.commit()
+        except SQLAlchemyError as e:
+            log.error("Database Error. %s", e)
+            transaction.session.rollback()
+            raise
+        except BaseException:
+            transaction.session.rollback()
+            raise
+        finally:
+            _transaction.reset(token)
+            transaction.session.close()
+        _last_write.set(time.monotonic())
+        for callback in transaction.after_commit:
+            callback()
+
+    def _check_suspended(self):
+        for transaction in _suspended.get():
+            if transaction.engine is self.engine and transaction.has_pending_write():
+                raise IndependentWriteError(
+                    "sqlite transaction already holds the write lock; "
+                    "write in independent() before writing in the transaction"
+                )
+
+    @contextmanager
+    def independent(self):
+        """transaction 중에도 이 block 안의 session_scope 는 따로 commit 한다.
+
+        sqlite 는 writer 가 하나뿐이라 바깥 transaction 이 이미 write 했으면 그 commit 을
+        기다리게 되므로 block 안의 write 는 IndependentWriteError 를 raise 한다.
+        바깥 transaction 의 write 보다 먼저 사용하거나 read 만 한다.
+
+        Use:
+        >>> with db.transaction():
+        ...     with db.independent():
+        ...         BlogService().add_category("python")  # transaction 이 rollback 되어도 남는다.
+        ...     BlogService().add_author("a@b.c", "a")
+        """
+        current = _transaction.get()
+        suspended = _suspended.get() + ((current,) if current is not None else ())
+        suspended_token = _suspended.set(suspended)
+        token = _transaction.set(None)
+        try:
+            yield
+        finally:
+            _transaction.reset(token)
+            _suspended.reset(suspended_token)
+
+    @contextmanager
+    def use_primary(self):
+        """이 block 안의 read_only session 도 primary 를 사용한다."""
+        token = _use_primary.set(True)
+        try:
+            yield
+        finally:
+            _use_primary.reset(token)
+
+    def sync_replicas(self):
+        """sqlite replica file 을 primary 내용으로 덮어쓴다.
+
+        local 에서 여러 sqlite file 로 replica 를 흉내낼 때 replication 대신 사용한다.
+        연결되지 않는 replica 는 제외한다.
+        """
+        if self.engine.dialect.name != "sqlite" or self.replicas is None:
+            raise ValueError("sync_replicas is only supported for sqlite replicas")
+        source = self.engine.raw_connection()
+        try:
+            for replica in self.replicas.replicas:
+                try:
+                    target = _registry.get(replica.url)[0].raw_connection()
+                except exc.DBAPIError as e:
+                    self.replicas.eject(replica, e)
+                    continue
+                try:
+                    source.connection.backup(target.connection)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+
+    def pool_stats(self) -> dict:
+        """connection pool 상태
+
+        Returns:
+            checked_out, overflow, wait_time 등 pool 상태 dict
+        """
+        pool = self.engine.pool
+        stats = {"pool": pool.__class__.__name__, "status": pool.status()}
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, TimedQueuePool):
+            stats.update(
+                wait_count=pool.wait_count,
+                wait_time_total=pool.wait_time_total,
+                wait_time_max=pool.wait_time_max,
+                timeouts=pool.timeouts,
+            )
+        if self.replicas is not None:
+            stats["replicas"] = self.replicas.stats()
+        if self.writer is not None:
+            stats["writer"] = self.writer.stats()
+        return stats
+
+    def enable_profiling(self, profiler: QueryProfiler = None) -> QueryProfiler:
+        """engine 에서 실행되는 statement 를 service method 별로 집계한다.
+        DB_PROFILE 환경변수를 설정하면 모든 engine 에 default profiler 가 attach 된다.
+
+        Args:
+            profiler (QueryProfiler): 사용할 profiler. None 이면 default profiler
+
+        Returns:
+            attach 된 profiler
+        """
+        profiler = profiler or default_profiler()
+        for engine in self._engines():
+            profiler.attach(engine)
+        return profiler
+
+    def disable_profiling(self):
+        for engine in self._engines():
+            profiler = profiler_for(engine)
+            if profiler is not None:
+                profiler.detach(engine)
+
+    def _engines(self) -> List[Engine]:
+        engines = [self.engine]
+        if self.replicas is not None:
+            engines.extend(
+                _registry.get(replica.url)[0] for replica in self.replicas.replicas
+            )
+        return engines
+
+    @property
+    def profiler(self) -> Optional[QueryProfiler]:
+        """engine 에 attach 된 profiler. 없으면 None"""
+        return profiler_for(self.engine)
 
     def create_all(self):
         """creates all tables."""
@@ -78,6 +625,27 @@ class Database(object):
             log.error("Unable to create or connect to database: %s", e)
             raise
 
+    def upgrade(self) -> migrate.SchemaChanges:
+        """없는 table, column, index 를 추가하고 실행하지 않은 migration 을 실행한다.
+        drop_all 없이 기존 data 를 유지한다. database/migrate.py 참고
+        """
+        writer = self.writer.hold() if self.writer is not None else nullcontext()
+        try:
+            with writer, self.engine.begin() as conn:
+                changes = migrate.upgrade(conn)
+        except SQLAlchemyError as e:
+            log.error("Unable to upgrade database schema: %s", e)
+            raise
+        if changes.versions:
+            # sqlite foreign_keys=AUTO 를 새 schema version 으로 다시 정하도록 다시 연결한다.
+            self.engine.dispose()
+        return changes
+
+    def rebuild_search_index(self):
+        """post 검색 index 를 다시 만든다."""
+        with self.engine.begin() as conn:
+            search.rebuild_search_index(conn)
+
     def drop_all(self):
         """Drop all tables."""
         try:
@@ -0,0 +1,127 @@
+import re
+import logging
+from typing import Dict, List, Sequence
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .model import Base
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+class CapturedStatement(object):
+    def __init__(self, label: str, statement: str, parameters):
+        self.label = label
+        self.statement = statement
+        self.parameters = parameters
+        self.plan: List[str] = []
+        self.full_scans: List[str] = []
+
+    def __str__(self):
+        return f"[{self.label}] {' '.join(self.statement.split())}"
+
+
+class StatementRecorder(object):
+    """engine 에서 실행되는 statement 를 label(service method 이름) 별로 기록한다."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.label = None
+        self.statements: List[CapturedStatement] = []
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        if self.label is None or executemany:
+            return
+        if not _EXPLAINABLE.match(statement):
+            return
+        self.statements.append(CapturedStatement(self.label, statement, parameters))
+
+    @contextmanager
+    def recording(self, label: str):
+        self.label = label
+        try:
+            yield
+        finally:
+            self.label = None
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+def explain(engine: Engine, statement: str, parameters) -> List[str]:
+    """statement 실행 계획
+
+    sqlite 는 EXPLAIN QUERY PLAN, mysql 은 EXPLAIN 결과를 한 줄씩 문자열로 돌려준다.
+    """
+    dialect_name = engine.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql(prefix + statement, parameters)
+        if dialect_name == "sqlite":
+            return [row.detail for row in result]
+        return [
+            " ".join(f"{key}={value}" for key, value in row._mapping.items())
+            for row in result
+        ]
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+def find_full_scans(dialect_name: str, plan: Sequence[str]) -> List[str]:
+    """실행 계획에서 index 없이 table 전체를 읽는 단계를 찾는다.
+    subquery 등 model 에 없는 이름은 제외한다.
+    """
+    scans = []
+    for line in plan:
+        if dialect_name == "sqlite":
+            match = _SQLITE_SCAN.match(line)
+            if match and " USING " not in line:
+                scans.append(match.group(1))
+        elif "type=ALL" in line.split():
+            table = re.search(r"\btable=(\S+)", line)
+            scans.append(table.group(1) if table else line)
+    return [table for table in scans if table in Base.metadata.tables]
+
+
+def analyze(
+    engine: Engine,
+    statements: Sequence[CapturedStatement],
+    allow: Dict[str, Sequence[str]] = None,
+) -> List[CapturedStatement]:
+    """기록된 statement 의 실행 계획을 확인하고 full scan 하는 statement 목록을 돌려준다.
+
+    Args:
+        engine: statement 를 실행한 engine
+        statements: StatementRecorder 로 기록된 statement
+        allow: {label: [table]} full scan 을 허용할 method 별 table
+
+    Returns:
+        full scan 이 있는 statement
+    """
+    allow = allow or {}
+    flagged = []
+    seen = set()
+    for captured in statements:
+        key = (captured.label, captured.statement)
+        if key in seen:
+            continue
+        seen.add(key)
+        captured.plan = explain(engine, captured.statement, captured.parameters)
+        scans = find_full_scans(engine.dialect.name, captured.plan)
+        captured.full_scans = [
+            table for table in scans if table not in allow.get(captured.label, ())
+        ]
+        if captured.full_scans:
+            log.warning("full scan %s: %s", captured.full_scans, captured)
+            flagged.append(captured)
+    return flagged
@@ -0,0 +1,140 @@
+import os
+import logging
+import threading
+from typing import AsyncGenerator, Dict, Optional
+from contextlib import asynccontextmanager
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from . import _env_bool, _env_int
+from .model import Base
+from .profiler import QueryProfiler, default_profiler, profiler_for
+from .sqlite_tuning import install_pragmas, is_file_sqlite, sqlite_pragmas
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./sql_app.db"
+
+_lock = threading.Lock()
+_engines: Dict[str, AsyncEngine] = {}
+_sessions: Dict[str, sessionmaker] = {}
+
+
+def _async_engine_options(connection_string: str) -> dict:
+    """환경변수로부터 async engine/pool 설정을 만든다.
+
+    aiosqlite 는 dialect 기본 pool 을 사용하고 mysql 은 DB_POOL_* 설정을 사용한다.
+    """
+    options = {"echo": _env_bool("ECHO_SQL")}
+    if connection_string.startswith("sqlite"):
+        return options
+    options.update(
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING"),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", -1),
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+    )
+    return options
+
+
+async def dispose_async_engines():
+    """process 가 공유하는 async engine 을 모두 닫는다."""
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+        _sessions.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
+class AsyncDatabase(object):
+    """Database 의 asyncio 버전
+
+    engine 은 connection string 별로 process 내에서 공유한다.
+    pool 의 connection 은 event loop 에 묶이므로 process 당 하나의 event loop 에서 사용한다.
+    """
+
+    def __init__(self, connection_string: str = None):
+        self.connection_string = connection_string or self._get_connection_string()
+        with _lock:
+            if self.connection_string not in _engines:
+                engine = create_async_engine(
+                    self.connection_string,
+                    **_async_engine_options(self.connection_string),
+                )
+                if _env_bool("DB_PROFILE"):
+                    default_profiler().attach(engine.sync_engine)
+                if is_file_sqlite(self.connection_string) and _env_bool(
+                    "DB_SQLITE_TUNING", "true"
+                ):
+                    install_pragmas(engine.sync_engine, sqlite_pragmas())
+                _engines[self.connection_string] = engine
+                _sessions[self.connection_string] = sessionmaker(
+                    engine,
+                    class_=AsyncSession,
+                    autoflush=False,
+                    expire_on_commit=False,
+                )
+            self.engine = _engines[self.connection_string]
+            self.Session = _sessions[self.connection_string]
+
+    def _get_connection_string(self):
+        dbms = os.environ.get("DBMS", "sqlite")
+        if dbms == "sqlite":
+            return ASYNC_SQLALCHEMY_DATABASE_URL
+        elif dbms == "mysql":
+            driver = os.environ.get("MYSQL_ASYNC_DRIVER", "asyncmy")
+            db_name = os.environ.get("MYSQL_DATABASE")
+            user_name = os.environ.get("MYSQL_USERNAME")
+            password = os.environ.get("MYSQL_PASSWORD")
+            mysql_host = os.environ.get("MYSQL_HOST")
+            return f"mysql+{driver}://{user_name}:{password}@{mysql_host}/{db_name}?charset=utf8mb4"
+        else:
+            raise ValueError
+
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncGenerator[AsyncSession, None]:
+        """Provide a transactional scope around a series of operations."""
+        session = self.Session()
+        try:
+            yield session
+            await session.commit()
+        except SQLAlchemyError as e:
+            log.error("Database Error. %s", e)
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    def enable_profiling(self, profiler: QueryProfiler = None) -> QueryProfiler:
+        """Database.enable_profiling 과 같다."""
+        return (profiler or default_profiler()).attach(self.engine.sync_engine)
+
+    def disable_profiling(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.detach(self.engine.sync_engine)
+
+    @property
+    def profiler(self) -> Optional[QueryProfiler]:
+        return profiler_for(self.engine.sync_engine)
+
+    async def create_all(self):
+        """creates all tables."""
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        except SQLAlchemyError as e:
+            log.error("Unable to create or connect to database: %s", e)
+            raise
+
+    async def drop_all(self):
+        """Drop all tables."""
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+        except SQLAlchemyError as e:
+            log.error("Unable to drop all tables of the database: %s", e)
+            raise
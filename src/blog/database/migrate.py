@@ -0,0 +1,285 @@
+"""schema migration
+
+drop_all/create_all 없이 Base.metadata 와 database 를 비교해서 없는 table, column, index 를
+그 자리에서 추가하고, 추가한 column 에 채워야 하는 값은 version 순서로 한번씩 실행하는
+MIGRATIONS 로 채운다. 실행한 version 은 blog_schema_version 에 기록한다.
+
+column 의 type, NULL 허용 변경, 삭제, unique/foreign key 추가는 하지 않는다. table 을 다시
+만들어야 하는 변경은 blog_post_tag 의 foreign key 를 바로잡는 5 처럼 migration 으로 추가한다.
+NOT NULL 로 바꾼 blog_post.date_published 는 6 에서 비어 있는 값만 채운다.
+새 NOT NULL column 은 기존 row 에 넣을 server_default 가 있어야 한다.
+
+Use:
+>>> Database().upgrade()
+"""
+import datetime
+import logging
+from typing import Callable, List, NamedTuple
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    extract,
+    func,
+    insert,
+    inspect,
+    select,
+    update,
+)
+from sqlalchemy.schema import CreateColumn
+from .model import (
+    Base,
+    BlogCategory,
+    BlogPost,
+    BlogPostMonth,
+    BlogTag,
+    Comment,
+    blog_post_tag,
+    counter_values,
+)
+from . import search
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+# Base.metadata 에 넣지 않아서 drop_all 로 지워지지 않는다.
+schema_version = Table(
+    "blog_schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable
+
+
+class SchemaChanges(object):
+    """upgrade 가 추가한 table, column, index 와 실행한 migration version"""
+
+    def __init__(self):
+        self.tables: List[str] = []
+        self.columns: List[str] = []
+        self.indexes: List[str] = []
+        self.versions: List[int] = []
+
+    def __bool__(self):
+        return bool(self.tables or self.columns or self.indexes or self.versions)
+
+    def __str__(self):
+        return (
+            f"tables={self.tables}, columns={self.columns}, "
+            f"indexes={self.indexes}, versions={self.versions}"
+        )
+
+
+def _backfill_comment_count(conn):
+    comments = Comment.__table__
+    posts = BlogPost.__table__
+    conn.execute(
+        update(posts).values(
+            counter_values(
+                posts,
+                comment_count=select(func.count())
+                .where(comments.c.post_id == posts.c.id)
+                .scalar_subquery(),
+            )
+        )
+    )
+
+
+def _backfill_post_counts(conn):
+    for table, count in [
+        (
+            BlogTag.__table__,
+            select(func.count()).where(
+                blog_post_tag.c.tag_id == BlogTag.__table__.c.id
+            ),
+        ),
+        (
+            BlogCategory.__table__,
+            select(func.count()).where(
+                BlogPost.__table__.c.category_id == BlogCategory.__table__.c.id
+            ),
+        ),
+    ]:
+        conn.execute(
+            update(table).values(
+                counter_values(table, post_count=count.scalar_subquery())
+            )
+        )
+
+
+def _backfill_months(conn):
+    posts = BlogPost.__table__
+    year = extract("year", posts.c.date_published)
+    month = extract("month", posts.c.date_published)
+    conn.execute(delete(BlogPostMonth.__table__))
+    conn.execute(
+        insert(BlogPostMonth.__table__).from_select(
+            ["year", "month", "post_count"],
+            select(year, month, func.count())
+            .where(posts.c.date_published.isnot(None))
+            .group_by(year, month),
+        )
+    )
+
+
+def _backfill_date_published(conn):
+    """date_published 가 없는 post 는 created_at 으로 채우고 월별 post 수를 다시 계산한다."""
+    posts = BlogPost.__table__
+    conn.execute(
+        update(posts)
+        .where(posts.c.date_published.is_(None))
+        .values(date_published=posts.c.created_at, updated_at=posts.c.updated_at)
+    )
+    _backfill_months(conn)
+
+
+def _legacy_post_tag(conn) -> bool:
+    """blog_post_tag 가 처음 schema 처럼 tag_id 가 blog_post 를 참조하는지 여부
+
+    처음 schema 는 foreign key 가 서로 바뀌어 있어서 relationship 이 tag_id 에 post id 를,
+    post_id 에 tag id 를 저장했다.
+    """
+    for fk in inspect(conn).get_foreign_keys(blog_post_tag.name):
+        if fk["constrained_columns"] == ["tag_id"]:
+            return fk["referred_table"] == BlogPost.__tablename__
+    return False
+
+
+def _rebuild_post_tag(conn):
+    """foreign key 가 바뀐 blog_post_tag 를 올바른 foreign key, index 로 다시 만들고
+    tag_id, post_id 를 바꿔서 옮긴다. 없는 post, tag 를 가리키는 row 는 버린다.
+    2 의 tag post_count 는 바뀌기 전 column 으로 계산했으므로 다시 계산한다.
+    """
+    if not _legacy_post_tag(conn):
+        return
+    legacy = f"{blog_post_tag.name}_legacy"
+    conn.exec_driver_sql(f"ALTER TABLE {blog_post_tag.name} RENAME TO {legacy}")
+    # sqlite 의 index 이름은 database 전체에서 unique 이므로 새 table 전에 지운다.
+    # mysql 은 table 마다 따로라서 지우지 않는다. foreign key 가 사용하는 index 는 지울 수 없다.
+    if conn.dialect.name == "sqlite":
+        for index in inspect(conn).get_indexes(legacy):
+            conn.exec_driver_sql(f"DROP INDEX {index['name']}")
+    blog_post_tag.create(conn)
+    conn.exec_driver_sql(
+        f"""INSERT INTO {blog_post_tag.name} (tag_id, post_id)
+        SELECT post_id, tag_id FROM {legacy}
+        WHERE post_id IN (SELECT id FROM {BlogTag.__tablename__})
+        AND tag_id IN (SELECT id FROM {BlogPost.__tablename__})"""
+    )
+    conn.exec_driver_sql(f"DROP TABLE {legacy}")
+    _backfill_post_counts(conn)
+
+
+# 추가만 한다. 이미 실행된 migration 은 고치지 않고 새 version 으로 추가한다.
+MIGRATIONS = [
+    Migration(1, "blog_post.comment_count 채우기", _backfill_comment_count),
+    Migration(2, "blog_tag, blog_category post_count 채우기", _backfill_post_counts),
+    Migration(3, "blog_post_month 채우기", _backfill_months),
+    Migration(4, "post 검색 index 만들기", search.rebuild_search_index),
+    Migration(
+        5, "blog_post_tag foreign key 와 row 의 tag_id, post_id 바로잡기", _rebuild_post_tag
+    ),
+    Migration(6, "비어 있는 blog_post.date_published 채우기", _backfill_date_published),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+# 이 version 이전 schema 는 blog_post_tag foreign key 가 바뀌어 있어서 sqlite foreign key 를 켜지 않는다.
+FOREIGN_KEYS_VERSION = 5
+
+
+def current_version(conn) -> int:
+    """실행된 마지막 migration version. 기록이 없으면 0"""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _add_column_ddl(conn, column: Column) -> str:
+    if column.primary_key:
+        raise ValueError(f"cannot add primary key column {column}")
+    if not column.nullable and column.server_default is None:
+        raise ValueError(f"NOT NULL column {column} needs a server_default")
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    return f"ALTER TABLE {column.table.name} ADD COLUMN {ddl}"
+
+
+def plan(conn) -> SchemaChanges:
+    """Base.metadata 에는 있고 database 에 없는 table, column, index"""
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    changes = SchemaChanges()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            changes.tables.append(table.name)
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                changes.columns.append(f"{table.name}.{column.name}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in indexes:
+                changes.indexes.append(index.name)
+    return changes
+
+
+def upgrade(conn) -> SchemaChanges:
+    """database 를 Base.metadata 와 MIGRATIONS 의 마지막 version 으로 만든다.
+
+    빈 database 면 table 을 모두 만들고 채울 값이 없으므로 migration 은 실행하지 않고
+    마지막 version 으로 기록한다. 같은 transaction 에서 실행해야 중간에 실패해도 원래대로 남는다.
+
+    Args:
+        conn: transaction 이 시작된 connection
+
+    Returns:
+        SchemaChanges
+    """
+    changes = plan(conn)
+    fresh = len(changes.tables) == len(Base.metadata.tables)
+    tables = Base.metadata.tables
+    # 실행 전에 추가할 수 없는 column 을 먼저 확인한다.
+    statements = [
+        _add_column_ddl(conn, tables[name].c[column])
+        for name, column in (item.split(".") for item in changes.columns)
+    ]
+    if changes.tables:
+        Base.metadata.create_all(
+            conn, tables=[tables[name] for name in changes.tables]
+        )
+    for stmt in statements:
+        conn.exec_driver_sql(stmt)
+    for table in tables.values():
+        for index in table.indexes:
+            if index.name in changes.indexes:
+                index.create(conn)
+
+    schema_version.create(conn, checkfirst=True)
+    version = current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        if not fresh:
+            log.info("migration %d: %s", migration.version, migration.description)
+            migration.upgrade(conn)
+        conn.execute(
+            insert(schema_version).values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.datetime.utcnow(),
+            )
+        )
+        changes.versions.append(migration.version)
+    if changes:
+        log.info("schema upgraded: %s", changes)
+    return changes
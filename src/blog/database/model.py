@@ -2,7 +2,7 @@ import datetime
 import sqlalchemy
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from sqlalchemy.sql.schema import Table
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 
@@ -21,6 +21,23 @@ class TimeStampedMixin(object):
         return sqlalchemy.Column(DateTime, onupdate=datetime.datetime.utcnow)
 
 
+def counter_values(model, **values) -> dict:
+    """조회수, post 수 같은 집계 column 만 바꾸는 UPDATE 의 values
+
+    내용을 수정한 것이 아니므로 updated_at 의 onupdate 가 실행되지 않도록 그대로 둔다.
+
+    Args:
+        model: Core update 면 Table, ORM update 면 mapped class
+    """
+    if isinstance(model, Table):
+        column = model.c.get("updated_at")
+    else:
+        column = getattr(model, "updated_at", None)
+    if column is not None:
+        values["updated_at"] = column
+    return values
+
+
 class BlogAuthor(Base, TimeStampedMixin):
     __tablename__ = "blog_author"
     id = Column(Integer, primary_key=True)
@@ -28,9 +45,13 @@ class BlogAuthor(Base, TimeStampedMixin):
     name = Column(String(45))
     first_name = Column(String(45))
     last_name = Column(String(45))
+    # optimistic locking. UPDATE 할 때마다 1 증가하고 WHERE version = ? 로 충돌을 확인한다.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     posts = relationship("BlogPost", lazy="dynamic", viewonly=True)
 
+    __mapper_args__ = {"version_id_col": version}
+
     def __str__(self):
         return f"[{self.id}] {self.name}, {self.email}"
 
@@ -39,6 +60,8 @@ class BlogCategory(Base, TimeStampedMixin):
     __tablename__ = "blog_category"
     id = Column(Integer, primary_key=True)
     name = Column(String(20), unique=True)
+    # category 의 post 갯수. post 추가/변경 시 같은 transaction 에서 변경한다.
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     posts = relationship("BlogPost", lazy="dynamic", viewonly=True)  # too many..
 
@@ -46,11 +69,17 @@ class BlogCategory(Base, TimeStampedMixin):
         return f"<{self.name}>"
 
 
+# 처음 schema 는 tag_id 가 blog_post.id, post_id 가 blog_tag.id 를 참조해서 row 에 tag_id, post_id 가
+# 바뀌어 저장되어 있다. 그 database 는 이 정의로 읽으면 post 에 다른 tag 가 붙어 보이므로
+# 먼저 python init_db.py (Database.upgrade) 를 실행해야 한다. migrate.py 의 migration 5 가
+# table 을 이 정의로 다시 만들고 row 의 tag_id, post_id 를 바꿔서 옮긴다.
 blog_post_tag = Table(
     "blog_post_tag",
     Base.metadata,
-    Column("tag_id", Integer, ForeignKey("blog_post.id"), primary_key=True),
-    Column("post_id", Integer, ForeignKey("blog_tag.id"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("blog_tag.id"), primary_key=True),
+    Column("post_id", Integer, ForeignKey("blog_post.id"), primary_key=True),
+    # PK (tag_id, post_id) 는 tag -> post, 이 index 는 post -> tag 조회용
+    Index("ix_blog_post_tag_post_id_tag_id", "post_id", "tag_id"),
 )
 
 
@@ -59,6 +88,13 @@ class BlogTag(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String(20), index=True, unique=True)
+    # tag 가 붙은 post 갯수. post 추가/변경 시 같은 transaction 에서 변경한다.
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # 많이 사용된 tag 순서로 목록을 가져오는 용도
+        Index("ix_blog_tag_post_count_id", "post_count", "id"),
+    )
 
     def __str__(self):
         return f"{self.name}"
@@ -69,27 +105,84 @@ class BlogPost(Base, TimeStampedMixin):
     id = Column(Integer, primary_key=True)
     title = Column(String(144))
     article = Column(String)
-    date_published = Column(DateTime, default=datetime.datetime.utcnow)
+    # keyset cursor 와 월별 post 수에 사용하므로 비워두지 않는다.
+    date_published = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
     views = Column(Integer, default=0)
+    # blog_comment 갯수. comment 추가/삭제 시 같은 transaction 에서 변경한다.
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
     author_id = Column(Integer, ForeignKey("blog_author.id"))
     category_id = Column(Integer, ForeignKey("blog_category.id"), nullable=True)
+    # optimistic locking. views, comment_count 변경에는 증가하지 않는다.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # bulk import 가 executemany 로 입력한 post 의 id 를 다시 찾기 위한 "batch token:순번".
+    # 다른 곳에서 입력한 post 는 NULL
+    import_key = Column(String(64))
 
     author: BlogAuthor = relationship("BlogAuthor", lazy="joined")
     category: BlogCategory = relationship("BlogCategory", lazy="joined")
-    tags = relationship("BlogTag", secondary=blog_post_tag, lazy="joined")
+    # joined 로 가져오면 post x tag 만큼 row 가 생기므로 selectin 으로 한번에 가져온다.
+    tags = relationship("BlogTag", secondary=blog_post_tag, lazy="selectin")
+
+    __table_args__ = (
+        # keyset pagination 용 (author_id, id), (category_id, id) index
+        # author_id, category_id 단독 조회도 이 index 를 사용한다.
+        Index("ix_blog_post_author_id_id", "author_id", "id"),
+        Index("ix_blog_post_category_id_id", "category_id", "id"),
+        # author, category 별 목록의 order_by="date_published" keyset pagination
+        Index(
+            "ix_blog_post_author_id_date_published_id",
+            "author_id",
+            "date_published",
+            "id",
+        ),
+        Index(
+            "ix_blog_post_category_id_date_published_id",
+            "category_id",
+            "date_published",
+            "id",
+        ),
+        # 조회수 top N
+        Index("ix_blog_post_views_id", "views", "id"),
+        # 최신 글, 연/월 archive 를 date_published 범위로 keyset pagination
+        Index("ix_blog_post_date_published_id", "date_published", "id"),
+        Index("ix_blog_post_import_key", "import_key", unique=True),
+    )
+    __mapper_args__ = {"version_id_col": version}
 
     def __str__(self):
         tag_names = [f"#{tag.name}" for tag in self.tags]
         return f"[{self.id}] 글쓴이:{self.author} | {self.title}, {self.article} | {self.category}, {tag_names}"
 
 
+class BlogPostMonth(Base):
+    """월별 post 갯수. archive 목록을 blog_post 집계 없이 보여주기 위해 미리 계산한다."""
+
+    __tablename__ = "blog_post_month"
+
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    # post 추가 시 같은 transaction 에서 증가한다.
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} ({self.post_count})"
+
+
 class Comment(Base, TimeStampedMixin):
     __tablename__ = "blog_comment"
     id = Column(Integer, primary_key=True)
     content = Column(String(250))
 
-    author_id = Column(Integer, ForeignKey("blog_author.id"))
+    author_id = Column(Integer, ForeignKey("blog_author.id"), index=True)
     post_id = Column(Integer, ForeignKey("blog_post.id"))
 
     author: BlogAuthor = relationship("BlogAuthor")
-    # post: BlogPost = relationship("BlogPost")
+    post: BlogPost = relationship("BlogPost")
+
+    __table_args__ = (
+        # post 별 comment keyset pagination. post_id 단독 조회도 이 index 를 사용한다.
+        Index("ix_blog_comment_post_id_id", "post_id", "id"),
+    )
+
+    def __str__(self):
+        return f"[{self.id}] {self.author}: {self.content}"
@@ -0,0 +1,79 @@
+"""mysql blog_post 연도별 range partition
+
+blog_post 를 YEAR(date_published) 로 partition 하면 date_published 범위로 조회하는
+archive, 최신 글 query 는 해당 연도의 partition 만 읽는다.
+
+InnoDB 의 partition table 은 다음을 지원하지 않으므로 partition 전에 제거한다.
+
+- foreign key: blog_post 의 foreign key 와 blog_post 를 참조하는
+  blog_post_tag, blog_comment 의 foreign key
+- FULLTEXT index: mysql 에서 search_posts 를 사용할 수 없게 된다.
+
+partition column 은 모든 unique key 에 포함되어야 하므로 PK 는 (id, date_published) 가 된다.
+sqlite 에는 partition 이 없으므로 아무것도 하지 않는다.
+"""
+from typing import List
+from sqlalchemy import inspect
+from .model import BlogPost
+from .search import MYSQL_FULLTEXT_INDEX
+
+
+# 마지막 연도 이후의 post 가 들어가는 partition
+MAX_PARTITION = "pmax"
+# foreign key 를 제거해야 하는 table
+_FOREIGN_KEY_TABLES = ("blog_post_tag", "blog_comment", "blog_post")
+
+
+def _year_partition(year: int) -> str:
+    return f"PARTITION p{year} VALUES LESS THAN ({year + 1})"
+
+
+def partition_statements(conn, first_year: int, last_year: int) -> List[str]:
+    """blog_post 를 연도별 partition 으로 바꾸는 DDL 목록
+
+    first_year 이전 post 는 첫 partition 에, last_year 이후 post 는 pmax 에 들어간다.
+
+    Args:
+        conn: mysql connection
+        first_year (int): 첫 partition 연도
+        last_year (int): 마지막 partition 연도
+
+    Returns:
+        실행할 DDL 목록. mysql 이 아니면 빈 목록
+    """
+    if conn.dialect.name != "mysql":
+        return []
+    table = BlogPost.__tablename__
+    inspector = inspect(conn)
+    stmts = []
+    for name in _FOREIGN_KEY_TABLES:
+        for fk in inspector.get_foreign_keys(name):
+            if name == table or fk["referred_table"] == table:
+                stmts.append(f"ALTER TABLE {name} DROP FOREIGN KEY {fk['name']}")
+    indexes = {index["name"] for index in inspector.get_indexes(table)}
+    if MYSQL_FULLTEXT_INDEX in indexes:
+        stmts.append(f"ALTER TABLE {table} DROP INDEX {MYSQL_FULLTEXT_INDEX}")
+    # PK column 은 NULL 일 수 없다.
+    stmts.append(
+        f"UPDATE {table} SET date_published = created_at WHERE date_published IS NULL"
+    )
+    stmts.append(
+        f"ALTER TABLE {table} MODIFY date_published DATETIME NOT NULL, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, date_published)"
+    )
+    partitions = [_year_partition(year) for year in range(first_year, last_year + 1)]
+    partitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    stmts.append(
+        f"ALTER TABLE {table} PARTITION BY RANGE (YEAR(date_published)) "
+        f"({', '.join(partitions)})"
+    )
+    return stmts
+
+
+def add_year_partition_statement(year: int) -> str:
+    """pmax 를 나눠서 year partition 을 추가하는 DDL. 새 해가 되기 전에 실행한다."""
+    return (
+        f"ALTER TABLE {BlogPost.__tablename__} REORGANIZE PARTITION {MAX_PARTITION} "
+        f"INTO ({_year_partition(year)}, "
+        f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE)"
+    )
@@ -0,0 +1,361 @@
+"""statement 실행 시간 profiler
+
+engine 의 before/after_cursor_execute event 로 statement 마다 실행 시간과 row 수를 재고
+profile_calls 로 감싼 service method 별로 모은다. 한 method 호출 안에서 같은 형태의
+statement 가 n_plus_one_threshold 번 이상 실행되면 N+1 로 기록한다.
+
+Use:
+>>> profiler = Database().enable_profiling()
+>>> BlogService().add_post("title", "article", author, tags=["a", "b"])
+>>> profiler.stats()["add_post"]["queries"]
+>>> print(profiler.to_prometheus())
+"""
+import os
+import re
+import json
+import time
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+import weakref
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+UNATTRIBUTED = "(unattributed)"
+# prometheus histogram bucket. 단위는 초
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_PARAM = r"\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*"
+_IN_LIST = re.compile(rf"\((?:{_PARAM},)+{_PARAM}\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """parameter 갯수가 다른 IN (...) 을 하나로 합친 statement 형태"""
+    return _IN_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())
+
+
+class _Call(object):
+    """profile_calls 로 감싼 method 호출 하나"""
+
+    __slots__ = ("method", "shapes")
+
+    def __init__(self, method: str):
+        self.method = method
+        # profiler 별 {statement 형태: 실행 횟수}
+        self.shapes: Dict["QueryProfiler", Counter] = {}
+
+
+_current_call: contextvars.ContextVar = contextvars.ContextVar(
+    "blog_profiled_call", default=None
+)
+_profilers: "weakref.WeakSet[QueryProfiler]" = weakref.WeakSet()
+_attached: "weakref.WeakKeyDictionary[Engine, QueryProfiler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _finish(call: _Call):
+    for profiler, shapes in call.shapes.items():
+        profiler._end_call(call.method, shapes)
+
+
+def _wrap(func, label: str):
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not _profilers or _current_call.get() is not None:
+                return await func(*args, **kwargs)
+            call = _Call(label)
+            token = _current_call.set(call)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _current_call.reset(token)
+                _finish(call)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profilers or _current_call.get() is not None:
+            return func(*args, **kwargs)
+        call = _Call(label)
+        token = _current_call.set(call)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_call.reset(token)
+            _finish(call)
+
+    return wrapper
+
+
+def profile_calls(cls):
+    """class 의 public method 를 profiler 가 method 이름으로 집계하도록 감싼다.
+
+    profiler 가 attach 되어 있지 않으면 바로 원래 method 를 호출한다.
+    method 안에서 다른 public method 를 호출하면 바깥 method 로 집계한다.
+    """
+    for name, func in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(func):
+            setattr(cls, name, _wrap(func, name))
+    return cls
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class _MethodStats(object):
+    def __init__(self, window: int):
+        self.calls = 0
+        self.queries = 0
+        self.rows = 0
+        self.time_total = 0.0
+        self.max_queries_per_call = 0
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.buckets = [0] * len(BUCKETS)
+        self.shapes: Counter = Counter()
+
+    def add(self, shape: str, elapsed: float, rows: Optional[int]):
+        self.queries += 1
+        self.time_total += elapsed
+        if rows is not None and rows > 0:
+            self.rows += rows
+        self.durations.append(elapsed)
+        self.shapes[shape] += 1
+        for idx, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                self.buckets[idx] += 1
+
+    def to_dict(self) -> dict:
+        durations = list(self.durations)
+        p50 = _percentile(durations, 50)
+        p99 = _percentile(durations, 99)
+        return {
+            "calls": self.calls,
+            "queries": self.queries,
+            "queries_per_call": self.queries / self.calls if self.calls else None,
+            "max_queries_per_call": self.max_queries_per_call,
+            "rows": self.rows,
+            "time_total_ms": self.time_total * 1000,
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p99_ms": p99 * 1000 if p99 is not None else None,
+            "top_statements": self.shapes.most_common(5),
+        }
+
+
+class QueryProfiler(object):
+    """engine 에서 실행된 statement 를 service method 별로 집계한다.
+
+    row 수는 DBAPI cursor.rowcount 를 사용한다. sqlite 의 SELECT 처럼 driver 가
+    row 수를 알려주지 않으면 집계하지 않는다.
+
+    Args:
+        slow_query_ms (float): 이보다 오래 걸린 statement 는 warning 으로 기록한다.
+        n_plus_one_threshold (int): 한 호출에서 같은 형태 statement 가 이만큼 반복되면 N+1 로 본다.
+        window (int): p50/p99 를 계산할 최근 statement 갯수
+        keep (int): 보관할 slow query, N+1 기록 갯수
+    """
+
+    def __init__(
+        self,
+        slow_query_ms: float = 100.0,
+        n_plus_one_threshold: int = 5,
+        window: int = 1000,
+        keep: int = 100,
+    ):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.window = window
+        self._lock = threading.Lock()
+        self._methods: Dict[str, _MethodStats] = {}
+        self.slow_queries: Deque[dict] = deque(maxlen=keep)
+        self.n_plus_one: Deque[dict] = deque(maxlen=keep)
+
+    def attach(self, engine: Engine) -> "QueryProfiler":
+        """engine 에 event 를 등록한다. 이미 다른 profiler 가 있으면 바꾼다."""
+        previous = _attached.get(engine)
+        if previous is self:
+            return self
+        if previous is not None:
+            previous.detach(engine)
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        _attached[engine] = self
+        _profilers.add(self)
+        return self
+
+    def detach(self, engine: Engine):
+        if _attached.get(engine) is not self:
+            return
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        del _attached[engine]
+        if self not in _attached.values():
+            _profilers.discard(self)
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info["profiler_start"] = time.perf_counter()
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        elapsed = time.perf_counter() - conn.info.pop("profiler_start")
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+        shape = statement_shape(statement)
+        call = _current_call.get()
+        method = call.method if call is not None else UNATTRIBUTED
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = _MethodStats(self.window)
+            stats.add(shape, elapsed, rows)
+            if call is None:
+                stats.calls += 1
+        if call is not None:
+            call.shapes.setdefault(self, Counter())[shape] += 1
+
+        if elapsed * 1000 >= self.slow_query_ms:
+            log.warning(
+                "slow query %.1fms in %s: %s %r",
+                elapsed * 1000,
+                method,
+                shape,
+                parameters,
+            )
+            with self._lock:
+                self.slow_queries.append(
+                    {
+                        "method": method,
+                        "statement": shape,
+                        "parameters": repr(parameters),
+                        "ms": elapsed * 1000,
+                    }
+                )
+
+    def _end_call(self, method: str, shapes: Counter):
+        queries = sum(shapes.values())
+        repeated = [
+            (shape, count)
+            for shape, count in shapes.items()
+            if count >= self.n_plus_one_threshold
+        ]
+        with self._lock:
+            stats = self._methods[method]
+            stats.calls += 1
+            stats.max_queries_per_call = max(stats.max_queries_per_call, queries)
+            for shape, count in repeated:
+                self.n_plus_one.append(
+                    {"method": method, "statement": shape, "count": count}
+                )
+        for shape, count in repeated:
+            log.warning("possible N+1 in %s: %d x %s", method, count, shape)
+
+    def stats(self) -> Dict[str, dict]:
+        """{method 이름: calls, queries, p50/p99 등}
+
+        profile_calls 로 감싸지 않은 곳에서 실행된 statement 는 "(unattributed)" 로 모으고
+        statement 하나를 호출 하나로 센다.
+        """
+        with self._lock:
+            return {
+                method: stats.to_dict() for method, stats in self._methods.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self.slow_queries.clear()
+            self.n_plus_one.clear()
+
+    def to_json(self) -> str:
+        with self._lock:
+            slow_queries = list(self.slow_queries)
+            n_plus_one = list(self.n_plus_one)
+        return json.dumps(
+            {
+                "methods": self.stats(),
+                "slow_queries": slow_queries,
+                "n_plus_one": n_plus_one,
+            },
+            indent=2,
+        )
+
+    def to_prometheus(self, prefix: str = "blog_db") -> str:
+        """prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_query_duration_seconds statement 실행 시간",
+            f"# TYPE {prefix}_query_duration_seconds histogram",
+        ]
+        with self._lock:
+            methods = sorted(self._methods.items())
+            n_plus_one = Counter(record["method"] for record in self.n_plus_one)
+            for method, stats in methods:
+                label = f'method="{method}"'
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    lines.append(
+                        f'{prefix}_query_duration_seconds_bucket{{{label},le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'{prefix}_query_duration_seconds_bucket{{{label},le="+Inf"}} {stats.queries}'
+                )
+                lines.append(
+                    f"{prefix}_query_duration_seconds_sum{{{label}}} {stats.time_total}"
+                )
+                lines.append(
+                    f"{prefix}_query_duration_seconds_count{{{label}}} {stats.queries}"
+                )
+            for name, help_text, value in [
+                ("calls_total", "service method 호출 수", lambda stats: stats.calls),
+                ("rows_total", "driver 가 알려준 row 수", lambda stats: stats.rows),
+            ]:
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for method, stats in methods:
+                    lines.append(
+                        f'{prefix}_{name}{{method="{method}"}} {value(stats)}'
+                    )
+            lines.append(f"# HELP {prefix}_n_plus_one_total 최근 N+1 감지 수")
+            lines.append(f"# TYPE {prefix}_n_plus_one_total gauge")
+            for method, count in sorted(n_plus_one.items()):
+                lines.append(f'{prefix}_n_plus_one_total{{method="{method}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def profiler_for(engine: Engine) -> Optional[QueryProfiler]:
+    """engine 에 attach 된 profiler"""
+    return _attached.get(engine)
+
+
+_default_profiler = None
+_default_profiler_lock = threading.Lock()
+
+
+def default_profiler() -> QueryProfiler:
+    """process 가 공유하는 QueryProfiler
+
+    DB_SLOW_QUERY_MS, DB_N_PLUS_ONE_THRESHOLD 로 설정한다.
+    """
+    global _default_profiler
+    with _default_profiler_lock:
+        if _default_profiler is None:
+            _default_profiler = QueryProfiler(
+                slow_query_ms=float(os.environ.get("DB_SLOW_QUERY_MS", 100)),
+                n_plus_one_threshold=int(os.environ.get("DB_N_PLUS_ONE_THRESHOLD", 5)),
+            )
+        return _default_profiler
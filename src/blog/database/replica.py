@@ -0,0 +1,95 @@
+"""read replica 선택
+
+read only session 을 만들 replica 를 round robin 또는 least connections 로 고른다.
+연결에 실패한 replica 는 eject_seconds 동안 제외한다.
+"""
+import time
+import logging
+import itertools
+import threading
+from typing import List
+from sqlalchemy.engine import make_url
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+ROUND_ROBIN = "round_robin"
+LEAST_CONNECTIONS = "least_connections"
+POLICIES = (ROUND_ROBIN, LEAST_CONNECTIONS)
+
+
+class Replica(object):
+    def __init__(self, url: str):
+        self.url = url
+        self.in_use = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            # repr 은 password 를 *** 로 가린다.
+            "url": repr(make_url(self.url)),
+            "healthy": self.healthy(now),
+            "in_use": self.in_use,
+            "failures": self.failures,
+        }
+
+
+class ReplicaSet(object):
+    """replica 목록과 상태
+
+    Args:
+        urls (List[str]): replica connection string
+        policy (str): "round_robin" 또는 "least_connections"
+        eject_seconds (float): 실패한 replica 를 제외할 시간
+    """
+
+    def __init__(
+        self, urls: List[str], policy: str = ROUND_ROBIN, eject_seconds: float = 30.0
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown replica policy {policy!r}")
+        self.replicas = [Replica(url) for url in urls]
+        self.policy = policy
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def candidates(self) -> List[Replica]:
+        """시도할 순서대로 정렬한 healthy replica 목록"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy(now)]
+            if not healthy:
+                return []
+            if self.policy == LEAST_CONNECTIONS:
+                return sorted(healthy, key=lambda replica: replica.in_use)
+            start = next(self._next) % len(healthy)
+            return healthy[start:] + healthy[:start]
+
+    def acquire(self, replica: Replica):
+        with self._lock:
+            replica.in_use += 1
+
+    def release(self, replica: Replica):
+        with self._lock:
+            replica.in_use -= 1
+
+    def eject(self, replica: Replica, error: Exception):
+        with self._lock:
+            replica.failures += 1
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+        log.warning(
+            "eject replica %r for %ss: %s",
+            make_url(replica.url),
+            self.eject_seconds,
+            error,
+        )
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [replica.to_dict(now) for replica in self.replicas]
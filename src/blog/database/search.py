@@ -0,0 +1,147 @@
+"""blog_post title, article 전문 검색
+
+sqlite 는 blog_post 를 content table 로 하는 FTS5 virtual table 과 trigger 를,
+mysql 은 FULLTEXT index 를 사용한다. blog_post table 을 만들 때 같이 만들어진다.
+"""
+import re
+from typing import List
+from sqlalchemy import event, inspect, text
+from .model import BlogPost
+
+
+FTS_TABLE = "blog_post_fts"
+MYSQL_FULLTEXT_INDEX = "ix_blog_post_fulltext"
+SNIPPET_LENGTH = 160
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, article, content='blog_post', content_rowid='id'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON blog_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, article)
+        VALUES (new.id, new.title, new.article);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON blog_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, article)
+        VALUES ('delete', old.id, old.title, old.article);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF title, article ON blog_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, article)
+        VALUES ('delete', old.id, old.title, old.article);
+        INSERT INTO {FTS_TABLE}(rowid, title, article)
+        VALUES (new.id, new.title, new.article);
+    END""",
+]
+
+
+class SearchResult(object):
+    """검색 결과. article 전체 대신 snippet 만 가진다."""
+
+    __slots__ = ("id", "title", "snippet", "score")
+
+    def __init__(self, id: int, title: str, snippet: str, score: float):
+        self.id = id
+        self.title = title
+        self.snippet = snippet
+        self.score = score
+
+    def __repr__(self):
+        return f"SearchResult(id={self.id}, title={self.title!r}, score={self.score})"
+
+
+def create_search_index(conn):
+    """검색 index 를 만든다. 이미 있으면 아무것도 하지 않는다."""
+    dialect_name = conn.dialect.name
+    if dialect_name == "sqlite":
+        for ddl in _SQLITE_DDL:
+            conn.exec_driver_sql(ddl)
+    elif dialect_name == "mysql":
+        indexes = inspect(conn).get_indexes(BlogPost.__tablename__)
+        if MYSQL_FULLTEXT_INDEX not in {index["name"] for index in indexes}:
+            conn.exec_driver_sql(
+                f"ALTER TABLE blog_post ADD FULLTEXT INDEX "
+                f"{MYSQL_FULLTEXT_INDEX} (title, article)"
+            )
+
+
+def drop_search_index(conn):
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def rebuild_search_index(conn):
+    """검색 index 를 blog_post 전체로 다시 만든다.
+
+    검색 index 가 생기기 전에 입력된 post 도 검색되도록 한다.
+    """
+    create_search_index(conn)
+    dialect_name = conn.dialect.name
+    if dialect_name == "sqlite":
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif dialect_name == "mysql":
+        conn.exec_driver_sql("OPTIMIZE TABLE blog_post")
+
+
+@event.listens_for(BlogPost.__table__, "after_create")
+def _after_create(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(BlogPost.__table__, "before_drop")
+def _before_drop(target, connection, **kw):
+    drop_search_index(connection)
+
+
+def _terms(query: str) -> List[str]:
+    return [term for term in re.split(r"\W+", query) if term]
+
+
+def search(s, query: str, limit: int, offset: int = 0) -> List[SearchResult]:
+    """관련도 순으로 post 를 검색한다.
+
+    검색어의 단어가 모두 포함된 post 를 찾는다.
+
+    Args:
+        s (Session): session
+        query (str): 검색어
+        limit (int): 가져올 갯수
+        offset (int): skip 값
+
+    Returns:
+        SearchResult 목록
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    dialect_name = s.get_bind().dialect.name
+    params = {"limit": limit, "offset": offset}
+    if dialect_name == "sqlite":
+        # FTS5 문법으로 해석되지 않도록 단어마다 따옴표로 감싼다.
+        params["match"] = " ".join('"' + term.replace('"', "") + '"' for term in terms)
+        stmt = text(
+            f"""SELECT rowid AS id, title,
+                snippet({FTS_TABLE}, 1, '', '', '...', 24) AS snippet,
+                bm25({FTS_TABLE}) AS score
+            FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match
+            ORDER BY score, rowid LIMIT :limit OFFSET :offset"""
+        )
+    elif dialect_name == "mysql":
+        params["match"] = " ".join(f"+{term}" for term in terms)
+        params["first_term"] = terms[0]
+        params["snippet_length"] = SNIPPET_LENGTH
+        stmt = text(
+            """SELECT id, title,
+                SUBSTRING(article, GREATEST(LOCATE(:first_term, article) - 40, 1),
+                    :snippet_length) AS snippet,
+                MATCH(title, article) AGAINST (:match IN BOOLEAN MODE) AS score
+            FROM blog_post
+            WHERE MATCH(title, article) AGAINST (:match IN BOOLEAN MODE)
+            ORDER BY score DESC, id LIMIT :limit OFFSET :offset"""
+        )
+    else:
+        raise NotImplementedError(f"full text search is not supported on {dialect_name}")
+    return [
+        SearchResult(row.id, row.title, row.snippet, row.score)
+        for row in s.execute(stmt, params)
+    ]
@@ -0,0 +1,137 @@
+"""file sqlite 성능 설정
+
+connect 할 때 PRAGMA 로 WAL, synchronous=NORMAL, mmap, cache, busy timeout,
+foreign key 를 설정한다. WAL 에서는 reader 와 writer 가 서로 막지 않으므로 read 는
+pool 의 connection 으로 동시에 실행하고, write 는 process 내에서 WriterQueue 로
+하나씩 실행해서 writer 끼리 lock 을 다투다 database is locked 가 나지 않게 한다.
+
+DB_SQLITE_TUNING=false 로 끌 수 있고 PRAGMA 값은 DB_SQLITE_<PRAGMA 이름> 으로 바꾼다.
+예) DB_SQLITE_SYNCHRONOUS=FULL, DB_SQLITE_MMAP_SIZE=0
+
+foreign_keys 기본값 AUTO 는 schema 가 migrate.FOREIGN_KEYS_VERSION 이상으로 upgrade 된
+database 에서만 foreign key 를 검사한다. 그 전 schema 는 blog_post_tag 의 foreign key 가
+바뀌어 있어서 tag 를 붙이는 write 가 모두 실패한다.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .migrate import FOREIGN_KEYS_VERSION, schema_version
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+DEFAULT_PRAGMAS = {
+    # reader 가 writer 를 막지 않는다. database file 에 저장되는 설정이다.
+    "journal_mode": "WAL",
+    # WAL 에서는 checkpoint 때만 fsync 해도 database 가 깨지지 않는다.
+    "synchronous": "NORMAL",
+    # ON, OFF 또는 schema version 으로 정하는 AUTO
+    "foreign_keys": "AUTO",
+    # lock 을 얻지 못하면 바로 실패하지 않고 ms 동안 기다린다.
+    "busy_timeout": 5000,
+    # 음수는 KiB 단위. 64 MiB
+    "cache_size": -65536,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def is_file_sqlite(connection_string: str) -> bool:
+    return connection_string.startswith("sqlite") and not (
+        ":memory:" in connection_string or connection_string.split("://")[1] == ""
+    )
+
+
+def sqlite_pragmas() -> Dict[str, object]:
+    """DEFAULT_PRAGMAS 에 DB_SQLITE_<PRAGMA 이름> 환경변수를 반영한 PRAGMA 목록"""
+    return {
+        name: os.environ.get(f"DB_SQLITE_{name.upper()}", value)
+        for name, value in DEFAULT_PRAGMAS.items()
+    }
+
+
+def _schema_version(cursor) -> int:
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (schema_version.name,),
+    )
+    if cursor.fetchone() is None:
+        return 0
+    cursor.execute(f"SELECT max(version) FROM {schema_version.name}")
+    return cursor.fetchone()[0] or 0
+
+
+def install_pragmas(engine: Engine, pragmas: Dict[str, object]):
+    """connection 을 만들 때마다 PRAGMA 를 실행한다.
+
+    foreign_keys=AUTO 는 connect 할 때의 schema version 으로 정하므로
+    upgrade 한 뒤에는 pool 을 비워야 새 connection 에 반영된다.
+    async engine 은 engine.sync_engine 을 넘긴다.
+    """
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if name == "foreign_keys" and str(value).upper() == "AUTO":
+                    current = _schema_version(cursor) >= FOREIGN_KEYS_VERSION
+                    value = "ON" if current else "OFF"
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def optimize(engine: Engine, pid: int = None):
+    """PRAGMA optimize 로 통계를 갱신한다. process 가 끝날 때 실행한다.
+
+    fork 된 process 에서는 부모의 engine 을 사용하지 않도록 pid 가 다르면 실행하지 않는다.
+    """
+    if pid is not None and pid != os.getpid():
+        return
+    if not os.path.exists(engine.url.database):
+        # 임시 directory 등에서 file 이 이미 지워진 경우
+        return
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+    except Exception as e:
+        log.warning("PRAGMA optimize failed: %s", e)
+
+
+class WriterQueue(object):
+    """process 내의 write transaction 을 하나씩 실행한다.
+
+    같은 thread 에서 다시 얻을 수 있다.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self.writes = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    @contextmanager
+    def hold(self):
+        start = time.perf_counter()
+        with self._lock:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.writes += 1
+                self.wait_time_total += elapsed
+                self.wait_time_max = max(self.wait_time_max, elapsed)
+            yield
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "writes": self.writes,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+            }
@@ -0,0 +1,17 @@
+"""post 전체 내보내기
+
+Use:
+    python export_posts.py posts.jsonl.gz
+    python export_posts.py posts.csv --format csv --after-id 1000
+"""
+import argparse
+import dotenv
+from service.blog import BlogService
+
+dotenv.load_dotenv()
+parser = argparse.ArgumentParser()
+parser.add_argument("target")
+parser.add_argument("--format", default="jsonl", choices=["jsonl", "csv"])
+parser.add_argument("--after-id", type=int)
+args = parser.parse_args()
+print(BlogService().export_posts_to(args.target, args.format, after_id=args.after_id))
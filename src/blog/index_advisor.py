@@ -0,0 +1,205 @@
+"""BlogService 의 모든 query 실행 계획을 확인해서 full scan 을 찾는다.
+
+seed data 를 넣은 database 에서 service method 를 호출하고
+EXPLAIN (mysql) / EXPLAIN QUERY PLAN (sqlite) 결과에 full scan 이 있으면 exit code 1 로 종료한다.
+
+기본은 임시 sqlite file 을 사용한다. --url 로 다른 database 를 지정할 수 있지만
+table 이 있는 database 는 --reset 을 주지 않으면 실행하지 않는다. --reset 은 모든 table 을 지운다.
+
+Use:
+    python index_advisor.py
+    python index_advisor.py --url "mysql+pymysql://user:pw@host/scratch?charset=utf8mb4"
+    python index_advisor.py --url "mysql+pymysql://..." --reset
+"""
+import os
+import sys
+import argparse
+import datetime
+import logging
+import tempfile
+import dotenv
+from sqlalchemy import inspect
+from database import Database
+from database.model import Base
+from database.advisor import StatementRecorder, analyze
+from service.blog import BlogService
+from service.cache import NullCache
+from service.views import ViewCounter
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+# 의도적으로 전체를 읽는 method
+ALLOWED_FULL_SCANS = {
+    "get_tags": ["blog_tag"],
+    # 전체를 다시 계산하는 batch 작업
+    "reconcile_post_counts": ["blog_tag", "blog_category", "blog_post_month"],
+}
+
+
+def seed(bs: BlogService, authors=20, posts=500, tags=30):
+    def records():
+        for name in ["python", "javascript", "go"]:
+            yield {"type": "category", "name": name}
+        for idx in range(authors):
+            yield {"type": "author", "email": f"{idx}@example.com", "name": f"a{idx}"}
+        for idx in range(posts):
+            yield {
+                "type": "post",
+                "title": f"title {idx}",
+                "article": f"article {idx}",
+                "author_email": f"{idx % authors}@example.com",
+                "category": ["python", "javascript", "go"][idx % 3],
+                "tags": [f"tag{idx % tags}", f"tag{(idx * 7) % tags}"],
+            }
+
+    bs.bulk_import(records())
+
+
+def run_scenario(bs: BlogService, recorder: StatementRecorder):
+    """모든 BlogService method 를 한번씩 호출한다."""
+    with recorder.recording("add_author"):
+        author_id = bs.add_author("advisor@example.com", "advisor")
+    with recorder.recording("get_author_by_id"):
+        author = bs.get_author_by_id(author_id)
+    with recorder.recording("get_author_by_email"):
+        bs.get_author_by_email("1@example.com")
+    with recorder.recording("mod_author_partial"):
+        bs.mod_author_partial(author_id, first_name="index")
+    with recorder.recording("mod_author"):
+        bs.mod_author(author)
+    with recorder.recording("add_category"):
+        bs.add_category("advisor")
+    with recorder.recording("get_category_by_name"):
+        category = bs.get_category_by_name("python")
+    with recorder.recording("get_category_by_id"):
+        bs.get_category_by_id(category.id)
+    with recorder.recording("add_post"):
+        post_id = bs.add_post("title", "article", author, category, ["tag1", "new"])
+    with recorder.recording("mod_post_partial"):
+        bs.mod_post_partial(post_id, new_title="new", new_tags=["tag2", "new"])
+    with recorder.recording("get_post_by_id"):
+        bs.get_post_by_id(post_id)
+    with recorder.recording("get_posts_by_author"):
+        bs.get_posts_by_author(author, limit=5, offset=5)
+    with recorder.recording("get_posts_by_category_name"):
+        bs.get_posts_by_category_name("python", limit=5, offset=5)
+    for order_by in ["id", "date_published"]:
+        with recorder.recording("get_posts_by_author_page"):
+            author = bs.get_author_by_id(1)
+            page = bs.get_posts_by_author_page(author, 5, order_by=order_by)
+            bs.get_posts_by_author_page(author, 5, page.next_cursor, order_by)
+        with recorder.recording("get_posts_by_category_name_page"):
+            page = bs.get_posts_by_category_name_page("python", 5, order_by=order_by)
+            bs.get_posts_by_category_name_page("python", 5, page.next_cursor, order_by)
+    with recorder.recording("get_posts_by_tags"):
+        page = bs.get_posts_by_tags(["tag1", "tag2"], limit=5)
+        bs.get_posts_by_tags(["tag1", "tag2"], cursor=page.next_cursor, limit=5)
+        page = bs.get_posts_by_tags(["tag1", "tag8", "new"], mode="all", limit=5)
+        bs.get_posts_by_tags(["tag1", "tag8"], "all", page.next_cursor, limit=5)
+    with recorder.recording("get_recent_posts"):
+        page = bs.get_recent_posts(limit=5)
+        bs.get_recent_posts(5, page.next_cursor)
+    with recorder.recording("get_archive_posts"):
+        now = datetime.datetime.utcnow()
+        page = bs.get_archive_posts(now.year, now.month, limit=5)
+        bs.get_archive_posts(now.year, now.month, 5, page.next_cursor)
+        bs.get_archive_posts(now.year - 1)
+    with recorder.recording("get_archive_months"):
+        bs.get_archive_months()
+        bs.get_archive_months(now.year)
+    with recorder.recording("add_comment"):
+        comment_id = bs.add_comment(post_id, author, "comment")
+        bs.add_comment(post_id, author, "comment")
+    with recorder.recording("get_comments"):
+        page = bs.get_comments(post_id, limit=1)
+        bs.get_comments(post_id, 1, page.next_cursor)
+    with recorder.recording("get_comments_by_posts"):
+        bs.get_comments_by_posts([post_id, 1, 2])
+        bs.get_comments_by_posts([post_id, 1, 2], limit_per_post=1)
+    with recorder.recording("delete_comment"):
+        bs.delete_comment(comment_id)
+    with recorder.recording("get_most_viewed_posts"):
+        bs.add_view(post_id, 3)
+        bs.view_counter.flush()
+        bs.get_most_viewed_posts(5)
+    with recorder.recording("search_posts"):
+        bs.search_posts("title article")
+    with recorder.recording("get_post_summary"):
+        bs.get_post_summary(post_id, excerpt_length=20)
+    with recorder.recording("get_post_article"):
+        bs.get_post_article(post_id)
+    with recorder.recording("get_post_summaries_by_author"):
+        page = bs.get_post_summaries_by_author(bs.get_author_by_id(1), limit=5)
+        bs.get_post_summaries_by_author(bs.get_author_by_id(1), 5, page.next_cursor)
+    with recorder.recording("get_post_summaries_by_category_name"):
+        page = bs.get_post_summaries_by_category_name("python", limit=5)
+        bs.get_post_summaries_by_category_name("python", 5, page.next_cursor)
+    with recorder.recording("get_tags"):
+        bs.get_tags()
+    with recorder.recording("get_top_tags"):
+        bs.get_top_tags(5)
+    with recorder.recording("get_tags_page"):
+        page = bs.get_tags_page(limit=5)
+        bs.get_tags_page(5, page.next_cursor)
+    with recorder.recording("reconcile_post_counts"):
+        bs.reconcile_post_counts()
+
+
+def advise(db: Database, reset: bool = False):
+    """seed 후 scenario 를 실행하고 full scan 하는 statement 목록을 돌려준다.
+
+    Args:
+        db (Database): seed 를 넣을 빈 database
+        reset (bool): table 이 이미 있으면 모두 지우고 다시 만든다.
+
+    Raises:
+        ValueError: reset 없이 table 이 있는 database 를 넘긴 경우
+    """
+    existing = set(inspect(db.engine).get_table_names()) & set(Base.metadata.tables)
+    if existing and not reset:
+        raise ValueError(
+            f"{db.engine.url!r} already has tables {sorted(existing)}; "
+            "use an empty scratch database or reset=True to drop them"
+        )
+    if existing:
+        db.drop_all()
+    db.upgrade()
+    # cache 를 사용하면 query 가 실행되지 않으므로 끈다.
+    bs = BlogService(cache=NullCache(), view_counter=ViewCounter(db))
+    bs.db = db
+    seed(bs)
+    with StatementRecorder(db.engine) as recorder:
+        run_scenario(bs, recorder)
+    return analyze(db.engine, recorder.statements, ALLOWED_FULL_SCANS)
+
+
+def main():
+    dotenv.load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="scratch database. 없으면 임시 sqlite file")
+    parser.add_argument(
+        "--reset", action="store_true", help="drop all tables of --url first"
+    )
+    args = parser.parse_args()
+    if args.url is None:
+        path = os.path.join(tempfile.mkdtemp(), "advisor.db")
+        db = Database(f"sqlite:///{path}")
+    else:
+        db = Database(args.url)
+    try:
+        flagged = advise(db, reset=args.reset)
+    except ValueError as e:
+        parser.exit(2, f"{e}\n")
+    for captured in flagged:
+        print(f"FULL SCAN {captured.full_scans}: {captured}")
+        for line in captured.plan:
+            print(f"    {line}")
+    if not flagged:
+        print("no full scans")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
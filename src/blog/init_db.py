@@ -1,7 +1,24 @@
+"""database schema 를 만들거나 최신으로 바꾼다.
+
+기존 data 는 유지하고 없는 table, column, index 를 추가하고 migration 을 실행한다.
+처음 schema 로 만든 database 는 blog_post_tag 의 foreign key 가 바뀌어 있으므로 새 code 로
+실행하기 전에 반드시 upgrade 해야 한다. (database/model.py 의 blog_post_tag 참고)
+--reset 이면 모든 table 을 지우고 다시 만든다.
+
+Use:
+    python init_db.py
+    python init_db.py --reset
+"""
+import argparse
 import dotenv
 from service.blog import BlogService
 
 dotenv.load_dotenv()
+parser = argparse.ArgumentParser()
+parser.add_argument("--reset", action="store_true", help="drop all tables first")
+args = parser.parse_args()
+
 bs = BlogService()
-bs.db.drop_all()
-bs.db.create_all()
+if args.reset:
+    bs.db.drop_all()
+print(bs.db.upgrade() or "schema is up to date")
@@ -0,0 +1,36 @@
+"""mysql blog_post 를 연도별 range partition 으로 바꾼다.
+
+foreign key 와 FULLTEXT index 를 제거하므로 database/partition.py 를 확인하고 실행한다.
+--apply 가 없으면 실행할 DDL 만 출력한다.
+
+Use:
+    DBMS=mysql python partition_posts.py 2015 2022
+    DBMS=mysql python partition_posts.py 2015 2022 --apply
+    DBMS=mysql python partition_posts.py --add-year 2023 --apply
+"""
+import argparse
+import dotenv
+from database import Database
+from database.partition import add_year_partition_statement, partition_statements
+
+dotenv.load_dotenv()
+parser = argparse.ArgumentParser()
+parser.add_argument("first_year", type=int, nargs="?")
+parser.add_argument("last_year", type=int, nargs="?")
+parser.add_argument("--add-year", type=int)
+parser.add_argument("--apply", action="store_true")
+args = parser.parse_args()
+
+with Database().engine.begin() as conn:
+    if conn.dialect.name != "mysql":
+        parser.exit(1, "partition 은 mysql 만 지원합니다.\n")
+    if args.add_year is not None:
+        stmts = [add_year_partition_statement(args.add_year)]
+    elif args.first_year is not None and args.last_year is not None:
+        stmts = partition_statements(conn, args.first_year, args.last_year)
+    else:
+        parser.error("first_year last_year 또는 --add-year 가 필요합니다.")
+    for stmt in stmts:
+        print(f"{stmt};")
+        if args.apply:
+            conn.exec_driver_sql(stmt)
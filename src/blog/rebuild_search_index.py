@@ -0,0 +1,5 @@
+import dotenv
+from database import Database
+
+dotenv.load_dotenv()
+Database().rebuild_search_index()
@@ -0,0 +1,5 @@
+import dotenv
+from service.blog import BlogService
+
+dotenv.load_dotenv()
+print(BlogService().reconcile_post_counts())
@@ -0,0 +1,320 @@
+import functools
+import sqlalchemy
+from typing import List
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from database.model import BlogAuthor, BlogCategory, BlogPost, BlogTag
+from database import insert_ignore
+from database.aio import AsyncDatabase
+from database.profiler import profile_calls
+from service.blog import (
+    AuthorNotExist,
+    BlogService,
+    CategoryNotExist,
+    InvalidCursor,
+    PostNotExist,
+    VersionConflict,
+    validate_author_fields,
+)
+from service.counts import (
+    change_deltas,
+    month_count_updates,
+    month_deltas,
+    post_count_updates,
+)
+from service.cache import CacheBackend, default_cache
+from service.page_cache import PostPageCache, default_page_cache
+from service.pagination import Page, keyset_query, make_page
+
+
+def _translate(exception_class, *errors):
+    """coroutine 에서 발생한 errors 를 exception_class 로 바꾼다."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except errors as e:
+                raise exception_class(e)
+
+        return wrapper
+
+    return decorator
+
+
+handle_author_not_exist = _translate(AuthorNotExist, sqlalchemy.orm.exc.NoResultFound)
+handle_post_not_exist = _translate(PostNotExist, sqlalchemy.orm.exc.NoResultFound)
+handle_category_not_exist = _translate(
+    CategoryNotExist, sqlalchemy.orm.exc.NoResultFound
+)
+handle_invalid_cursor = _translate(InvalidCursor, ValueError)
+handle_version_conflict = _translate(
+    VersionConflict, sqlalchemy.orm.exc.StaleDataError
+)
+
+
+def _check_version(obj, expected_version: int):
+    if expected_version is not None and obj.version != expected_version:
+        raise VersionConflict(
+            f"{obj.__tablename__} {obj.id} is not version {expected_version}"
+        )
+
+
+async def _all(s, stmt) -> list:
+    # joined eager load 는 author, category 뿐이라 post 마다 row 가 하나다.
+    # tags 는 selectin 으로 따로 가져오므로 unique() 가 필요 없다.
+    return (await s.execute(stmt)).scalars().all()
+
+
+async def _one(s, stmt):
+    return (await s.execute(stmt)).scalars().one()
+
+
+@profile_calls
+class AsyncBlogService:
+    """BlogService 의 asyncio 버전
+
+    BlogService 와 method 이름, 인자, 예외가 같다.
+    lazy="dynamic" relationship 은 async 에서 사용할 수 없으므로 목록은 select 로 직접 조회한다.
+    그래서 get_posts_by_author, get_posts_by_category_name 은 author, category 가 없으면
+    예외 대신 빈 목록을 돌려준다.
+    post, author, category 를 바꾸면 같은 process 의 BlogService 가 사용하는 cache 와
+    page cache 에서 BlogService 와 같은 key 를 지운다. 조회는 cache 를 사용하지 않는다.
+
+    Args:
+        db (AsyncDatabase): None 이면 환경변수로 만든다.
+        cache (CacheBackend): None 이면 default_cache()
+        page_cache (PostPageCache): None 이면 default_page_cache()
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase = None,
+        cache: CacheBackend = None,
+        page_cache: PostPageCache = None,
+    ):
+        self.db = db or AsyncDatabase()
+        self.cache = cache if cache is not None else default_cache()
+        self.page_cache = (
+            page_cache if page_cache is not None else default_page_cache()
+        )
+
+    _invalidate_author = BlogService._invalidate_author
+    _invalidate_post = BlogService._invalidate_post
+
+    async def _get_or_create_tags(self, s, tag_names: List[str]) -> List[BlogTag]:
+        """BlogService._get_or_create_tags 와 같다."""
+        names = list(dict.fromkeys(tag_names))
+        if not names:
+            return []
+        stmt = select(BlogTag).where(BlogTag.name.in_(names))
+        tags = {tag.name: tag for tag in await _all(s, stmt)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            dialect_name = s.bind.dialect.name
+            await s.execute(
+                insert_ignore(BlogTag.__table__, dialect_name, ["name"]),
+                [{"name": name} for name in missing],
+            )
+            stmt = select(BlogTag).where(BlogTag.name.in_(missing))
+            for tag in await _all(s, stmt):
+                tags[tag.name] = tag
+        return [tags[name] for name in names]
+
+    async def add_author(self, email, name, last_name=None, first_name=None) -> int:
+        async with self.db.session_scope() as s:
+            new_author = BlogAuthor(
+                email=email, name=name, last_name=last_name, first_name=first_name
+            )
+            s.add(new_author)
+        return new_author.id
+
+    @handle_version_conflict
+    @handle_author_not_exist
+    async def mod_author(self, author: BlogAuthor) -> bool:
+        async with self.db.session_scope() as s:
+            s.add(author)
+        self._invalidate_author(author.id)
+        return True
+
+    @handle_version_conflict
+    @handle_author_not_exist
+    async def mod_author_partial(
+        self, author_id: int, expected_version: int = None, **kwargs
+    ) -> bool:
+        async with self.db.session_scope() as s:
+            obj = await _one(s, select(BlogAuthor).where(BlogAuthor.id == author_id))
+            _check_version(obj, expected_version)
+            for k, v in validate_author_fields(kwargs).items():
+                setattr(obj, k, v)
+            s.add(obj)
+        self._invalidate_author(author_id)
+        return True
+
+    async def get_author_by_email(self, email: str) -> BlogAuthor:
+        async with self.db.session_scope() as s:
+            stmt = select(BlogAuthor).where(BlogAuthor.email == email)
+            return (await s.execute(stmt)).scalars().one_or_none()
+
+    @handle_author_not_exist
+    async def get_author_by_id(self, id: int) -> BlogAuthor:
+        async with self.db.session_scope() as s:
+            return await _one(s, select(BlogAuthor).where(BlogAuthor.id == id))
+
+    async def add_post(
+        self,
+        title: str,
+        article: str,
+        author: BlogAuthor,
+        category: BlogCategory = None,
+        tags: List[str] = None,
+    ) -> int:
+        # 동시에 실행되는 coroutine 이 같은 author 객체를 넘길 수 있으므로
+        # 객체를 session 에 붙이지 않고 id 만 사용한다.
+        async with self.db.session_scope() as s:
+            new_post = BlogPost(title=title, article=article, author_id=author.id)
+            if category is not None:
+                new_post.category_id = category.id
+            tag_ids = []
+            if tags is not None:
+                post_tags = await self._get_or_create_tags(s, tags)
+                new_post.tags.extend(post_tags)
+                tag_ids = [tag.id for tag in post_tags]
+            s.add(new_post)
+            await s.flush()
+            for stmt in post_count_updates(
+                dict.fromkeys(tag_ids, 1), {new_post.category_id: 1}
+            ) + month_count_updates(
+                s.bind.dialect.name, month_deltas([new_post.date_published])
+            ):
+                await s.execute(stmt)
+        self._invalidate_post(None, new_post.category_id)
+        return new_post.id
+
+    @handle_version_conflict
+    @handle_post_not_exist
+    async def mod_post_partial(
+        self,
+        post_id: int,
+        new_title: str = None,
+        new_article: str = None,
+        new_category: BlogCategory = None,
+        new_tags: List[str] = None,
+        expected_version: int = None,
+    ) -> bool:
+        async with self.db.session_scope() as s:
+            post = await _one(s, select(BlogPost).where(BlogPost.id == post_id))
+            _check_version(post, expected_version)
+            old_tag_ids = [tag.id for tag in post.tags]
+            old_category_id = post.category_id
+            if new_title is not None:
+                post.title = new_title
+            if new_article is not None:
+                post.article = new_article
+            if new_category is not None:
+                post.category_id = new_category.id
+            if new_tags is not None:
+                tags = await self._get_or_create_tags(s, new_tags)
+                tag_ids = {tag.id for tag in tags}
+                for tag in [tag for tag in post.tags if tag.id not in tag_ids]:
+                    post.tags.remove(tag)
+                current_ids = {tag.id for tag in post.tags}
+                post.tags.extend(tag for tag in tags if tag.id not in current_ids)
+            s.add(post)
+            await s.flush()
+            for stmt in post_count_updates(
+                change_deltas(old_tag_ids, [tag.id for tag in post.tags]),
+                change_deltas([old_category_id], [post.category_id]),
+            ):
+                await s.execute(stmt)
+        if post.category_id != old_category_id:
+            self._invalidate_post(post_id, old_category_id, post.category_id)
+        else:
+            self._invalidate_post(post_id)
+        return True
+
+    @handle_post_not_exist
+    async def get_post_by_id(self, post_id: int) -> BlogPost:
+        async with self.db.session_scope() as s:
+            stmt = (
+                select(BlogPost)
+                .where(BlogPost.id == post_id)
+                .options(
+                    joinedload(BlogPost.author),
+                    joinedload(BlogPost.category),
+                    selectinload(BlogPost.tags),
+                )
+            )
+            return await _one(s, stmt)
+
+    async def add_category(self, name: str) -> int:
+        async with self.db.session_scope() as s:
+            new_category = BlogCategory(name=name)
+            s.add(new_category)
+        self.cache.delete(f"category_name:{name}")
+        return new_category.id
+
+    @handle_category_not_exist
+    async def get_category_by_id(self, id: int) -> BlogCategory:
+        async with self.db.session_scope() as s:
+            return await _one(s, select(BlogCategory).where(BlogCategory.id == id))
+
+    @handle_category_not_exist
+    async def get_category_by_name(self, name: str) -> BlogCategory:
+        async with self.db.session_scope() as s:
+            stmt = select(BlogCategory).where(BlogCategory.name == name)
+            return await _one(s, stmt)
+
+    async def get_posts_by_category_name(
+        self, name: str, limit=5, offset=0
+    ) -> List[BlogPost]:
+        async with self.db.session_scope() as s:
+            stmt = (
+                select(BlogPost)
+                .join(BlogCategory, BlogPost.category_id == BlogCategory.id)
+                .where(BlogCategory.name == name)
+                .order_by(BlogPost.id.desc())
+                .offset(offset)
+                .limit(limit)
+            )
+            return await _all(s, stmt)
+
+    async def get_posts_by_author(
+        self, author: BlogAuthor, limit=5, offset=0
+    ) -> List[BlogPost]:
+        async with self.db.session_scope() as s:
+            stmt = (
+                select(BlogPost)
+                .where(BlogPost.author_id == author.id)
+                .order_by(BlogPost.id.desc())
+                .offset(offset)
+                .limit(limit)
+            )
+            return await _all(s, stmt)
+
+    @handle_invalid_cursor
+    async def get_posts_by_author_page(
+        self, author: BlogAuthor, limit=5, cursor: str = None, order_by="id"
+    ) -> Page[BlogPost]:
+        async with self.db.session_scope() as s:
+            stmt = select(BlogPost).where(BlogPost.author_id == author.id)
+            stmt = keyset_query(stmt, BlogPost, order_by, limit, cursor)
+            return make_page(await _all(s, stmt), order_by, limit)
+
+    @handle_invalid_cursor
+    async def get_posts_by_category_name_page(
+        self, name: str, limit=5, cursor: str = None, order_by="id"
+    ) -> Page[BlogPost]:
+        async with self.db.session_scope() as s:
+            stmt = (
+                select(BlogPost)
+                .join(BlogCategory, BlogPost.category_id == BlogCategory.id)
+                .where(BlogCategory.name == name)
+            )
+            stmt = keyset_query(stmt, BlogPost, order_by, limit, cursor)
+            return make_page(await _all(s, stmt), order_by, limit)
+
+    async def get_tags(self) -> List[BlogTag]:
+        async with self.db.session_scope() as s:
+            return (await s.execute(select(BlogTag))).scalars().all()
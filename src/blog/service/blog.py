@@ -1,9 +1,63 @@
+import datetime
 import functools
 import sqlalchemy
-from typing import List
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Union
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.orm import joinedload
-from database.model import BlogAuthor, BlogCategory, BlogPost, BlogTag
-from database import Database
+from sqlalchemy.orm.util import identity_key
+from database.model import (
+    BlogAuthor,
+    BlogCategory,
+    BlogPost,
+    BlogPostMonth,
+    BlogTag,
+    Comment,
+    blog_post_tag,
+    counter_values,
+)
+from database import Database, insert_ignore
+from database.profiler import profile_calls
+from database.search import SearchResult, search
+from service.importer import BulkImporter, ImportReport, DEFAULT_BATCH_SIZE
+from service.pagination import (
+    Page,
+    decode_cursor,
+    encode_cursor,
+    keyset_page,
+    keyset_query,
+    make_page,
+)
+from service.summary import PostSummary, summary_select, to_summaries
+from service.loading import DEFAULT_PROFILE, PROFILES, post_load_options
+from service.cache import (
+    MISSING,
+    CacheBackend,
+    TransactionalCache,
+    default_cache,
+    detached_copy,
+)
+from service.page_cache import (
+    PostPage,
+    PostPageCache,
+    default_page_cache,
+    load_pages,
+)
+from service.views import ViewCounter, default_view_counter
+from service.counts import (
+    change_deltas,
+    month_count_updates,
+    month_deltas,
+    post_count_updates,
+    reconcile_months,
+    reconcile_statements,
+)
+from service.tagged import MODES as TAG_MODES, tagged_post_ids
+from service.export import (
+    DEFAULT_EXPORT_BATCH_SIZE,
+    ExportReport,
+    iter_posts,
+    write_posts,
+)
 
 
 class BlogServiceException(Exception):
@@ -22,6 +76,47 @@ class CategoryNotExist(BlogServiceException):
     pass
 
 
+class CommentNotExist(BlogServiceException):
+    pass
+
+
+class InvalidCursor(BlogServiceException):
+    pass
+
+
+class InvalidArchiveDate(BlogServiceException):
+    """archive 의 연도나 월이 잘못된 경우"""
+
+    pass
+
+
+class InvalidField(BlogServiceException):
+    """변경할 수 없는 field 이름을 넘긴 경우"""
+
+    pass
+
+
+class VersionConflict(BlogServiceException):
+    """다른 곳에서 먼저 변경해서 version 이 맞지 않는 경우"""
+
+    pass
+
+
+class InvalidProfile(BlogServiceException):
+    """loading profile 이 PROFILES 에 없는 경우"""
+
+    pass
+
+
+class ExportInterrupted(BlogServiceException):
+    """export 가 중간에 실패한 경우. last_id 다음부터 이어서 export 할 수 있다."""
+
+    def __init__(self, error: Exception, report: ExportReport):
+        super().__init__(f"{error} ({report})")
+        self.report = report
+        self.last_id = report.last_id
+
+
 def handle_author_not_exist(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -44,6 +139,39 @@ def handle_post_not_exist(func):
     return wrapper
 
 
+def handle_comment_not_exist(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except sqlalchemy.orm.exc.NoResultFound as e:
+            raise CommentNotExist(e)
+
+    return wrapper
+
+
+def handle_invalid_cursor(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except ValueError as e:
+            raise InvalidCursor(e)
+
+    return wrapper
+
+
+def handle_version_conflict(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except sqlalchemy.orm.exc.StaleDataError as e:
+            raise VersionConflict(e)
+
+    return wrapper
+
+
 def handle_category_not_exist(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -55,9 +183,201 @@ def handle_category_not_exist(func):
     return wrapper
 
 
+def _check_profile(profile: str):
+    # cursor 의 ValueError 와 구분되도록 query 전에 확인한다.
+    if profile not in PROFILES:
+        raise InvalidProfile(f"profile must be one of {PROFILES}")
+
+
+def _expire(s, model, id: int, attribute_names: List[str] = None):
+    """Core 문으로 변경한 row 가 session 에 있으면 다음에 접근할 때 다시 읽도록 한다.
+    Database.transaction 중에는 session 의 객체를 재사용하기 때문에 필요하다.
+    """
+    obj = s.identity_map.get(identity_key(model, id))
+    if obj is not None:
+        s.expire(obj, attribute_names)
+
+
+def _month_range(year: int, month: int = None):
+    """연도 또는 월의 [시작, 끝) datetime
+
+    Raises:
+        InvalidArchiveDate: month 가 1~12 가 아니거나 year 가 datetime 범위 밖인 경우
+    """
+    if not datetime.MINYEAR <= year < datetime.MAXYEAR:
+        raise InvalidArchiveDate(f"invalid archive year {year}")
+    if month is not None and not 1 <= month <= 12:
+        raise InvalidArchiveDate(f"invalid archive month {month}")
+    if month is None:
+        return datetime.datetime(year, 1, 1), datetime.datetime(year + 1, 1, 1)
+    start = datetime.datetime(year, month, 1)
+    if month == 12:
+        return start, datetime.datetime(year + 1, 1, 1)
+    return start, datetime.datetime(year, month + 1, 1)
+
+
+# mod_author_partial 로 변경할 수 있는 column. import 할 때 한번만 계산한다.
+AUTHOR_FIELDS = frozenset(
+    column.key for column in BlogAuthor.__table__.columns
+) - {"id", "version", "created_at", "updated_at"}
+
+
+def validate_author_fields(fields: dict) -> dict:
+    """AUTHOR_FIELDS 에 없는 field 가 있으면 InvalidField"""
+    unknown = fields.keys() - AUTHOR_FIELDS
+    if unknown:
+        raise InvalidField(
+            f"unknown author fields {sorted(unknown)}, allowed {sorted(AUTHOR_FIELDS)}"
+        )
+    return fields
+
+
+@profile_calls
 class BlogService:
-    def __init__(self):
+    def __init__(
+        self,
+        cache: CacheBackend = None,
+        view_counter: ViewCounter = None,
+        page_cache: PostPageCache = None,
+    ):
         self.db = Database()
+        self.cache = TransactionalCache(cache if cache is not None else default_cache())
+        self.page_cache = (
+            page_cache if page_cache is not None else default_page_cache()
+        )
+        self._view_counter = view_counter
+
+    @property
+    def view_counter(self) -> ViewCounter:
+        if self._view_counter is None:
+            self._view_counter = default_view_counter()
+        return self._view_counter
+
+    def transaction(self):
+        """이 block 안의 service method 가 하나의 session 과 transaction 을 공유한다.
+        block 이 끝날 때 한번 commit 하고 exception 이 발생하면 전체를 rollback 한다.
+        block 안에서 돌려받은 객체는 session 에 붙어 있으므로 입력/변경한 author, category 를
+        다시 조회할 때 query 를 실행하지 않는다. cache 는 사용하지 않는다.
+
+        Use:
+        >>> bs = BlogService()
+        >>> with bs.transaction():
+        ...     author = bs.get_author_by_id(bs.add_author("a@b.c", "a"))
+        ...     post_id = bs.add_post("title", "article", author, tags=["python"])
+        ...     bs.mod_post_partial(post_id, new_tags=["python", "pip"])
+        """
+        return self.db.transaction()
+
+    def independent(self):
+        """transaction 중에도 이 block 안의 service method 는 따로 commit 한다.
+        sqlite 는 writer 가 하나뿐이라 transaction 이 이미 write 한 뒤에 block 안에서
+        write 하면 IndependentWriteError 를 raise 한다. write 는 transaction 의 write 보다 먼저 한다.
+
+        Use:
+        >>> with bs.transaction():
+        ...     with bs.independent():
+        ...         bs.add_category("python")  # transaction 이 rollback 되어도 남는다.
+        ...     post_id = bs.add_post("title", "article", author)
+        """
+        return self.db.independent()
+
+    def _cached(self, key: str, loader):
+        """cache 에 있으면 cache 의 복사본, 없으면 loader 로 가져와서 저장한다.
+        None 은 저장하지 않는다.
+        """
+        value = self.cache.get(key)
+        if value is MISSING:
+            value = loader()
+            if value is not None:
+                self.cache.set(key, detached_copy(value))
+            return value
+        return detached_copy(value)
+
+    def _invalidate_author(self, author_id: int):
+        # post 에 author 가 포함되어 있으므로 post 도 지운다.
+        self.cache.delete(f"author:{author_id}")
+        self.cache.delete_prefix("post:")
+        self.page_cache.delete_author(author_id)
+
+    def _invalidate_post(self, post_id: Optional[int], *category_ids: Optional[int]):
+        """post 와 post_count 가 바뀐 category 를 cache 에서 지운다."""
+        if post_id is not None:
+            self.cache.delete(f"post:{post_id}")
+            self.page_cache.delete(post_id)
+        for category_id in dict.fromkeys(category_ids):
+            if category_id is not None:
+                self.cache.delete(f"category:{category_id}")
+
+    def cache_stats(self) -> dict:
+        """cache hit/miss/eviction 수"""
+        return self.cache.stats()
+
+    def query_stats(self) -> Dict[str, dict]:
+        """service method 별 query 수, 실행 시간
+        Database.enable_profiling 또는 DB_PROFILE 환경변수로 profiling 을 켜야 집계된다.
+
+        Returns:
+            {method 이름: 집계}. profiling 이 꺼져 있으면 빈 dict
+        """
+        profiler = self.db.profiler
+        return profiler.stats() if profiler is not None else {}
+
+    def _get_or_create_tags(self, s, tag_names: List[str]) -> List[BlogTag]:
+        """tag 이름 목록에 해당하는 BlogTag 를 가져오고 없는 tag 는 만든다.
+        tag 갯수와 상관없이 SELECT IN, INSERT, SELECT IN 으로 끝난다.
+        없는 tag 는 unique 충돌을 무시하는 INSERT 로 한번에 입력하므로
+        동시에 같은 tag 를 추가해도 오류가 발생하지 않는다.
+
+        Args:
+            s (Session): session
+            tag_names (List[str]): tag 이름 목록
+
+        Returns:
+            tag_names 순서의 BlogTag 목록
+        """
+        names = list(dict.fromkeys(tag_names))
+        if not names:
+            return []
+        tags = {
+            tag.name: tag
+            for tag in s.query(BlogTag).filter(BlogTag.name.in_(names)).all()
+        }
+        missing = [name for name in names if name not in tags]
+        if missing:
+            stmt = insert_ignore(BlogTag.__table__, s.get_bind().dialect.name, ["name"])
+            s.execute(stmt, [{"name": name} for name in missing])
+            for tag in s.query(BlogTag).filter(BlogTag.name.in_(missing)).all():
+                tags[tag.name] = tag
+        return [tags[name] for name in names]
+
+    def _versioned_update(
+        self, s, model, id: int, expected_version: int = None, values: dict = None
+    ):
+        """UPDATE ... SET values, version = version + 1 WHERE id = ? AND version = ?
+        row 를 먼저 읽지 않는다. 변경된 row 가 없을 때만 row 가 있는지 확인한다.
+
+        Args:
+            s (Session): session
+            model: BlogAuthor 또는 BlogPost
+            id (int): row id
+            expected_version (int): 읽었을 때의 version. None 이면 version 을 확인하지 않는다.
+            values (dict): 변경할 {column: value}
+
+        Raises:
+            NoResultFound: id 가 없는 경우
+            VersionConflict: version 이 expected_version 과 다른 경우
+        """
+        # ORM update 라서 session 에 있는 객체도 같이 바뀐다.
+        stmt = update(model).where(model.id == id)
+        if expected_version is not None:
+            stmt = stmt.where(model.version == expected_version)
+        result = s.execute(stmt.values(version=model.version + 1, **(values or {})))
+        if result.rowcount == 0:
+            if s.query(model.id).filter(model.id == id).one_or_none() is None:
+                raise sqlalchemy.orm.exc.NoResultFound(f"{model.__tablename__} {id}")
+            raise VersionConflict(
+                f"{model.__tablename__} {id} is not version {expected_version}"
+            )
 
     def add_author(self, email, name, last_name=None, first_name=None) -> int:
         """author 추가
@@ -81,9 +401,11 @@ class BlogService:
             s.add(new_author)
         return new_author.id
 
+    @handle_version_conflict
     @handle_author_not_exist
     def mod_author(self, author: BlogAuthor) -> bool:
         """author 전체 변경
+        author.version 이 database 와 다르면 다른 곳에서 먼저 변경한 것으로 보고 실패한다.
 
         Args:
             author: author to update
@@ -93,21 +415,28 @@ class BlogService:
 
         Raises:
             AuthorNotExist: author id 가 database 에 없는 경우
+            VersionConflict: author 를 읽은 뒤 다른 곳에서 변경한 경우
         """
         with self.db.session_scope() as s:
             s.add(author)
+        self._invalidate_author(author.id)
         return True
 
     @handle_author_not_exist
-    def mod_author_partial(self, author_id: int, **kwargs) -> bool:
+    def mod_author_partial(
+        self, author_id: int, expected_version: int = None, **kwargs
+    ) -> bool:
         """author 부분 변경
-        keyword argument 를 틀리게 입력하면 예외가 발생한다.
+        SELECT 없이 UPDATE 하나로 변경한다.
 
         Use:
         >>> BlogService().mod_user_partial(1, last_name="sagong", first_name="sukjun")
+        >>> BlogService().mod_user_partial(1, expected_version=author.version, name="r")
 
         Args:
             author_id (int): author id
+            expected_version (int): 읽었을 때의 author.version. 지정하면 그 사이에
+                다른 곳에서 변경한 경우 실패한다.
             kwargs (dict): 변경할 {field: value} dict
 
         Returns:
@@ -115,15 +444,73 @@ class BlogService:
 
         Raises:
             AuthorNotExist: author id 가 database 에 없는 경우
+            VersionConflict: version 이 expected_version 과 다른 경우
+            InvalidField: kwargs 에 author column 이 아닌 field 가 있는 경우
         """
-
+        values = validate_author_fields(kwargs)
         with self.db.session_scope() as s:
-            obj = s.query(BlogAuthor).filter(BlogAuthor.id == author_id).one()
-            for k, v in kwargs.items():
-                setattr(obj, k, v)
-            s.add(obj)
+            self._versioned_update(s, BlogAuthor, author_id, expected_version, values)
+        self._invalidate_author(author_id)
         return True
 
+    @handle_author_not_exist
+    def mod_authors_partial(self, changes: Dict[int, dict]) -> int:
+        """여러 author 를 한 transaction 에서 부분 변경
+        변경할 field 가 같은 author 끼리 묶어서 UPDATE ... WHERE id = ? 를 executemany 로 실행한다.
+        없는 author 가 하나라도 있으면 전체를 rollback 한다.
+
+        Use:
+        >>> BlogService().mod_authors_partial({1: {"name": "a"}, 2: {"name": "b"}})
+
+        Args:
+            changes (Dict[int, dict]): {author id: {field: value}}
+
+        Returns:
+            변경한 author 수
+
+        Raises:
+            AuthorNotExist: author id 가 database 에 없는 경우
+            InvalidField: author column 이 아닌 field 가 있는 경우
+        """
+        by_fields, ids = {}, []
+        for author_id, fields in changes.items():
+            values = validate_author_fields(fields)
+            if values:
+                by_fields.setdefault(frozenset(values), []).append(
+                    dict(values, _id=author_id)
+                )
+                ids.append(author_id)
+        if not ids:
+            return 0
+
+        updated = 0
+        with self.db.session_scope() as s:
+            for fields, params in by_fields.items():
+                stmt = (
+                    update(BlogAuthor.__table__)
+                    .where(BlogAuthor.id == bindparam("_id"))
+                    .values(
+                        version=BlogAuthor.version + 1,
+                        **{field: bindparam(field) for field in fields},
+                    )
+                )
+                updated += s.execute(stmt, params).rowcount
+            if updated != len(ids):
+                found = set(
+                    s.execute(select(BlogAuthor.id).where(BlogAuthor.id.in_(ids)))
+                    .scalars()
+                    .all()
+                )
+                missing = sorted(set(ids) - found)
+                raise sqlalchemy.orm.exc.NoResultFound(f"blog_author {missing}")
+            for author_id in ids:
+                _expire(s, BlogAuthor, author_id)
+        for author_id in changes:
+            self.cache.delete(f"author:{author_id}")
+            self.page_cache.delete_author(author_id)
+        self.cache.delete_prefix("post:")
+        return updated
+
     def get_author_by_email(self, email: str) -> BlogAuthor:
         """이메일로 author 검색
 
@@ -133,8 +520,32 @@ class BlogService:
         Returns:
             author or None
         """
-        with self.db.session_scope() as s:
-            return s.query(BlogAuthor).filter(BlogAuthor.email == email).one_or_none()
+        author_id = self.cache.get(f"author_email:{email}")
+        if author_id is not MISSING:
+            author = self._cached(
+                f"author:{author_id}",
+                lambda: self._load_author(author_id, required=False),
+            )
+            # email 이 변경된 경우 cache 를 무시한다.
+            if author is not None and author.email == email:
+                return author
+
+        with self.db.session_scope(read_only=True) as s:
+            author = (
+                s.query(BlogAuthor).filter(BlogAuthor.email == email).one_or_none()
+            )
+        if author is not None:
+            self.cache.set(f"author_email:{email}", author.id)
+            self.cache.set(f"author:{author.id}", detached_copy(author))
+        return author
+
+    def _load_author(self, id: int, required=True) -> BlogAuthor:
+        with self.db.session_scope(read_only=True) as s:
+            # transaction 중에 이미 읽은 author 는 identity map 에서 가져온다.
+            author = s.get(BlogAuthor, id)
+            if author is None and required:
+                raise sqlalchemy.orm.exc.NoResultFound(f"blog_author {id}")
+            return author
 
     @handle_author_not_exist
     def get_author_by_id(self, id: int) -> BlogAuthor:
@@ -149,9 +560,7 @@ class BlogService:
         Raises:
             AuthorNotExist: author id 가 database 에 없는 경우
         """
-
-        with self.db.session_scope() as s:
-            return s.query(BlogAuthor).filter(BlogAuthor.id == id).one()
+        return self._cached(f"author:{id}", lambda: self._load_author(id))
 
     def add_post(
         self,
@@ -187,13 +596,20 @@ class BlogService:
             if category is not None:
                 new_post.category = category
 
+            tag_ids = []
             if tags is not None:
-                for tag_name in tags:
-                    blog_tag = s.query(BlogTag).filter(
-                        BlogTag.name == tag_name
-                    ).first() or BlogTag(name=tag_name)
-                    new_post.tags.append(blog_tag)
+                post_tags = self._get_or_create_tags(s, tags)
+                new_post.tags.extend(post_tags)
+                tag_ids = [tag.id for tag in post_tags]
             s.add(new_post)
+            s.flush()
+            for stmt in post_count_updates(
+                dict.fromkeys(tag_ids, 1), {new_post.category_id: 1}
+            ) + month_count_updates(
+                s.get_bind().dialect.name, month_deltas([new_post.date_published])
+            ):
+                s.execute(stmt)
+        self._invalidate_post(None, new_post.category_id)
         return new_post.id
 
     @handle_post_not_exist
@@ -204,66 +620,152 @@ class BlogService:
         new_article: str = None,
         new_category: BlogCategory = None,
         new_tags: List[str] = None,
+        expected_version: int = None,
     ) -> bool:
         """blog post 수정
         변경할 field 를 지정해서 update
+        title, article 변경은 SELECT 없이 UPDATE 하나로 끝난다.
+        category 를 바꾸면 이전 category 의 post_count 를 줄이기 위해 먼저 읽는다.
 
         Args:
             new_title (str): blog post title
             new_article (str): blog post article
             new_category (BlogCategory): 블로그 카테고리
             new_tags (List[str]): 블로그 글 tags
+            expected_version (int): 읽었을 때의 post.version. 지정하면 그 사이에
+                다른 곳에서 변경한 경우 실패한다.
 
         Return:
             True
 
         Raises:
             PostNotExist: post_id 가 일치하는 post 없는 경우
+            VersionConflict: version 이 expected_version 과 다른 경우
 
         """
+        values = {}
+        if new_title is not None:
+            values["title"] = new_title
+        if new_article is not None:
+            values["article"] = new_article
+        old_category_id = None
         with self.db.session_scope() as s:
-            post = s.query(BlogPost).filter(BlogPost.id == post_id).one()
-            if new_title is not None:
-                post.title = new_title
-            if new_article is not None:
-                post.article = new_article
             if new_category is not None:
-                post.category = new_category
+                old_category_id, version = (
+                    s.query(BlogPost.category_id, BlogPost.version)
+                    .filter(BlogPost.id == post_id)
+                    .one()
+                )
+                # 읽은 뒤에 category 가 바뀌었으면 post_count 가 틀어지므로 version 을 확인한다.
+                if expected_version is None:
+                    expected_version = version
+                values["category_id"] = new_category.id
+            self._versioned_update(s, BlogPost, post_id, expected_version, values)
+
+            tag_deltas = {}
             if new_tags is not None:
-                post.tags.clear()
-                for tag_name in new_tags:
-                    blog_tag = s.query(BlogTag).filter(
-                        BlogTag.name == tag_name
-                    ).first() or BlogTag(name=tag_name)
-                    post.tags.append(blog_tag)
-
-            s.add(post)
+                tag_deltas = self._replace_post_tags(s, post_id, new_tags)
+            category_deltas = {}
+            if new_category is not None:
+                category_deltas = change_deltas([old_category_id], [new_category.id])
+                _expire(s, BlogPost, post_id, ["category"])
+            for stmt in post_count_updates(tag_deltas, category_deltas):
+                s.execute(stmt)
+        if new_category is not None and new_category.id != old_category_id:
+            self._invalidate_post(post_id, old_category_id, new_category.id)
+        else:
+            self._invalidate_post(post_id)
         return True
 
+    def _replace_post_tags(self, s, post_id: int, tag_names: List[str]) -> Dict[int, int]:
+        """post 의 tag 를 tag_names 로 바꾼다. 달라진 blog_post_tag row 만 삭제/추가한다.
+
+        Returns:
+            tag post_count 증감량 {tag_id: 증감량}
+        """
+        new_ids = [tag.id for tag in self._get_or_create_tags(s, tag_names)]
+        old_ids = s.execute(
+            select(blog_post_tag.c.tag_id).where(blog_post_tag.c.post_id == post_id)
+        ).scalars().all()
+        deltas = change_deltas(old_ids, new_ids)
+        removed = [id for id, delta in deltas.items() if delta < 0]
+        added = [id for id, delta in deltas.items() if delta > 0]
+        if removed:
+            s.execute(
+                blog_post_tag.delete().where(
+                    blog_post_tag.c.post_id == post_id,
+                    blog_post_tag.c.tag_id.in_(removed),
+                )
+            )
+        if added:
+            s.execute(
+                blog_post_tag.insert(),
+                [{"post_id": post_id, "tag_id": id} for id in added],
+            )
+        if deltas:
+            _expire(s, BlogPost, post_id, ["tags"])
+        return deltas
+
     @handle_post_not_exist
-    def get_post_by_id(self, post_id: int) -> BlogPost:
+    def get_post_by_id(self, post_id: int, profile: str = DEFAULT_PROFILE) -> BlogPost:
         """post 하나 가져오기
-        join query 로 author, category, tags 를 전부 가져온다.
+        join query 로 author, category 를, selectin query 로 tags 를 가져온다.
+        "full" profile 만 cache 를 사용한다.
 
         Args:
             id (int): post id
+            profile (str): loading profile. "summary", "card", "full"
 
         Returns:
             BlogPost object
 
         Raises:
             PostNotExist: post id 가 database 에 없는 경우
+            InvalidProfile: profile 이 없는 경우
 
         """
-        with self.db.session_scope() as s:
+        _check_profile(profile)
+        if profile != DEFAULT_PROFILE:
+            return self._load_post(post_id, profile)
+        return self._cached(f"post:{post_id}", lambda: self._load_post(post_id))
+
+    @handle_post_not_exist
+    def get_post_page(self, post_id: int) -> PostPage:
+        """post 화면에 표시할 PostPage 가져오기
+        page cache 에 있으면 database 를 조회하지 않는다. 없으면 post 와 author, category
+        column 을 한번, tag 이름을 한번 조회해서 만들고 저장한다.
+        post, author, tag 가 바뀌면 cache 에서 지운다. 조회하는 동안 바뀌었으면 저장하지 않는다.
+
+        Args:
+            post_id (int): post id
+
+        Returns:
+            PostPage. str(page) 는 미리 만든 표시 문자열
+
+        Raises:
+            PostNotExist: post id 가 database 에 없는 경우
+        """
+        page = self.page_cache.get(post_id)
+        if page is not None:
+            return page
+        generation = self.page_cache.generation()
+        with self.db.session_scope(read_only=True) as s:
+            page = load_pages(s, [post_id]).get(post_id)
+        if page is None:
+            raise sqlalchemy.orm.exc.NoResultFound(f"blog_post {post_id}")
+        self.page_cache.set(page, generation)
+        return page
+
+    def page_cache_stats(self) -> dict:
+        """page cache hit/miss/eviction 수와 mmap tier 사용량"""
+        return self.page_cache.stats()
+
+    def _load_post(self, post_id: int, profile: str = DEFAULT_PROFILE) -> BlogPost:
+        with self.db.session_scope(read_only=True) as s:
             post = (
                 s.query(BlogPost)
                 .filter(BlogPost.id == post_id)
-                .options(
-                    joinedload(BlogPost.author),
-                    joinedload(BlogPost.category),
-                    joinedload(BlogPost.tags),
-                )
+                .options(*post_load_options(profile))
                 .one()
             )
             return post
@@ -272,29 +774,49 @@ class BlogService:
         with self.db.session_scope() as s:
             new_category = BlogCategory(name=name)
             s.add(new_category)
+        self.cache.delete(f"category_name:{name}")
         return new_category.id
 
+    def _load_category(self, id: int) -> BlogCategory:
+        with self.db.session_scope(read_only=True) as s:
+            category = s.get(BlogCategory, id)
+            if category is None:
+                raise sqlalchemy.orm.exc.NoResultFound(f"blog_category {id}")
+            return category
+
     @handle_category_not_exist
     def get_category_by_id(self, id: int) -> BlogCategory:
-        with self.db.session_scope() as s:
-            return s.query(BlogCategory).filter(BlogCategory.id == id).one()
+        return self._cached(f"category:{id}", lambda: self._load_category(id))
 
     @handle_category_not_exist
     def get_category_by_name(self, name: str) -> BlogCategory:
-        with self.db.session_scope() as s:
-            return s.query(BlogCategory).filter(BlogCategory.name == name).one()
+        category_id = self.cache.get(f"category_name:{name}")
+        if category_id is not MISSING:
+            category = self._cached(
+                f"category:{category_id}", lambda: self._load_category(category_id)
+            )
+            if category.name == name:
+                return category
+
+        with self.db.session_scope(read_only=True) as s:
+            category = s.query(BlogCategory).filter(BlogCategory.name == name).one()
+        self.cache.set(f"category_name:{name}", category.id)
+        self.cache.set(f"category:{category.id}", detached_copy(category))
+        return category
 
     @handle_category_not_exist
     def get_posts_by_category_name(
-        self, name: str, limit=5, offset=0
+        self, name: str, limit=5, offset=0, profile: str = DEFAULT_PROFILE
     ) -> List[BlogPost]:
-        with self.db.session_scope() as s:
+        _check_profile(profile)
+        with self.db.session_scope(read_only=True) as s:
             category = s.query(BlogCategory).filter(BlogCategory.name == name).one()
-            return category.posts.order_by(BlogPost.id.desc())[offset : limit + offset]
+            query = category.posts.options(*post_load_options(profile))
+            return query.order_by(BlogPost.id.desc())[offset : limit + offset]
 
     @handle_author_not_exist
     def get_posts_by_author(
-        self, author: BlogAuthor, limit=5, offset=0
+        self, author: BlogAuthor, limit=5, offset=0, profile: str = DEFAULT_PROFILE
     ) -> List[BlogPost]:
         """글쓴이가 작성한 모든 post 가져오기
         page 처리
@@ -303,18 +825,681 @@ class BlogService:
             author (BlogAuthor): 글쓴이
             list (int): 가져올 post 갯수
             offset (int): skip 값
+            profile (str): loading profile. "summary", "card", "full"
 
         Return:
             post 목록
 
         Raises:
             AuthorNotExist: author 존재하지 않는 경우
+            InvalidProfile: profile 이 없는 경우
 
         """
-        with self.db.session_scope() as s:
+        _check_profile(profile)
+        with self.db.session_scope(read_only=True) as s:
             obj = s.query(BlogAuthor).filter(BlogAuthor.id == author.id).one()
-            return obj.posts.order_by(BlogPost.id.desc())[offset : limit + offset]
+            query = obj.posts.options(*post_load_options(profile))
+            return query.order_by(BlogPost.id.desc())[offset : limit + offset]
 
-    def get_tags(self) -> List[BlogTag]:
+    @handle_invalid_cursor
+    def get_posts_by_author_page(
+        self,
+        author: BlogAuthor,
+        limit=5,
+        cursor: str = None,
+        order_by="id",
+        profile: str = DEFAULT_PROFILE,
+    ) -> Page[BlogPost]:
+        """글쓴이가 작성한 post 를 cursor 로 page 처리해서 가져오기
+        blog_post 만 조회하고 (author_id, id) index 를 사용하므로
+        뒤쪽 page 도 첫 page 와 비용이 같다.
+
+        Use:
+        >>> page = BlogService().get_posts_by_author_page(author, limit=10)
+        >>> page = BlogService().get_posts_by_author_page(author, 10, page.next_cursor)
+
+        Args:
+            author (BlogAuthor): 글쓴이
+            limit (int): 가져올 post 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            order_by (str): "id" 또는 "date_published"
+            profile (str): loading profile. "summary", "card", "full"
+
+        Return:
+            post 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+            InvalidProfile: profile 이 없는 경우
+
+        """
+        _check_profile(profile)
+        with self.db.session_scope(read_only=True) as s:
+            query = (
+                s.query(BlogPost)
+                .filter(BlogPost.author_id == author.id)
+                .options(*post_load_options(profile))
+            )
+            return keyset_page(query, BlogPost, order_by, limit, cursor)
+
+    @handle_invalid_cursor
+    def get_posts_by_category_name_page(
+        self,
+        name: str,
+        limit=5,
+        cursor: str = None,
+        order_by="id",
+        profile: str = DEFAULT_PROFILE,
+    ) -> Page[BlogPost]:
+        """category 이름으로 post 를 cursor 로 page 처리해서 가져오기
+        category 를 따로 조회하지 않고 join 해서 하나의 query 로 가져온다.
+
+        Args:
+            name (str): category 이름
+            limit (int): 가져올 post 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            order_by (str): "id" 또는 "date_published"
+            profile (str): loading profile. "summary", "card", "full"
+
+        Return:
+            post 목록과 next_cursor. category 가 없으면 빈 목록
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+            InvalidProfile: profile 이 없는 경우
+
+        """
+        _check_profile(profile)
+        with self.db.session_scope(read_only=True) as s:
+            query = (
+                s.query(BlogPost)
+                .join(BlogCategory, BlogPost.category_id == BlogCategory.id)
+                .filter(BlogCategory.name == name)
+                .options(*post_load_options(profile))
+            )
+            return keyset_page(query, BlogPost, order_by, limit, cursor)
+
+    @handle_invalid_cursor
+    def get_recent_posts(
+        self, limit=5, cursor: str = None, profile: str = DEFAULT_PROFILE
+    ) -> Page[BlogPost]:
+        """blog 전체의 최신 post 를 cursor 로 page 처리해서 가져오기
+        (date_published, id) index 를 역순으로 읽는다.
+
+        Args:
+            limit (int): 가져올 post 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            profile (str): loading profile. "summary", "card", "full"
+
+        Return:
+            post 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+            InvalidProfile: profile 이 없는 경우
+        """
+        _check_profile(profile)
+        with self.db.session_scope(read_only=True) as s:
+            query = (
+                s.query(BlogPost)
+                .filter(BlogPost.date_published.isnot(None))
+                .options(*post_load_options(profile))
+            )
+            return keyset_page(query, BlogPost, "date_published", limit, cursor)
+
+    @handle_invalid_cursor
+    def get_archive_posts(
+        self,
+        year: int,
+        month: int = None,
+        limit=5,
+        cursor: str = None,
+        profile: str = DEFAULT_PROFILE,
+    ) -> Page[BlogPost]:
+        """연도 또는 월에 게시된 post 를 최신 순서로 cursor 로 page 처리해서 가져오기
+        date_published 를 [시작, 끝) 범위로 조회하므로 (date_published, id) index 의
+        해당 범위만 읽는다. mysql 에서 blog_post 를 연도별로 partition 한 경우
+        다른 연도의 partition 은 읽지 않는다.
+
+        Use:
+        >>> page = BlogService().get_archive_posts(2021, 11)
+        >>> page = BlogService().get_archive_posts(2021, 11, cursor=page.next_cursor)
+
+        Args:
+            year (int): 연도
+            month (int): 월. None 이면 연도 전체
+            limit (int): 가져올 post 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            profile (str): loading profile. "summary", "card", "full"
+
+        Return:
+            post 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+            InvalidProfile: profile 이 없는 경우
+            InvalidArchiveDate: 연도나 월이 잘못된 경우
+        """
+        _check_profile(profile)
+        start, end = _month_range(year, month)
+        with self.db.session_scope(read_only=True) as s:
+            query = (
+                s.query(BlogPost)
+                .filter(BlogPost.date_published >= start)
+                .filter(BlogPost.date_published < end)
+                .options(*post_load_options(profile))
+            )
+            return keyset_page(query, BlogPost, "date_published", limit, cursor)
+
+    def get_archive_months(self, year: int = None) -> List[BlogPostMonth]:
+        """post 가 있는 월 목록을 최신 월부터 가져온다. archive sidebar 용
+        blog_post_month 만 읽으므로 post 수와 상관없이 비용이 같다.
+
+        Args:
+            year (int): 연도. None 이면 전체
+
+        Returns:
+            BlogPostMonth 목록
+        """
+        with self.db.session_scope(read_only=True) as s:
+            query = (
+                s.query(BlogPostMonth)
+                .filter(BlogPostMonth.post_count > 0)
+                .populate_existing()
+            )
+            if year is not None:
+                query = query.filter(BlogPostMonth.year == year)
+            return query.order_by(
+                BlogPostMonth.year.desc(), BlogPostMonth.month.desc()
+            ).all()
+
+    @handle_invalid_cursor
+    def get_posts_by_tags(
+        self,
+        tags: List[str],
+        mode="any",
+        cursor: str = None,
+        limit=5,
+        profile: str = DEFAULT_PROFILE,
+    ) -> Page[BlogPost]:
+        """tag 가 붙은 post 를 최신 순서로 cursor 로 page 처리해서 가져오기
+        blog_post_tag 만 읽어서 post id 를 구한 뒤 post 를 가져온다.
+        "all" 은 post_count 가 가장 작은 tag 부터 하나의 join query 로 교집합을 구한다.
+
+        Use:
+        >>> page = BlogService().get_posts_by_tags(["python", "pip"], mode="all")
+        >>> page = BlogService().get_posts_by_tags(["python"], cursor=page.next_cursor)
+
+        Args:
+            tags (List[str]): tag 이름 목록
+            mode (str): "any" 는 tag 중 하나라도 붙은 post, "all" 은 tag 가 모두 붙은 post
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            limit (int): 가져올 post 갯수
+            profile (str): loading profile. "summary", "card", "full"
+
+        Return:
+            post 목록과 next_cursor. 없는 tag 는 "any" 에서는 무시하고 "all" 에서는 빈 목록
+
+        Raises:
+            InvalidCursor: cursor, mode 가 잘못된 경우
+            InvalidProfile: profile 이 없는 경우
+        """
+        _check_profile(profile)
+        last_id = decode_cursor("id", cursor)[0] if cursor is not None else None
+        if mode not in TAG_MODES:
+            raise ValueError(f"mode must be one of {TAG_MODES}")
+        names = list(dict.fromkeys(tags))
+        with self.db.session_scope(read_only=True) as s:
+            tag_ids = [
+                id
+                for (id,) in s.query(BlogTag.id)
+                .filter(BlogTag.name.in_(names))
+                .order_by(BlogTag.post_count, BlogTag.id)
+            ]
+            if not tag_ids or (mode == "all" and len(tag_ids) < len(names)):
+                return Page([], None)
+            stmt = tagged_post_ids(tag_ids, mode, limit + 1, last_id)
+            post_ids = s.execute(stmt).scalars().all()
+            posts = (
+                s.query(BlogPost)
+                .filter(BlogPost.id.in_(post_ids[:limit]))
+                .options(*post_load_options(profile))
+                .order_by(BlogPost.id.desc())
+                .all()
+            )
+        next_cursor = None
+        if len(post_ids) > limit:
+            next_cursor = encode_cursor("id", (post_ids[limit - 1],))
+        return Page(posts, next_cursor)
+
+    def add_view(self, post_id: int, n: int = 1):
+        """post 조회수 증가
+        바로 UPDATE 하지 않고 ViewCounter 에 모았다가 주기적으로 반영한다.
+
+        Args:
+            post_id (int): post id
+            n (int): 증가량
+        """
+        self.view_counter.record(post_id, n)
+
+    def get_most_viewed_posts(
+        self, limit=10, profile: str = DEFAULT_PROFILE
+    ) -> List[BlogPost]:
+        """조회수가 많은 post 목록
+        (views, id) index 를 사용한다. 아직 flush 되지 않은 조회수는 포함되지 않는다.
+
+        Args:
+            limit (int): 가져올 post 갯수
+            profile (str): loading profile. "summary", "card", "full"
+
+        Return:
+            조회수 내림차순 post 목록
+
+        Raises:
+            InvalidProfile: profile 이 없는 경우
+        """
+        _check_profile(profile)
+        with self.db.session_scope(read_only=True) as s:
+            return (
+                s.query(BlogPost)
+                .options(*post_load_options(profile))
+                .order_by(BlogPost.views.desc(), BlogPost.id.desc())
+                .limit(limit)
+                .all()
+            )
+
+    def _add_comment_count(self, s, post_id: int, n: int):
+        result = s.execute(
+            update(BlogPost)
+            .where(BlogPost.id == post_id)
+            .values(
+                counter_values(BlogPost, comment_count=BlogPost.comment_count + n)
+            )
+        )
+        if result.rowcount == 0:
+            raise sqlalchemy.orm.exc.NoResultFound(f"post {post_id} not found")
+
+    @handle_post_not_exist
+    def add_comment(self, post_id: int, author: BlogAuthor, content: str) -> int:
+        """comment 추가
+        같은 transaction 에서 blog_post.comment_count 를 1 증가시킨다.
+
+        Args:
+            post_id (int): post id
+            author (BlogAuthor): 글쓴이
+            content (str): comment 내용
+
+        Returns:
+            comment id
+
+        Raises:
+            PostNotExist: post id 가 database 에 없는 경우
+        """
         with self.db.session_scope() as s:
+            self._add_comment_count(s, post_id, 1)
+            new_comment = Comment(post_id=post_id, author_id=author.id, content=content)
+            s.add(new_comment)
+        self.cache.delete(f"post:{post_id}")
+        self.page_cache.delete(post_id)
+        return new_comment.id
+
+    @handle_comment_not_exist
+    def delete_comment(self, comment_id: int) -> bool:
+        """comment 삭제
+        같은 transaction 에서 blog_post.comment_count 를 1 감소시킨다.
+
+        Args:
+            comment_id (int): comment id
+
+        Returns:
+            True
+
+        Raises:
+            CommentNotExist: comment id 가 database 에 없는 경우
+        """
+        with self.db.session_scope() as s:
+            (post_id,) = (
+                s.query(Comment.post_id).filter(Comment.id == comment_id).one()
+            )
+            s.query(Comment).filter(Comment.id == comment_id).delete(
+                synchronize_session=False
+            )
+            self._add_comment_count(s, post_id, -1)
+        self.cache.delete(f"post:{post_id}")
+        self.page_cache.delete(post_id)
+        return True
+
+    @handle_invalid_cursor
+    def get_comments(
+        self, post_id: int, limit=20, cursor: str = None
+    ) -> Page[Comment]:
+        """post 의 comment 를 오래된 순서로 cursor 로 page 처리해서 가져오기
+        (post_id, id) index 를 사용하므로 comment 가 많아도 page 비용이 같다.
+
+        Args:
+            post_id (int): post id
+            limit (int): 가져올 comment 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+
+        Return:
+            comment 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+        """
+        with self.db.session_scope(read_only=True) as s:
+            query = (
+                s.query(Comment)
+                .filter(Comment.post_id == post_id)
+                .options(joinedload(Comment.author))
+            )
+            return keyset_page(query, Comment, "id", limit, cursor, desc=False)
+
+    def get_comments_by_posts(
+        self, post_ids: List[int], limit_per_post: int = None
+    ) -> Dict[int, List[Comment]]:
+        """여러 post 의 comment 를 하나의 query 로 가져오기
+        post 목록 page 에서 post 마다 query 하지 않도록 IN 으로 한번에 가져온다.
+        limit_per_post 를 지정하면 window function 으로 post 마다 오래된 순서로 자른다.
+
+        Args:
+            post_ids (List[int]): post id 목록
+            limit_per_post (int): post 별 최대 comment 갯수
+
+        Return:
+            {post_id: comment 목록}. comment 가 없는 post 는 빈 목록
+        """
+        comments = {post_id: [] for post_id in post_ids}
+        if not post_ids:
+            return comments
+        with self.db.session_scope(read_only=True) as s:
+            query = s.query(Comment).options(joinedload(Comment.author))
+            if limit_per_post is None:
+                query = query.filter(Comment.post_id.in_(post_ids))
+            else:
+                ranked = (
+                    s.query(
+                        Comment.id,
+                        func.row_number()
+                        .over(partition_by=Comment.post_id, order_by=Comment.id)
+                        .label("rn"),
+                    )
+                    .filter(Comment.post_id.in_(post_ids))
+                    .subquery()
+                )
+                query = query.join(ranked, Comment.id == ranked.c.id).filter(
+                    ranked.c.rn <= limit_per_post
+                )
+            for comment in query.order_by(Comment.post_id, Comment.id):
+                comments[comment.post_id].append(comment)
+        return comments
+
+    @handle_invalid_cursor
+    def search_posts(
+        self, query: str, limit=10, cursor: str = None
+    ) -> Page[SearchResult]:
+        """title, article 전문 검색
+        sqlite 는 FTS5, mysql 은 FULLTEXT index 를 사용하고 관련도 순으로 정렬한다.
+        article 전체 대신 id, title, snippet 만 돌려준다.
+
+        Use:
+        >>> page = BlogService().search_posts("python pip")
+        >>> page = BlogService().search_posts("python pip", cursor=page.next_cursor)
+
+        Args:
+            query (str): 검색어. 단어가 모두 포함된 post 를 찾는다.
+            limit (int): 가져올 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+
+        Return:
+            SearchResult 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+        """
+        # 관련도 점수는 keyset 으로 쓸 수 없으므로 cursor 에 offset 을 담는다.
+        offset = decode_cursor("offset", cursor)[0] if cursor is not None else 0
+        with self.db.session_scope(read_only=True) as s:
+            results = search(s, query, limit + 1, offset)
+        next_cursor = None
+        if len(results) > limit:
+            next_cursor = encode_cursor("offset", (offset + limit,))
+        return Page(results[:limit], next_cursor)
+
+    @handle_post_not_exist
+    def get_post_summary(self, post_id: int, excerpt_length: int = None) -> PostSummary:
+        """post 요약 하나 가져오기
+        ORM 객체 대신 column 만 조회한다.
+
+        Args:
+            post_id (int): post id
+            excerpt_length (int): article 앞부분 길이. None 이면 article 을 가져오지 않는다.
+
+        Returns:
+            PostSummary
+
+        Raises:
+            PostNotExist: post id 가 database 에 없는 경우
+        """
+        with self.db.session_scope(read_only=True) as s:
+            row = s.execute(
+                summary_select(excerpt_length).where(BlogPost.id == post_id)
+            ).one()
+            return to_summaries(s, [row])[0]
+
+    @handle_post_not_exist
+    def get_post_article(self, post_id: int) -> str:
+        """post 본문만 가져오기
+
+        Raises:
+            PostNotExist: post id 가 database 에 없는 경우
+        """
+        with self.db.session_scope(read_only=True) as s:
+            (article,) = s.query(BlogPost.article).filter(BlogPost.id == post_id).one()
+            return article
+
+    def _summary_page(self, stmt, limit, cursor, order_by) -> Page[PostSummary]:
+        with self.db.session_scope(read_only=True) as s:
+            stmt = keyset_query(stmt, BlogPost, order_by, limit, cursor)
+            page = make_page(s.execute(stmt).all(), order_by, limit)
+            page.items = to_summaries(s, page.items)
+            return page
+
+    @handle_invalid_cursor
+    def get_post_summaries_by_author(
+        self,
+        author: BlogAuthor,
+        limit=5,
+        cursor: str = None,
+        order_by="id",
+        excerpt_length: int = None,
+    ) -> Page[PostSummary]:
+        """글쓴이가 작성한 post 요약 목록
+        get_posts_by_author_page 와 같지만 ORM 객체 대신 PostSummary 를 돌려준다.
+        tag 이름은 page 전체를 한번에 조회하므로 query 는 2번 실행된다.
+
+        Args:
+            author (BlogAuthor): 글쓴이
+            limit (int): 가져올 post 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            order_by (str): "id" 또는 "date_published"
+            excerpt_length (int): article 앞부분 길이. None 이면 article 을 가져오지 않는다.
+
+        Return:
+            PostSummary 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+        """
+        stmt = summary_select(excerpt_length).where(BlogPost.author_id == author.id)
+        return self._summary_page(stmt, limit, cursor, order_by)
+
+    @handle_invalid_cursor
+    def get_post_summaries_by_category_name(
+        self,
+        name: str,
+        limit=5,
+        cursor: str = None,
+        order_by="id",
+        excerpt_length: int = None,
+    ) -> Page[PostSummary]:
+        """category 의 post 요약 목록
+        get_posts_by_category_name_page 와 같지만 ORM 객체 대신 PostSummary 를 돌려준다.
+
+        Args:
+            name (str): category 이름
+            limit (int): 가져올 post 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            order_by (str): "id" 또는 "date_published"
+            excerpt_length (int): article 앞부분 길이. None 이면 article 을 가져오지 않는다.
+
+        Return:
+            PostSummary 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+        """
+        stmt = summary_select(excerpt_length).where(BlogCategory.name == name)
+        return self._summary_page(stmt, limit, cursor, order_by)
+
+    def get_tags(self) -> List[BlogTag]:
+        with self.db.session_scope(read_only=True) as s:
             return s.query(BlogTag).all()
+
+    def get_top_tags(self, n=10) -> List[BlogTag]:
+        """post 가 많은 tag 목록
+        blog_tag.post_count 의 (post_count, id) index 를 사용하므로 post 수와 상관없이
+        n 개만 읽는다.
+
+        Args:
+            n (int): 가져올 tag 갯수
+
+        Returns:
+            post_count 내림차순 tag 목록
+        """
+        with self.db.session_scope(read_only=True) as s:
+            return (
+                s.query(BlogTag)
+                .order_by(BlogTag.post_count.desc(), BlogTag.id.desc())
+                .limit(n)
+                .all()
+            )
+
+    @handle_invalid_cursor
+    def get_tags_page(
+        self, limit=20, cursor: str = None, order_by="post_count"
+    ) -> Page[BlogTag]:
+        """tag 목록을 cursor 로 page 처리해서 가져오기
+
+        Args:
+            limit (int): 가져올 tag 갯수
+            cursor (str): 이전 page 의 next_cursor. 첫 page 는 None
+            order_by (str): "post_count" 또는 "id"
+
+        Return:
+            tag 목록과 next_cursor
+
+        Raises:
+            InvalidCursor: cursor 가 잘못된 경우
+        """
+        with self.db.session_scope(read_only=True) as s:
+            return keyset_page(s.query(BlogTag), BlogTag, order_by, limit, cursor)
+
+    def reconcile_post_counts(self) -> Dict[str, int]:
+        """tag, category, 월별 post_count 를 blog_post_tag, blog_post 로 다시 계산한다.
+        값이 다른 row 만 고치고 빠진 월은 입력한다.
+
+        Returns:
+            {"tags": 고친 tag 수, "categories": 고친 category 수, "months": 고친 월 수}
+        """
+        fixed = {}
+        with self.db.session_scope() as s:
+            for name, stmt in reconcile_statements():
+                fixed[name] = s.execute(stmt).rowcount
+            fixed["months"] = reconcile_months(s)
+        self.cache.delete_prefix("category:")
+        return fixed
+
+    def export_posts(
+        self, after_id: int = None, batch_size: int = DEFAULT_EXPORT_BATCH_SIZE
+    ) -> Iterator[dict]:
+        """모든 post 를 author, category, tag 와 함께 id 순서로 하나씩 돌려준다.
+        batch_size 씩 keyset 으로 읽으므로 post 가 많아도 memory 는 batch 하나만 사용한다.
+
+        Use:
+        >>> for post in BlogService().export_posts():
+        ...     print(post["id"], post["tags"])
+
+        Args:
+            after_id (int): 이 id 다음 post 부터 돌려준다.
+            batch_size (int): 한번에 읽을 post 갯수
+
+        Returns:
+            post dict generator
+        """
+        return iter_posts(self.db, after_id, batch_size)
+
+    def export_posts_to(
+        self,
+        target: Union[str, IO],
+        format: str = "jsonl",
+        compress: bool = None,
+        after_id: int = None,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+    ) -> ExportReport:
+        """모든 post 를 JSON Lines 또는 CSV 로 file 이나 stream 에 쓴다.
+        after_id 를 지정하면 file 에 이어서 쓴다.
+
+        Use:
+        >>> BlogService().export_posts_to("posts.jsonl.gz")
+        >>> try:
+        ...     BlogService().export_posts_to("posts.csv", format="csv")
+        ... except ExportInterrupted as e:
+        ...     BlogService().export_posts_to("posts.csv", "csv", after_id=e.last_id)
+
+        Args:
+            target: file 경로 또는 stream
+            format (str): "jsonl" 또는 "csv"
+            compress (bool): gzip 압축 여부. None 이면 경로가 .gz 로 끝나는지로 정한다.
+            after_id (int): 이 id 다음 post 부터 쓴다.
+            batch_size (int): 한번에 읽을 post 갯수
+
+        Returns:
+            내보낸 post 수와 마지막 id 가 담긴 ExportReport
+
+        Raises:
+            ExportInterrupted: 중간에 실패한 경우. last_id 까지는 기록되어 있다.
+        """
+        report = ExportReport(after_id)
+        try:
+            return write_posts(
+                target,
+                iter_posts(self.db, after_id, batch_size),
+                format,
+                compress,
+                report,
+            )
+        except (sqlalchemy.exc.SQLAlchemyError, OSError) as e:
+            raise ExportInterrupted(e, report)
+
+    def bulk_import(
+        self, records: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> ImportReport:
+        """author, category, tag, post record 대량 입력
+        batch_size 만큼 나눠서 batch 마다 하나의 transaction 으로 입력한다.
+        오류가 발생한 batch 는 rollback 하고 다음 batch 를 계속 입력한다.
+
+        Use:
+        >>> BlogService().bulk_import(
+        ...     [{"type": "author", "email": "a@b.c", "name": "a"},
+        ...      {"type": "post", "title": "t", "article": "a", "author_email": "a@b.c"}]
+        ... )
+
+        Args:
+            records (Iterable[dict]): 입력할 record. generator 도 가능
+            batch_size (int): 한번에 입력할 record 갯수
+
+        Returns:
+            batch 별 결과와 초당 입력 row 수가 담긴 ImportReport
+        """
+        return BulkImporter(self.db, batch_size).run(records)
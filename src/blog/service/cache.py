@@ -0,0 +1,216 @@
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Tuple
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from database import after_commit, in_transaction
+
+
+MISSING = object()
+
+
+class CacheBackend(ABC):
+    """BlogService cache interface
+
+    다른 process 와 공유하는 cache 를 사용하려면 이 class 를 상속해서 구현한다.
+    stats 외의 method 를 모두 구현하지 않으면 instance 를 만들 수 없다.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """key 에 해당하는 값. 없으면 MISSING"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    def delete(self, *keys: str):
+        pass
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str):
+        """prefix 로 시작하는 key 를 모두 삭제"""
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class TransactionalCache(CacheBackend):
+    """Database.transaction 중에는 cache 를 읽거나 채우지 않는다.
+
+    commit 되지 않은 값을 다른 곳에서 읽지 않도록 set 은 무시하고, 자신이 변경한 값을
+    읽을 수 있도록 get 은 항상 MISSING 이다. delete 는 바로 하고 commit 후에 다시 해서
+    transaction 중에 다른 곳에서 채운 이전 값도 지운다.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    def get(self, key):
+        if in_transaction():
+            return MISSING
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        if not in_transaction():
+            self.backend.set(key, value)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+        if in_transaction():
+            after_commit(lambda: self.backend.delete(*keys))
+
+    def delete_prefix(self, prefix):
+        self.backend.delete_prefix(prefix)
+        if in_transaction():
+            after_commit(lambda: self.backend.delete_prefix(prefix))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+class NullCache(CacheBackend):
+    """아무것도 저장하지 않는 cache"""
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """process 내 LRU + TTL cache
+
+    maxsize 를 넘으면 가장 오래 사용하지 않은 값부터 버린다.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> CacheBackend:
+    """process 가 공유하는 기본 cache
+
+    BLOG_CACHE=false 이면 NullCache, 크기와 TTL 은 BLOG_CACHE_SIZE, BLOG_CACHE_TTL 로 설정한다.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            if os.environ.get("BLOG_CACHE", "true").lower() in ["1", "true", "yes"]:
+                _default_cache = MemoryCache(
+                    maxsize=int(os.environ.get("BLOG_CACHE_SIZE", 1024)),
+                    ttl=float(os.environ.get("BLOG_CACHE_TTL", 300)),
+                )
+            else:
+                _default_cache = NullCache()
+        return _default_cache
+
+
+def detached_copy(obj):
+    """ORM 객체를 session 과 상관없는 detached 복사본으로 만든다.
+
+    cache 에 저장된 객체를 호출한 쪽에서 수정해도 cache 가 바뀌지 않도록
+    저장할 때와 꺼낼 때 복사한다. 이미 load 된 relationship 만 복사한다.
+    """
+    if obj is None:
+        return None
+    state = inspect(obj)
+    mapper = state.mapper
+    copy = mapper.class_manager.new_instance()
+    loaded = state.dict
+    for attr in mapper.column_attrs:
+        if attr.key in loaded:
+            set_committed_value(copy, attr.key, loaded[attr.key])
+    for rel in mapper.relationships:
+        if rel.key not in loaded:
+            continue
+        value = loaded[rel.key]
+        if rel.uselist:
+            value = [detached_copy(item) for item in value]
+        else:
+            value = detached_copy(value)
+        set_committed_value(copy, rel.key, value)
+    make_transient_to_detached(copy)
+    return copy
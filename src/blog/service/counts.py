@@ -0,0 +1,157 @@
+"""blog_tag, blog_category, blog_post_month 의 post_count 관리
+
+post 를 추가/변경하는 transaction 에서 증감하고 reconcile 로 전체를 다시 계산한다.
+"""
+import datetime
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import extract, func, select, update
+from database.model import (
+    BlogCategory,
+    BlogPost,
+    BlogPostMonth,
+    BlogTag,
+    blog_post_tag,
+    counter_values,
+)
+from database import insert_or_add
+
+
+def count_updates(model, deltas: Dict[int, int]) -> List:
+    """{id: 증감량} 을 post_count 에 반영하는 UPDATE 문 목록
+    증감량이 같은 row 는 하나의 UPDATE ... WHERE id IN (...) 으로 묶는다.
+
+    Args:
+        model: BlogTag 또는 BlogCategory
+        deltas (Dict[int, int]): {id: 증감량}
+
+    Returns:
+        실행할 UPDATE 문 목록
+    """
+    by_delta = defaultdict(list)
+    for id, delta in deltas.items():
+        if id is not None and delta:
+            by_delta[delta].append(id)
+    # ORM update 라서 session 에 있는 객체의 post_count 도 같이 바뀐다.
+    return [
+        update(model)
+        .where(model.id.in_(sorted(ids)))
+        .values(counter_values(model, post_count=model.post_count + delta))
+        for delta, ids in by_delta.items()
+    ]
+
+
+def change_deltas(
+    old_ids: Iterable[Optional[int]], new_ids: Iterable[Optional[int]]
+) -> Dict[int, int]:
+    """변경 전후 id 목록으로 만든 {id: 증감량}"""
+    old_ids, new_ids = set(old_ids) - {None}, set(new_ids) - {None}
+    deltas = {id: -1 for id in old_ids - new_ids}
+    deltas.update({id: 1 for id in new_ids - old_ids})
+    return deltas
+
+
+def post_count_updates(
+    tag_deltas: Dict[int, int], category_deltas: Dict[int, int]
+) -> List:
+    return count_updates(BlogTag, tag_deltas) + count_updates(
+        BlogCategory, category_deltas
+    )
+
+
+def month_deltas(
+    dates: Iterable[Optional[datetime.datetime]],
+) -> Dict[Tuple[int, int], int]:
+    """date_published 목록으로 만든 {(year, month): 증가량}"""
+    return Counter((date.year, date.month) for date in dates if date is not None)
+
+
+def month_count_updates(
+    dialect_name: str, deltas: Dict[Tuple[int, int], int]
+) -> List:
+    """{(year, month): 증감량} 을 blog_post_month 에 반영하는 문 목록
+    없는 월은 입력하고 있는 월은 post_count 에 더하는 INSERT 하나로 처리한다.
+
+    Args:
+        dialect_name (str): engine dialect 이름
+        deltas: {(year, month): 증감량}
+
+    Returns:
+        실행할 INSERT 문 목록
+    """
+    rows = [
+        {"year": year, "month": month, "post_count": delta}
+        for (year, month), delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return []
+    return [
+        insert_or_add(
+            BlogPostMonth.__table__, dialect_name, ["year", "month"], "post_count"
+        ).values(rows)
+    ]
+
+
+def reconcile_months(s) -> int:
+    """blog_post_month 를 blog_post 의 월별 갯수로 다시 계산한다.
+    blog_post 는 (date_published, id) index 로 한번만 읽고 값이 다른 월만 고친다.
+
+    Returns:
+        고친 월 수
+    """
+    post_year = extract("year", BlogPost.date_published)
+    post_month = extract("month", BlogPost.date_published)
+    actual = {
+        (year, month): count
+        for year, month, count in s.execute(
+            select(post_year, post_month, func.count())
+            .where(BlogPost.date_published.isnot(None))
+            .group_by(post_year, post_month)
+        )
+    }
+    stored = {
+        (year, month): count
+        for year, month, count in s.execute(
+            select(BlogPostMonth.year, BlogPostMonth.month, BlogPostMonth.post_count)
+        )
+    }
+    # 고칠 값을 증감량으로 바꿔서 month_count_updates 로 반영한다.
+    deltas = {
+        key: actual.get(key, 0) - stored.get(key, 0)
+        for key in actual.keys() | stored.keys()
+    }
+    for stmt in month_count_updates(s.get_bind().dialect.name, deltas):
+        s.execute(stmt)
+    return sum(1 for delta in deltas.values() if delta)
+
+
+def reconcile_statements() -> List[Tuple[str, object]]:
+    """post_count 가 실제 post 수와 다른 row 만 고치는 UPDATE 문"""
+    tag_count = (
+        select(func.count())
+        .select_from(blog_post_tag)
+        .where(blog_post_tag.c.tag_id == BlogTag.id)
+        .scalar_subquery()
+    )
+    category_count = (
+        select(func.count(BlogPost.id))
+        .where(BlogPost.category_id == BlogCategory.id)
+        .scalar_subquery()
+    )
+    return [
+        (
+            "tags",
+            update(BlogTag.__table__)
+            .where(BlogTag.post_count != tag_count)
+            .values(counter_values(BlogTag.__table__, post_count=tag_count))
+            .execution_options(synchronize_session=False),
+        ),
+        (
+            "categories",
+            update(BlogCategory.__table__)
+            .where(BlogCategory.post_count != category_count)
+            .values(counter_values(BlogCategory.__table__, post_count=category_count))
+            .execution_options(synchronize_session=False),
+        ),
+    ]
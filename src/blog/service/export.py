@@ -0,0 +1,198 @@
+"""blog post 전체 내보내기
+
+post 를 id 순서로 batch_size 씩 keyset 으로 읽고 batch 마다 tag 를 한번에 붙인다.
+batch 마다 session 을 새로 열기 때문에 긴 transaction 이 생기지 않고
+memory 에는 batch 하나만 올라간다.
+"""
+import io
+import csv
+import gzip
+import json
+import time
+import logging
+from collections import defaultdict
+from typing import IO, Iterable, Iterator, Union
+from sqlalchemy import select
+from database.model import BlogAuthor, BlogCategory, BlogPost, BlogTag, blog_post_tag
+from database import Database
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+FORMATS = ("jsonl", "csv")
+FIELDS = [
+    "id",
+    "title",
+    "article",
+    "date_published",
+    "views",
+    "comment_count",
+    "author_id",
+    "author_email",
+    "author_name",
+    "category",
+    "tags",
+]
+# csv 에서 tags 를 한 column 에 넣을 때 구분자
+CSV_TAG_SEPARATOR = "|"
+
+
+class ExportReport(object):
+    def __init__(self, after_id: int = None):
+        self.posts = 0
+        self.last_id = after_id
+        self.elapsed = 0.0
+
+    @property
+    def posts_per_sec(self) -> float:
+        return self.posts / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return f"exported {self.posts} posts, last id {self.last_id}"
+
+
+def _export_select(after_id: int, batch_size: int):
+    stmt = (
+        select(
+            BlogPost.id,
+            BlogPost.title,
+            BlogPost.article,
+            BlogPost.date_published,
+            BlogPost.views,
+            BlogPost.comment_count,
+            BlogPost.author_id,
+            BlogAuthor.email.label("author_email"),
+            BlogAuthor.name.label("author_name"),
+            BlogCategory.name.label("category"),
+        )
+        .select_from(BlogPost)
+        .outerjoin(BlogAuthor, BlogPost.author_id == BlogAuthor.id)
+        .outerjoin(BlogCategory, BlogPost.category_id == BlogCategory.id)
+    )
+    if after_id is not None:
+        stmt = stmt.where(BlogPost.id > after_id)
+    return (
+        stmt.order_by(BlogPost.id)
+        .limit(batch_size)
+        .execution_options(stream_results=True)
+    )
+
+
+def iter_posts(
+    db: Database, after_id: int = None, batch_size: int = DEFAULT_EXPORT_BATCH_SIZE
+) -> Iterator[dict]:
+    """post 를 id 오름차순으로 하나씩 돌려준다.
+
+    Args:
+        db (Database): database
+        after_id (int): 이 id 다음 post 부터 내보낸다. 중단된 export 를 이어서 할 때 사용한다.
+        batch_size (int): 한번에 읽을 post 갯수
+
+    Returns:
+        FIELDS 를 key 로 가진 dict 를 돌려주는 generator
+    """
+    while True:
+        with db.session_scope(read_only=True) as s:
+            rows = s.execute(_export_select(after_id, batch_size)).all()
+            if not rows:
+                return
+            # (post_id, tag_id) index 로 batch 의 id 범위만 읽는다.
+            tags = defaultdict(list)
+            stmt = (
+                select(blog_post_tag.c.post_id, BlogTag.name)
+                .join(BlogTag, BlogTag.id == blog_post_tag.c.tag_id)
+                .where(blog_post_tag.c.post_id.between(rows[0].id, rows[-1].id))
+                .order_by(blog_post_tag.c.post_id, BlogTag.name)
+            )
+            for post_id, name in s.execute(stmt):
+                tags[post_id].append(name)
+        for row in rows:
+            post = dict(row._mapping)
+            if post["date_published"] is not None:
+                post["date_published"] = post["date_published"].isoformat()
+            post["tags"] = tags[row.id]
+            yield post
+        after_id = rows[-1].id
+        if len(rows) < batch_size:
+            return
+
+
+def _write_jsonl(fp: IO[str], posts: Iterable[dict], report: ExportReport):
+    for post in posts:
+        fp.write(json.dumps(post, ensure_ascii=False))
+        fp.write("\n")
+        report.posts += 1
+        report.last_id = post["id"]
+
+
+def _write_csv(
+    fp: IO[str], posts: Iterable[dict], report: ExportReport, header: bool
+):
+    writer = csv.DictWriter(fp, FIELDS)
+    if header:
+        writer.writeheader()
+    for post in posts:
+        writer.writerow(dict(post, tags=CSV_TAG_SEPARATOR.join(post["tags"])))
+        report.posts += 1
+        report.last_id = post["id"]
+
+
+def write_posts(
+    target: Union[str, IO],
+    posts: Iterable[dict],
+    format: str = "jsonl",
+    compress: bool = None,
+    report: ExportReport = None,
+) -> ExportReport:
+    """post 를 file 이나 stream 에 JSON Lines 또는 CSV 로 쓴다.
+
+    report.last_id 가 있으면 이어쓰기로 보고 file 을 append 로 열고 CSV header 를 쓰지 않는다.
+    gzip 은 이어쓰면 member 가 추가되며 gzip 으로 그대로 읽을 수 있다.
+
+    Args:
+        target: file 경로 또는 stream. stream 은 compress 면 binary, 아니면 text
+        posts: iter_posts 결과
+        format (str): "jsonl" 또는 "csv"
+        compress (bool): gzip 압축 여부. None 이면 경로가 .gz 로 끝나는지로 정한다.
+        report (ExportReport): 진행 상황을 기록할 report. 중단되어도 last_id 가 남는다.
+
+    Returns:
+        ExportReport
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    report = report or ExportReport()
+    resume = report.last_id is not None
+    if compress is None:
+        compress = isinstance(target, str) and target.endswith(".gz")
+
+    start = time.perf_counter()
+    if isinstance(target, str):
+        mode = "a" if resume else "w"
+        if compress:
+            fp = gzip.open(target, mode + "t", encoding="utf-8", newline="")
+        else:
+            fp = open(target, mode, encoding="utf-8", newline="")
+    elif compress:
+        fp = io.TextIOWrapper(
+            gzip.GzipFile(fileobj=target, mode="wb"), encoding="utf-8", newline=""
+        )
+    else:
+        fp = target
+    try:
+        if format == "jsonl":
+            _write_jsonl(fp, posts, report)
+        else:
+            _write_csv(fp, posts, report, header=not resume)
+    finally:
+        report.elapsed += time.perf_counter() - start
+        if fp is not target:
+            if isinstance(target, str):
+                fp.close()
+            else:
+                # stream 은 닫지 않고 gzip trailer 만 쓴다.
+                fp.flush()
+                fp.detach().close()
+    log.info("%s (%.0f posts/sec)", report, report.posts_per_sec)
+    return report
@@ -0,0 +1,317 @@
+import time
+import uuid
+import logging
+import datetime
+import itertools
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from database.model import BlogAuthor, BlogCategory, BlogPost, BlogTag, blog_post_tag
+from database import Database, insert_ignore
+from service.counts import month_count_updates, month_deltas, post_count_updates
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class BatchReport(object):
+    """batch 하나의 입력 결과"""
+
+    def __init__(self, index: int, rows: int):
+        self.index = index
+        self.rows = rows
+        self.authors = 0
+        self.categories = 0
+        self.posts = 0
+        self.skipped: List[str] = []
+        self.error: str = None
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self):
+        return (
+            f"batch {self.index}: rows={self.rows} authors={self.authors} "
+            f"categories={self.categories} posts={self.posts} "
+            f"skipped={len(self.skipped)} error={self.error}"
+        )
+
+
+class ImportReport(object):
+    """bulk import 전체 결과"""
+
+    def __init__(self):
+        self.batches: List[BatchReport] = []
+        self.elapsed = 0.0
+
+    @property
+    def rows(self) -> int:
+        return sum(batch.rows for batch in self.batches)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def errors(self) -> List[BatchReport]:
+        return [batch for batch in self.batches if not batch.ok]
+
+
+def _chunks(records: Iterable[dict], size: int):
+    iterator = iter(records)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _id_map(s, column, key_column, keys) -> Dict[str, int]:
+    if not keys:
+        return {}
+    rows = s.query(key_column, column).filter(key_column.in_(keys)).all()
+    return {key: id for key, id in rows}
+
+
+# record type 별로 반드시 있어야 하는 key
+REQUIRED_FIELDS = {
+    "author": ("email",),
+    "category": ("name",),
+    "tag": ("name",),
+    "post": (),
+}
+
+
+def _missing_fields(record: dict) -> List[str]:
+    return [
+        key
+        for key in REQUIRED_FIELDS[record["type"]]
+        if not isinstance(record.get(key), str) or not record[key]
+    ]
+
+
+def parse_date(value) -> Optional[datetime.datetime]:
+    """date_published 값을 datetime 으로 바꾼다. export 한 ISO 문자열도 받는다.
+    timezone 이 있으면 UTC 로 바꾸고 timezone 을 뺀다.
+
+    Raises:
+        ValueError: datetime 이나 ISO 8601 문자열이 아닌 경우
+    """
+    if value is None or isinstance(value, datetime.datetime):
+        date = value
+    elif isinstance(value, str):
+        date = datetime.datetime.fromisoformat(value)
+    else:
+        raise ValueError(f"invalid date_published: {value!r}")
+    if date is not None and date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+
+class _Batch(object):
+    """batch 의 record 를 종류별로 나눈 것"""
+
+    def __init__(self):
+        self.authors: Dict[str, dict] = {}
+        self.categories: Set[str] = set()
+        self.tags: Set[str] = set()
+        self.posts: List[dict] = []
+
+
+class BulkImporter(object):
+    """author, category, post, tag record 를 batch 단위로 입력한다.
+
+    record 는 dict 이고 "type" 으로 구분한다.
+
+    >>> {"type": "author", "email": "a@b.c", "name": "a"}
+    >>> {"type": "category", "name": "python"}
+    >>> {"type": "tag", "name": "pip"}
+    >>> {"type": "post", "title": "t", "article": "a", "author_email": "a@b.c",
+    ...  "category": "python", "tags": ["pip"], "date_published": "2021-03-04T00:00:00"}
+
+    batch 마다 하나의 transaction 으로 author, category, tag, post 를 executemany 로 입력하고
+    email, category 이름, tag 이름을 id 로 바꾸는 map 은 batch 마다 한번 만든다.
+    post id 는 autoincrement 로 할당받고 batch token 을 넣은 import_key 로 한번에 다시 읽는다.
+    필수 key 가 없거나 date_published 를 읽을 수 없는 record 는 batch 의 skipped 에 남긴다.
+    """
+
+    def __init__(self, db: Database, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+
+    def run(self, records: Iterable[dict]) -> ImportReport:
+        report = ImportReport()
+        start = time.perf_counter()
+        for index, chunk in enumerate(_chunks(records, self.batch_size)):
+            batch = BatchReport(index, len(chunk))
+            batch_start = time.perf_counter()
+            try:
+                with self.db.session_scope() as s:
+                    self._import_batch(s, chunk, batch)
+            except SQLAlchemyError as e:
+                batch.error = str(e)
+                batch.authors = batch.categories = batch.posts = 0
+            batch.elapsed = time.perf_counter() - batch_start
+            report.batches.append(batch)
+            report.elapsed = time.perf_counter() - start
+            log.info("%s (%.0f rows/sec)", batch, report.rows_per_sec)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _import_batch(self, s, chunk: List[dict], batch: BatchReport):
+        records = self._classify(chunk, batch)
+        self._insert_names(s, records, batch)
+        if records.posts:
+            self._insert_posts(s, records, batch)
+
+    def _classify(self, chunk: List[dict], batch: BatchReport) -> _Batch:
+        records = _Batch()
+        for record in chunk:
+            record_type = record.get("type") if isinstance(record, dict) else None
+            if record_type not in REQUIRED_FIELDS:
+                batch.skipped.append(f"unknown record type: {record_type}")
+                continue
+            missing = _missing_fields(record)
+            if missing:
+                batch.skipped.append(f"{record_type} without {', '.join(missing)}")
+                continue
+            if record_type == "author":
+                records.authors[record["email"]] = record
+            elif record_type == "category":
+                records.categories.add(record["name"])
+            elif record_type == "tag":
+                records.tags.add(record["name"])
+            else:
+                tags = record.get("tags") or []
+                if not isinstance(tags, list) or not all(
+                    isinstance(tag, str) and tag for tag in tags
+                ):
+                    batch.skipped.append(f"invalid tags: {tags!r}")
+                    continue
+                records.posts.append(record)
+                records.tags.update(tags)
+        return records
+
+    def _insert_names(self, s, records: _Batch, batch: BatchReport):
+        """author, category, tag 를 unique 충돌을 무시하고 입력한다."""
+        dialect_name = s.get_bind().dialect.name
+        if records.authors:
+            s.execute(
+                insert_ignore(BlogAuthor.__table__, dialect_name, ["email"]),
+                [
+                    {
+                        "email": email,
+                        "name": record.get("name"),
+                        "first_name": record.get("first_name"),
+                        "last_name": record.get("last_name"),
+                    }
+                    for email, record in records.authors.items()
+                ],
+            )
+            batch.authors = len(records.authors)
+        if records.categories:
+            s.execute(
+                insert_ignore(BlogCategory.__table__, dialect_name, ["name"]),
+                [{"name": name} for name in records.categories],
+            )
+            batch.categories = len(records.categories)
+        if records.tags:
+            s.execute(
+                insert_ignore(BlogTag.__table__, dialect_name, ["name"]),
+                [{"name": name} for name in records.tags],
+            )
+
+    def _post_row(
+        self,
+        post: dict,
+        author_ids: Dict[str, int],
+        category_ids: Dict[str, int],
+        now: datetime.datetime,
+        batch: BatchReport,
+    ) -> Optional[dict]:
+        """post record 로 만든 blog_post row. 입력할 수 없으면 skipped 에 남기고 None"""
+        author_email = post.get("author_email")
+        if author_email is not None and author_email not in author_ids:
+            batch.skipped.append(f"unknown author: {author_email}")
+            return None
+        category_name = post.get("category")
+        if category_name is not None and category_name not in category_ids:
+            batch.skipped.append(f"unknown category: {category_name}")
+            return None
+        try:
+            date_published = parse_date(post.get("date_published"))
+        except ValueError:
+            batch.skipped.append(
+                f"invalid date_published: {post.get('date_published')!r}"
+            )
+            return None
+        return {
+            "title": post.get("title"),
+            "article": post.get("article"),
+            "author_id": author_ids.get(author_email),
+            "category_id": category_ids.get(category_name),
+            # 월별 post 수를 계산할 수 있도록 date_published 가 없는 post 도 값을 넣는다.
+            "date_published": date_published or now,
+        }
+
+    def _insert_posts(self, s, records: _Batch, batch: BatchReport):
+        dialect_name = s.get_bind().dialect.name
+        posts = records.posts
+        author_ids = _id_map(
+            s,
+            BlogAuthor.id,
+            BlogAuthor.email,
+            {post.get("author_email") for post in posts} - {None},
+        )
+        category_ids = _id_map(
+            s,
+            BlogCategory.id,
+            BlogCategory.name,
+            {post.get("category") for post in posts} - {None},
+        )
+        tag_ids = _id_map(s, BlogTag.id, BlogTag.name, records.tags)
+
+        now = datetime.datetime.utcnow()
+        token = uuid.uuid4().hex
+        post_rows, post_tags = [], []
+        for post in posts:
+            row = self._post_row(post, author_ids, category_ids, now, batch)
+            if row is None:
+                continue
+            row["import_key"] = f"{token}:{len(post_rows)}"
+            post_rows.append(row)
+            post_tags.append(dict.fromkeys(post.get("tags") or []))
+        if not post_rows:
+            return
+
+        # id 는 autoincrement 로 할당받아서 다른 곳에서 입력하는 post 와 겹치지 않는다.
+        s.execute(BlogPost.__table__.insert(), post_rows)
+        # ":" 다음 문자인 ";" 까지의 범위가 이 batch 의 import_key 다.
+        post_ids = dict(
+            s.execute(
+                select(BlogPost.import_key, BlogPost.id).where(
+                    BlogPost.import_key >= f"{token}:",
+                    BlogPost.import_key < f"{token};",
+                )
+            ).all()
+        )
+        post_tag_rows = [
+            {"post_id": post_ids[row["import_key"]], "tag_id": tag_ids[tag_name]}
+            for row, tag_names in zip(post_rows, post_tags)
+            for tag_name in tag_names
+        ]
+        if post_tag_rows:
+            s.execute(blog_post_tag.insert(), post_tag_rows)
+        for stmt in post_count_updates(
+            Counter(row["tag_id"] for row in post_tag_rows),
+            Counter(row["category_id"] for row in post_rows),
+        ) + month_count_updates(
+            dialect_name, month_deltas(row["date_published"] for row in post_rows)
+        ):
+            s.execute(stmt)
+        batch.posts = len(post_rows)
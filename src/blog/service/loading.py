@@ -0,0 +1,35 @@
+from typing import List
+from sqlalchemy.orm import defer, joinedload, noload, selectinload
+from database.model import BlogPost
+
+
+PROFILES = ("summary", "card", "full")
+DEFAULT_PROFILE = "full"
+
+
+def post_load_options(profile: str = DEFAULT_PROFILE) -> List:
+    """BlogPost 조회 시 사용할 loading option
+
+    tags 를 joined 로 가져오면 post x tag 만큼 row 가 생기고 article 이 row 마다 반복되므로
+    tags 는 selectinload 로 page 전체를 한번에 가져온다.
+
+    - summary: article, tags 를 가져오지 않는다. tags 는 빈 목록이다.
+    - card: article 을 가져오지 않고 tags 는 selectinload
+    - full: article 포함, tags 는 selectinload
+
+    author, category 는 한 row 에 하나씩이므로 항상 joinedload 한다.
+    가져오지 않은 article 은 session 이 닫힌 뒤 접근하면 오류가 발생한다.
+
+    Raises:
+        ValueError: 없는 profile 인 경우
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"profile must be one of {PROFILES}")
+    options = [joinedload(BlogPost.author), joinedload(BlogPost.category)]
+    if profile == "summary":
+        options += [defer(BlogPost.article), noload(BlogPost.tags)]
+    elif profile == "card":
+        options += [defer(BlogPost.article), selectinload(BlogPost.tags)]
+    else:
+        options.append(selectinload(BlogPost.tags))
+    return options
@@ -0,0 +1,408 @@
+"""post page cache
+
+post 화면에 필요한 title, article, author, category, tag 이름을 PostPage 로 한번 만들어서
+serialize 한 bytes 로 post id 별 LRU 에 저장한다. 조회할 때는 bytes 만 풀면 되므로
+ORM 객체를 만들거나 join 하지 않고, 표시할 문자열도 만들 때 한번만 계산한다.
+
+LRU 에서 밀려난 page 는 mmap_size 가 있으면 memory-mapped file 에 옮겨서
+자주 읽지 않는 post 도 database 대신 file 에서 읽는다.
+post, author, tag 변경 시 BlogService, AsyncBlogService 가 해당 page 를 지운다.
+다른 process 의 변경은 알 수 없으므로 page 는 ttl 이 지나면 버린다.
+"""
+import os
+import json
+import mmap
+import time
+import datetime
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import select
+from database import after_commit, in_transaction
+from database.model import BlogAuthor, BlogCategory, BlogPost, BlogTag, blog_post_tag
+
+
+class PostPage(object):
+    """post 화면 표시용 post. 만들 때 표시할 문자열을 미리 계산한다.
+
+    views 는 자주 바뀌므로 포함하지 않는다.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "article",
+        "date_published",
+        "comment_count",
+        "author_id",
+        "author_name",
+        "author_email",
+        "category_name",
+        "tag_names",
+        "text",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        article: str,
+        date_published: Optional[datetime.datetime],
+        comment_count: int,
+        author_id: Optional[int],
+        author_name: Optional[str],
+        author_email: Optional[str],
+        category_name: Optional[str],
+        tag_names: List[str],
+        text: str = None,
+    ):
+        self.id = id
+        self.title = title
+        self.article = article
+        self.date_published = date_published
+        self.comment_count = comment_count
+        self.author_id = author_id
+        self.author_name = author_name
+        self.author_email = author_email
+        self.category_name = category_name
+        self.tag_names = tag_names
+        self.text = text if text is not None else self._render()
+
+    def _render(self) -> str:
+        # BlogPost.__str__ 과 같은 형식
+        author = None
+        if self.author_id is not None:
+            author = f"[{self.author_id}] {self.author_name}, {self.author_email}"
+        category = f"<{self.category_name}>" if self.category_name is not None else None
+        tag_names = [f"#{name}" for name in self.tag_names]
+        return f"[{self.id}] 글쓴이:{author} | {self.title}, {self.article} | {category}, {tag_names}"
+
+    def to_bytes(self) -> bytes:
+        values = [getattr(self, name) for name in self.__slots__]
+        if self.date_published is not None:
+            values[3] = self.date_published.isoformat()
+        return json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PostPage":
+        values = json.loads(data)
+        if values[3] is not None:
+            values[3] = datetime.datetime.fromisoformat(values[3])
+        return cls(*values)
+
+    def __repr__(self):
+        return f"PostPage(id={self.id}, title={self.title!r})"
+
+    def __str__(self):
+        return self.text
+
+
+def load_pages(s, post_ids: Iterable[int]) -> Dict[int, PostPage]:
+    """post 와 author, category column 을 한번, tag 이름을 한번 조회해서 PostPage 를 만든다.
+
+    Returns:
+        {post id: PostPage}. 없는 post 는 포함하지 않는다.
+    """
+    post_ids = list(post_ids)
+    rows = s.execute(
+        select(
+            BlogPost.id,
+            BlogPost.title,
+            BlogPost.article,
+            BlogPost.date_published,
+            BlogPost.comment_count,
+            BlogPost.author_id,
+            BlogAuthor.name.label("author_name"),
+            BlogAuthor.email.label("author_email"),
+            BlogCategory.name.label("category_name"),
+        )
+        .select_from(BlogPost)
+        .outerjoin(BlogAuthor, BlogPost.author_id == BlogAuthor.id)
+        .outerjoin(BlogCategory, BlogPost.category_id == BlogCategory.id)
+        .where(BlogPost.id.in_(post_ids))
+    ).all()
+    if not rows:
+        return {}
+    tag_names = defaultdict(list)
+    stmt = (
+        select(blog_post_tag.c.post_id, BlogTag.name)
+        .join(BlogTag, BlogTag.id == blog_post_tag.c.tag_id)
+        .where(blog_post_tag.c.post_id.in_([row.id for row in rows]))
+        .order_by(blog_post_tag.c.post_id, BlogTag.name)
+    )
+    for post_id, name in s.execute(stmt):
+        tag_names[post_id].append(name)
+    return {row.id: PostPage(*row, tag_names=tag_names[row.id]) for row in rows}
+
+
+class _MmapTier(object):
+    """고정 크기 임시 file 을 mmap 하고 page bytes 를 순서대로 이어 쓴다.
+
+    끝에 닿으면 전체를 비우고 처음부터 다시 쓴다. fork 된 process 에서는 부모와 같은
+    file 에 쓰지 않도록 새 file 을 만든다.
+    """
+
+    def __init__(self, size: int, path: str = None):
+        self.size = size
+        self.path = path
+        self.resets = 0
+        self._open()
+
+    def _open(self):
+        self._pid = os.getpid()
+        if self.path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._file = open(self.path, "w+b")
+        self._file.truncate(self.size)
+        self._mmap = mmap.mmap(self._file.fileno(), self.size)
+        self._index: Dict[int, Tuple[int, int]] = {}
+        self._offset = 0
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._open()
+
+    def get(self, post_id: int) -> Optional[bytes]:
+        self._check_pid()
+        item = self._index.get(post_id)
+        if item is None:
+            return None
+        offset, length = item
+        return self._mmap[offset : offset + length]
+
+    def set(self, post_id: int, data: bytes) -> List[int]:
+        """data 를 쓰고 처음부터 다시 쓰느라 지운 post id 목록을 돌려준다."""
+        self._check_pid()
+        if len(data) > self.size:
+            return []
+        dropped = []
+        if self._offset + len(data) > self.size:
+            dropped = list(self._index)
+            self._index.clear()
+            self._offset = 0
+            self.resets += 1
+        self._mmap[self._offset : self._offset + len(data)] = data
+        self._index[post_id] = (self._offset, len(data))
+        self._offset += len(data)
+        return dropped
+
+    def delete(self, post_id: int):
+        self._index.pop(post_id, None)
+
+    def __contains__(self, post_id: int) -> bool:
+        return post_id in self._index
+
+    def clear(self):
+        self._index.clear()
+        self._offset = 0
+
+    def stats(self) -> dict:
+        return {
+            "mmap_size": self.size,
+            "mmap_used": self._offset,
+            "mmap_entries": len(self._index),
+            "mmap_resets": self.resets,
+        }
+
+
+class PostPageCache(object):
+    """post id 별 serialize 된 PostPage 를 저장하는 LRU
+
+    maxsize 를 넘으면 가장 오래 사용하지 않은 page 를 mmap tier 로 옮기고
+    mmap_size 가 0 이면 버린다. maxsize 가 0 이면 아무것도 저장하지 않는다.
+    TransactionalCache 와 같이 Database.transaction 중에는 읽거나 채우지 않고
+    delete 는 바로 하고 commit 후에 다시 한다.
+
+    page 를 읽는 동안 변경되어 지워진 post 의 이전 page 를 저장하지 않도록 읽기 전에
+    generation 을 받아서 set 에 넘긴다. 그 사이에 delete 가 있었으면 저장하지 않는다.
+
+    Args:
+        maxsize (int): memory 에 둘 page 수
+        mmap_size (int): mmap tier 크기(byte). 0 이면 사용하지 않는다.
+        mmap_path (str): mmap tier file 경로. None 이면 임시 file
+        ttl (float): page 를 저장해 두는 시간(초). None 이면 지울 때까지 둔다.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        mmap_size: int = 0,
+        mmap_path: str = None,
+        ttl: Optional[float] = 300.0,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, bytes]" = OrderedDict()
+        self._mmap = _MmapTier(mmap_size, mmap_path) if mmap_size > 0 else None
+        # 두 tier 의 page 가 만료되는 시각
+        self._expires: Dict[int, float] = {}
+        # author 변경 시 지울 post id
+        self._author_posts: Dict[int, Set[int]] = defaultdict(set)
+        self._post_author: Dict[int, int] = {}
+        self._generation = 0
+        self.hits = 0
+        self.mmap_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_sets = 0
+
+    def get(self, post_id: int) -> Optional[PostPage]:
+        """post id 의 PostPage. 없으면 None"""
+        if in_transaction() or not self.maxsize:
+            return None
+        with self._lock:
+            expires_at = self._expires.get(post_id)
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(post_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            data = self._data.get(post_id)
+            if data is not None:
+                self._data.move_to_end(post_id)
+                self.hits += 1
+            elif self._mmap is not None:
+                data = self._mmap.get(post_id)
+                if data is not None:
+                    self.mmap_hits += 1
+                    self._put(post_id, data)
+            if data is None:
+                self.misses += 1
+                return None
+        return PostPage.from_bytes(data)
+
+    def generation(self) -> int:
+        """page 를 database 에서 읽기 전에 받아서 set 에 넘긴다."""
+        with self._lock:
+            return self._generation
+
+    def set(self, page: PostPage, generation: int = None):
+        """page 를 저장한다.
+
+        Args:
+            page (PostPage): 저장할 page
+            generation (int): page 를 읽기 전의 generation(). 그 뒤에 delete 가 있었으면
+                page 가 이전 내용일 수 있으므로 저장하지 않는다.
+        """
+        if in_transaction() or not self.maxsize:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.stale_sets += 1
+                return
+            if self._mmap is not None:
+                self._mmap.delete(page.id)
+            self._put(page.id, page.to_bytes())
+            self._forget(page.id)
+            self._post_author[page.id] = page.author_id
+            self._author_posts[page.author_id].add(page.id)
+            if self.ttl is not None:
+                self._expires[page.id] = time.monotonic() + self.ttl
+
+    def _put(self, post_id: int, data: bytes):
+        self._data[post_id] = data
+        self._data.move_to_end(post_id)
+        while len(self._data) > self.maxsize:
+            evicted_id, evicted = self._data.popitem(last=False)
+            self.evictions += 1
+            if self._mmap is None:
+                self._forget(evicted_id)
+                continue
+            for dropped_id in self._mmap.set(evicted_id, evicted):
+                if dropped_id not in self._data:
+                    self._forget(dropped_id)
+            if evicted_id not in self._mmap:
+                self._forget(evicted_id)
+
+    def _forget(self, post_id: int):
+        self._expires.pop(post_id, None)
+        author_id = self._post_author.pop(post_id, None)
+        posts = self._author_posts.get(author_id)
+        if posts is not None:
+            posts.discard(post_id)
+            if not posts:
+                del self._author_posts[author_id]
+
+    def _remove(self, post_id: int):
+        self._data.pop(post_id, None)
+        if self._mmap is not None:
+            self._mmap.delete(post_id)
+        self._forget(post_id)
+
+    def _delete(self, post_ids: Iterable[int]):
+        with self._lock:
+            self._generation += 1
+            for post_id in post_ids:
+                self._remove(post_id)
+
+    def delete(self, *post_ids: int):
+        self._delete(post_ids)
+        if in_transaction():
+            after_commit(lambda: self._delete(post_ids))
+
+    def _delete_author(self, author_id: int):
+        with self._lock:
+            self._generation += 1
+            for post_id in list(self._author_posts.get(author_id, ())):
+                self._remove(post_id)
+
+    def delete_author(self, author_id: int):
+        """author 의 post page 를 모두 지운다."""
+        self._delete_author(author_id)
+        if in_transaction():
+            after_commit(lambda: self._delete_author(author_id))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            if self._mmap is not None:
+                self._mmap.clear()
+            self._expires.clear()
+            self._author_posts.clear()
+            self._post_author.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "mmap_hits": self.mmap_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_sets": self.stale_sets,
+            }
+            if self._mmap is not None:
+                stats.update(self._mmap.stats())
+            return stats
+
+
+_default_page_cache = None
+_default_page_cache_lock = threading.Lock()
+
+
+def default_page_cache() -> PostPageCache:
+    """process 가 공유하는 기본 page cache
+
+    BLOG_PAGE_CACHE=false 이면 저장하지 않는다. 크기는 BLOG_PAGE_CACHE_SIZE,
+    mmap tier 크기(byte)는 BLOG_PAGE_CACHE_MMAP_SIZE, TTL 은 BLOG_PAGE_CACHE_TTL 로 설정한다.
+    기본은 mmap tier 없음
+    """
+    global _default_page_cache
+    with _default_page_cache_lock:
+        if _default_page_cache is None:
+            if os.environ.get("BLOG_PAGE_CACHE", "true").lower() in ["1", "true", "yes"]:
+                _default_page_cache = PostPageCache(
+                    maxsize=int(os.environ.get("BLOG_PAGE_CACHE_SIZE", 1024)),
+                    mmap_size=int(os.environ.get("BLOG_PAGE_CACHE_MMAP_SIZE", 0)),
+                    ttl=float(os.environ.get("BLOG_PAGE_CACHE_TTL", 300)),
+                )
+            else:
+                _default_page_cache = PostPageCache(maxsize=0)
+        return _default_page_cache
@@ -0,0 +1,128 @@
+import json
+import base64
+import datetime
+from typing import Generic, List, Optional, Tuple, TypeVar
+from sqlalchemy import and_, or_
+
+
+T = TypeVar("T")
+
+# "id" 외의 정렬 key 는 id 를 두번째 key 로 사용한다.
+ORDER_KEYS = ("id", "date_published", "post_count")
+
+
+class Page(Generic[T]):
+    """keyset pagination 결과
+
+    next_cursor 가 None 이면 마지막 page 이다.
+    """
+
+    def __init__(self, items: List[T], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+def encode_cursor(order_by: str, values: Tuple) -> str:
+    """마지막 row 의 정렬 key 로 cursor 를 만든다."""
+    values = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    raw = json.dumps({"o": order_by, "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(order_by: str, cursor: str) -> Tuple:
+    """cursor 를 정렬 key 로 되돌린다.
+
+    Raises:
+        ValueError: cursor 가 잘못되었거나 정렬 기준이 다른 경우
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = data["v"]
+        if data["o"] != order_by:
+            raise ValueError(f"cursor order {data['o']} != {order_by}")
+        if order_by == "date_published":
+            return datetime.datetime.fromisoformat(values[0]), int(values[1])
+        return tuple(int(value) for value in values)
+    except (KeyError, IndexError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+
+
+def keyset_query(
+    query, model, order_by: str, limit: int, cursor: str = None, desc: bool = True
+):
+    """query 에 keyset 조건, 정렬, limit 을 붙인다.
+
+    Query 와 Select 모두 사용할 수 있다.
+    다음 page 가 있는지 확인하기 위해 limit 보다 하나 더 가져온다.
+    desc=False 는 order_by="id" 만 지원한다.
+    """
+    if order_by not in ORDER_KEYS or not hasattr(model, order_by):
+        raise ValueError(f"order_by must be one of {ORDER_KEYS}")
+    if not desc and order_by != "id":
+        raise ValueError("ascending order supports only order_by='id'")
+    if order_by == "id":
+        if cursor is not None:
+            (last_id,) = decode_cursor(order_by, cursor)
+            query = query.filter(model.id < last_id if desc else model.id > last_id)
+        query = query.order_by(model.id.desc() if desc else model.id.asc())
+    else:
+        column = getattr(model, order_by)
+        if cursor is not None:
+            last_value, last_id = decode_cursor(order_by, cursor)
+            # column <= last_value 가 있어야 OR 조건에서도 index 범위를 바로 찾아간다.
+            query = query.filter(
+                column <= last_value,
+                or_(
+                    column < last_value,
+                    and_(column == last_value, model.id < last_id),
+                ),
+            )
+        query = query.order_by(column.desc(), model.id.desc())
+    return query.limit(limit + 1)
+
+
+def make_page(rows: List, order_by: str, limit: int) -> Page:
+    """keyset_query 결과로 Page 를 만든다."""
+    items, more = rows[:limit], len(rows) > limit
+    next_cursor = None
+    if more and items:
+        last = items[-1]
+        values = (last.id,) if order_by == "id" else (getattr(last, order_by), last.id)
+        next_cursor = encode_cursor(order_by, values)
+    return Page(items, next_cursor)
+
+
+def keyset_page(
+    query, model, order_by: str, limit: int, cursor: str = None, desc: bool = True
+) -> Page:
+    """query 에 keyset 조건과 정렬을 붙여서 한 page 를 가져온다.
+
+    OFFSET 을 사용하지 않으므로 몇번째 page 든 index 를 타고 limit 만큼만 읽는다.
+    최신 글부터 (id 또는 date_published, id 내림차순) 가져온다.
+
+    Args:
+        query: model 을 조회하는 query
+        model: id 와 order_by column 을 가진 mapped class
+        order_by (str): "id", "date_published" 또는 "post_count"
+        limit (int): 가져올 갯수
+        cursor (str): 이전 page 의 next_cursor
+        desc (bool): False 이면 오래된 것부터 가져온다.
+
+    Returns:
+        Page
+    """
+    rows = keyset_query(query, model, order_by, limit, cursor, desc).all()
+    return make_page(rows, order_by, limit)
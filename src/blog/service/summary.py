@@ -0,0 +1,115 @@
+import datetime
+from collections import defaultdict
+from typing import List
+from sqlalchemy import func, null, select
+from database.model import BlogAuthor, BlogCategory, BlogPost, BlogTag, blog_post_tag
+
+
+class PostSummary(object):
+    """목록 표시용 post 요약
+
+    ORM 객체 대신 column 만 조회해서 만든다. article 은 excerpt 로만 가진다.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "date_published",
+        "views",
+        "comment_count",
+        "author_id",
+        "author_name",
+        "category_name",
+        "tag_names",
+        "excerpt",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        date_published: datetime.datetime,
+        views: int,
+        comment_count: int,
+        author_id: int,
+        author_name: str,
+        category_name: str,
+        tag_names: List[str] = None,
+        excerpt: str = None,
+    ):
+        self.id = id
+        self.title = title
+        self.date_published = date_published
+        self.views = views
+        self.comment_count = comment_count
+        self.author_id = author_id
+        self.author_name = author_name
+        self.category_name = category_name
+        self.tag_names = tag_names if tag_names is not None else []
+        self.excerpt = excerpt
+
+    def __repr__(self):
+        return f"PostSummary(id={self.id}, title={self.title!r})"
+
+    def __str__(self):
+        tag_names = [f"#{name}" for name in self.tag_names]
+        return f"[{self.id}] 글쓴이:{self.author_name} | {self.title} | <{self.category_name}>, {tag_names}"
+
+
+def summary_select(excerpt_length: int = None):
+    """PostSummary 를 만들 column 만 조회하는 select
+
+    Args:
+        excerpt_length (int): article 앞부분 길이. None 이면 article 을 가져오지 않는다.
+    """
+    if excerpt_length:
+        excerpt = func.substr(BlogPost.article, 1, excerpt_length)
+    else:
+        excerpt = null()
+    return (
+        select(
+            BlogPost.id,
+            BlogPost.title,
+            BlogPost.date_published,
+            BlogPost.views,
+            BlogPost.comment_count,
+            BlogPost.author_id,
+            BlogAuthor.name.label("author_name"),
+            BlogCategory.name.label("category_name"),
+            excerpt.label("excerpt"),
+        )
+        .select_from(BlogPost)
+        .outerjoin(BlogAuthor, BlogPost.author_id == BlogAuthor.id)
+        .outerjoin(BlogCategory, BlogPost.category_id == BlogCategory.id)
+    )
+
+
+def to_summaries(s, rows) -> List[PostSummary]:
+    """summary_select 결과 row 로 PostSummary 를 만들고 tag 이름을 한번에 채운다."""
+    summaries = [
+        PostSummary(
+            row.id,
+            row.title,
+            row.date_published,
+            row.views,
+            row.comment_count,
+            row.author_id,
+            row.author_name,
+            row.category_name,
+            excerpt=row.excerpt,
+        )
+        for row in rows
+    ]
+    if summaries:
+        tag_names = defaultdict(list)
+        stmt = (
+            select(blog_post_tag.c.post_id, BlogTag.name)
+            .join(BlogTag, BlogTag.id == blog_post_tag.c.tag_id)
+            .where(blog_post_tag.c.post_id.in_([summary.id for summary in summaries]))
+            .order_by(blog_post_tag.c.post_id, BlogTag.name)
+        )
+        for post_id, name in s.execute(stmt):
+            tag_names[post_id].append(name)
+        for summary in summaries:
+            summary.tag_names = tag_names[summary.id]
+    return summaries
@@ -0,0 +1,59 @@
+"""tag 로 post 찾기
+
+blog_post_tag 의 PK (tag_id, post_id) 만 읽어서 post id 를 최신 순서로 가져온다.
+"""
+from typing import List
+from sqlalchemy import select, union
+from database.model import blog_post_tag
+
+MODES = ("any", "all")
+
+
+def tagged_post_ids(tag_ids: List[int], mode: str, limit: int, last_id: int = None):
+    """tag 가 붙은 post id 를 id 내림차순으로 limit 개 가져오는 select
+
+    "all" 은 첫번째 tag 의 (tag_id, post_id) 범위를 id 내림차순으로 읽으면서
+    나머지 tag 는 PK 로 하나씩 확인한다. 첫번째 tag 가 가장 적게 사용된 tag 가 되도록
+    tag_ids 를 post_count 오름차순으로 넘겨야 인기 tag 가 섞여도 읽는 row 가 적다.
+
+    "any" 는 tag 마다 limit 개씩만 읽어서 합친다.
+
+    Args:
+        tag_ids (List[int]): tag id 목록. "all" 이면 post_count 오름차순
+        mode (str): "any" 또는 "all"
+        limit (int): 가져올 갯수
+        last_id (int): 이 id 보다 작은 post 만 가져온다.
+
+    Returns:
+        post_id column 하나를 가진 select
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    if mode == "all":
+        driving = blog_post_tag.alias("t0")
+        stmt = select(driving.c.post_id).where(driving.c.tag_id == tag_ids[0])
+        for idx, tag_id in enumerate(tag_ids[1:], 1):
+            other = blog_post_tag.alias(f"t{idx}")
+            stmt = stmt.join_from(
+                driving,
+                other,
+                (other.c.post_id == driving.c.post_id) & (other.c.tag_id == tag_id),
+            )
+        if last_id is not None:
+            stmt = stmt.where(driving.c.post_id < last_id)
+        # mysql 이 join 순서를 바꾸지 않도록 한다.
+        stmt = stmt.prefix_with("STRAIGHT_JOIN", dialect="mysql")
+        return stmt.order_by(driving.c.post_id.desc()).limit(limit)
+
+    per_tag = []
+    for tag_id in tag_ids:
+        stmt = select(blog_post_tag.c.post_id).where(blog_post_tag.c.tag_id == tag_id)
+        if last_id is not None:
+            stmt = stmt.where(blog_post_tag.c.post_id < last_id)
+        per_tag.append(stmt.order_by(blog_post_tag.c.post_id.desc()).limit(limit))
+    if len(per_tag) == 1:
+        return per_tag[0]
+    # sqlite 는 UNION 안의 ORDER BY, LIMIT 을 subquery 로 감싸야 한다.
+    subqueries = [stmt.subquery() for stmt in per_tag]
+    merged = union(*[select(sub.c.post_id) for sub in subqueries]).subquery()
+    return select(merged.c.post_id).order_by(merged.c.post_id.desc()).limit(limit)
@@ -0,0 +1,138 @@
+import os
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict
+from sqlalchemy import func, update
+from sqlalchemy.exc import SQLAlchemyError
+from database.model import BlogPost, counter_values
+from database import Database
+
+
+log = logging.getLogger(f"app.{__name__}")
+
+
+class ViewCounter(object):
+    """post 조회수를 memory 에 모았다가 한번에 반영한다.
+
+    조회할 때마다 UPDATE 하면 인기 있는 post 의 row lock 에서 대기하게 되므로
+    post id 별로 증가량을 모아서 flush_interval 마다, 또는 flush_size 만큼 쌓이면
+    UPDATE blog_post SET views = views + n WHERE id IN (...) 로 반영한다.
+    증가량이 같은 post 는 하나의 UPDATE 로 묶는다.
+    """
+
+    def __init__(
+        self, db: Database = None, flush_interval: float = 5.0, flush_size: int = 1000
+    ):
+        self.db = db or Database()
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[int, int] = defaultdict(int)
+        self._pending_total = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+    def record(self, post_id: int, n: int = 1):
+        """post 조회수 증가를 기록한다."""
+        with self._lock:
+            self._pending[post_id] += n
+            self._pending_total += n
+            full = self._pending_total >= self.flush_size
+        if full:
+            try:
+                self.flush()
+            except SQLAlchemyError as e:
+                log.error("Unable to flush post views: %s", e)
+
+    def pending(self) -> Dict[int, int]:
+        """아직 반영되지 않은 {post_id: 증가량}"""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self) -> int:
+        """모인 조회수를 database 에 반영한다.
+
+        실패하면 다음 flush 때 다시 반영하도록 증가량을 되돌려 놓는다.
+
+        Returns:
+            반영된 post 갯수
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+                self._pending_total = 0
+            if not pending:
+                return 0
+
+            by_increment = defaultdict(list)
+            for post_id, n in pending.items():
+                by_increment[n].append(post_id)
+            try:
+                with self.db.session_scope() as s:
+                    for n, post_ids in by_increment.items():
+                        s.execute(
+                            update(BlogPost.__table__)
+                            .where(BlogPost.id.in_(post_ids))
+                            .values(
+                                counter_values(
+                                    BlogPost.__table__,
+                                    views=func.coalesce(BlogPost.views, 0) + n,
+                                )
+                            )
+                        )
+            except SQLAlchemyError:
+                with self._lock:
+                    for post_id, n in pending.items():
+                        self._pending[post_id] += n
+                        self._pending_total += n
+                raise
+            return len(pending)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except SQLAlchemyError as e:
+                log.error("Unable to flush post views: %s", e)
+
+    def start(self):
+        """flush_interval 마다 flush 하는 thread 를 시작한다."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="blog-view-counter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """thread 를 멈추고 남은 조회수를 반영한다."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_default_counter = None
+_default_counter_lock = threading.Lock()
+
+
+def default_view_counter() -> ViewCounter:
+    """process 가 공유하는 ViewCounter
+
+    BLOG_VIEW_FLUSH_INTERVAL, BLOG_VIEW_FLUSH_SIZE 로 설정하고 process 종료 시 flush 한다.
+    """
+    global _default_counter
+    with _default_counter_lock:
+        if _default_counter is None:
+            _default_counter = ViewCounter(
+                flush_interval=float(os.environ.get("BLOG_VIEW_FLUSH_INTERVAL", 5)),
+                flush_size=int(os.environ.get("BLOG_VIEW_FLUSH_SIZE", 1000)),
+            )
+            _default_counter.start()
+            atexit.register(_default_counter.stop)
+        return _default_counter
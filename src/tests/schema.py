@@ -0,0 +1,60 @@
+"""test 용 database schema
+
+schema 는 process 에서 한번만 in-memory sqlite template 에 만들고, test 마다 template 을
+sqlite backup API 로 test database 에 덮어써서 빈 schema 로 되돌린다.
+test 마다 drop_all/create_all 로 DDL 을 실행하는 것보다 빠르고 service 가 여는 session,
+thread 와 상관없이 test 끼리 data 가 섞이지 않는다.
+sqlite file 이 아니면 drop_all 후 upgrade 한다.
+"""
+import sqlite3
+import threading
+from contextlib import nullcontext
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from database import Database
+from database.migrate import upgrade
+from database.sqlite_tuning import is_file_sqlite
+
+
+_lock = threading.Lock()
+_template = None
+
+
+def _template_connection() -> sqlite3.Connection:
+    global _template
+    with _lock:
+        if _template is None:
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            engine = create_engine(
+                "sqlite://", creator=lambda: conn, poolclass=StaticPool
+            )
+            with engine.begin() as c:
+                upgrade(c)
+            _template = conn
+        return _template
+
+
+def reset_database(db: Database = None) -> Database:
+    """db 를 빈 schema 로 되돌린다.
+
+    Args:
+        db (Database): 되돌릴 database. None 이면 Database()
+
+    Returns:
+        db
+    """
+    db = db or Database()
+    if not is_file_sqlite(db.connection_string):
+        db.drop_all()
+        db.upgrade()
+        return db
+    writer = db.writer.hold() if db.writer is not None else nullcontext()
+    with writer:
+        target = db.engine.raw_connection()
+        try:
+            _template_connection().backup(target.connection)
+        finally:
+            target.close()
+    # foreign_keys=AUTO 를 복사한 schema version 으로 다시 정하도록 다시 연결한다.
+    db.engine.dispose()
+    return db
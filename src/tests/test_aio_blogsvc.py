@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from database.aio import dispose_async_engines
+from service.aio import AsyncBlogService
+from service.blog import AuthorNotExist, BlogService, PostNotExist, VersionConflict
+from service.cache import MemoryCache
+from service.page_cache import PostPageCache
+from tests.schema import reset_database
+
+
+class AsyncBlogServiceTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # 같은 sqlite file 을 사용하므로 sync Database 로 빈 schema 를 만든다.
+        reset_database()
+        self.blog_svc = AsyncBlogService()
+
+    async def asyncTearDown(self):
+        # engine 의 connection 은 event loop 에 묶이므로 test 마다 닫는다.
+        await dispose_async_engines()
+
+    async def test_async_blog_svc(self):
+        author_id = await self.blog_svc.add_author("async@example.com", "async")
+        assert author_id
+        with self.assertRaises(AuthorNotExist):
+            await self.blog_svc.get_author_by_id(0)
+
+        assert await self.blog_svc.mod_author_partial(author_id, first_name="aio")
+        author = await self.blog_svc.get_author_by_email("async@example.com")
+        assert author.first_name == "aio"
+        with self.assertRaises(VersionConflict):
+            await self.blog_svc.mod_author_partial(
+                author_id, expected_version=author.version - 1, name="stale"
+            )
+
+        await self.blog_svc.add_category("python")
+        category = await self.blog_svc.get_category_by_name("python")
+        post_id = await self.blog_svc.add_post(
+            "title", "article", author, category, ["a", "b"]
+        )
+        assert await self.blog_svc.mod_post_partial(post_id, new_tags=["b", "c"])
+        post = await self.blog_svc.get_post_by_id(post_id)
+        assert post.author.name == "async"
+        assert post.category.name == "python"
+        assert sorted(tag.name for tag in post.tags) == ["b", "c"]
+        with self.assertRaises(PostNotExist):
+            await self.blog_svc.get_post_by_id(0)
+
+        # 동시에 여러 post 입력
+        post_ids = await asyncio.gather(
+            *[
+                self.blog_svc.add_post(f"title {idx}", "article", author, category)
+                for idx in range(6)
+            ]
+        )
+        posts = await self.blog_svc.get_posts_by_author(author, limit=3, offset=1)
+        assert len(posts) == 3
+        page = await self.blog_svc.get_posts_by_category_name_page("python", limit=4)
+        assert len(page) == 4
+        page = await self.blog_svc.get_posts_by_category_name_page(
+            "python", limit=4, cursor=page.next_cursor
+        )
+        assert len(page) == 3
+        assert page.next_cursor is None
+        assert post_ids
+        assert len(await self.blog_svc.get_tags()) == 3
+
+    async def test_page_cache_invalidation(self):
+        # 같은 process 의 BlogService 가 저장한 page 를 async write 가 지운다.
+        page_cache = PostPageCache()
+        blog_svc = AsyncBlogService(page_cache=page_cache)
+        sync_svc = BlogService(page_cache=page_cache)
+        author_id = await blog_svc.add_author("page@example.com", "page")
+        author = await blog_svc.get_author_by_id(author_id)
+        post_id = await blog_svc.add_post("title", "article", author, tags=["a"])
+        assert sync_svc.get_post_page(post_id).title == "title"
+
+        await blog_svc.mod_post_partial(post_id, new_title="new", new_tags=["b"])
+        page = sync_svc.get_post_page(post_id)
+        assert (page.title, page.tag_names) == ("new", ["b"])
+        await blog_svc.mod_author_partial(author_id, name="renamed")
+        assert sync_svc.get_post_page(post_id).author_name == "renamed"
+        author = await blog_svc.get_author_by_id(author_id)
+        author.name = "again"
+        await blog_svc.mod_author(author)
+        assert sync_svc.get_post_page(post_id).author_name == "again"
+
+    async def test_cache_invalidation(self):
+        # 같은 process 의 BlogService 가 cache 한 author, post, category 를 async write 가 지운다.
+        cache = MemoryCache()
+        blog_svc = AsyncBlogService(cache=cache, page_cache=PostPageCache(maxsize=0))
+        sync_svc = BlogService(cache=cache, page_cache=PostPageCache(maxsize=0))
+        author_id = await blog_svc.add_author("cache@example.com", "cache")
+        category_id = await blog_svc.add_category("python")
+        assert sync_svc.get_author_by_id(author_id).name == "cache"
+        assert sync_svc.get_category_by_id(category_id).post_count == 0
+
+        author = await blog_svc.get_author_by_id(author_id)
+        category = await blog_svc.get_category_by_id(category_id)
+        post_id = await blog_svc.add_post("title", "article", author, category)
+        assert sync_svc.get_category_by_id(category_id).post_count == 1
+        assert sync_svc.get_post_by_id(post_id).title == "title"
+
+        await blog_svc.mod_author_partial(author_id, name="renamed")
+        assert sync_svc.get_author_by_id(author_id).name == "renamed"
+        assert sync_svc.get_post_by_id(post_id).author.name == "renamed"
+        await blog_svc.mod_post_partial(post_id, new_title="new")
+        assert sync_svc.get_post_by_id(post_id).title == "new"
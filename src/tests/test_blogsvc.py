@@ -1,6 +1,31 @@
+import io
+import csv
+import datetime
+import gzip
+import json
+import tempfile
 import unittest
-from service.blog import BlogService, CategoryNotExist, AuthorNotExist
-from database import Database
+import sqlalchemy
+from collections import deque
+from service.blog import (
+    BlogService,
+    CategoryNotExist,
+    AuthorNotExist,
+    CommentNotExist,
+    InvalidArchiveDate,
+    InvalidCursor,
+    InvalidField,
+    InvalidProfile,
+    PostNotExist,
+    VersionConflict,
+)
+from database.advisor import explain
+from database.model import BlogPost
+from database.profiler import QueryProfiler, profile_calls
+from service.cache import MISSING, CacheBackend, MemoryCache
+from service.page_cache import PostPageCache, load_pages
+from service.views import ViewCounter
+from tests.schema import reset_database
 
 
 class BlotServiceTestCase(unittest.TestCase):
@@ -8,9 +33,10 @@ class BlotServiceTestCase(unittest.TestCase):
         pass
 
     def setUp(self):
-        Database().drop_all()
-        Database().create_all()
+        reset_database()
         self.blog_svc = BlogService()
+        self.blog_svc.cache.clear()
+        self.blog_svc.page_cache.clear()
 
     def test_blog_Svc(self):
         email = "sukjun40@naver.com"
@@ -32,12 +58,19 @@ class BlotServiceTestCase(unittest.TestCase):
         assert author.last_name == "sagong"
         assert author.first_name == "sukjun"
 
-        # 오타가 발생할 수 있음
-        res = self.blog_svc.mod_author_partial(
-            id, list_name="sagong", first_name="sukjun"
-        )
-        assert res
+        # 오타는 변경하지 않고 실패한다.
+        with self.assertRaises(InvalidField):
+            self.blog_svc.mod_author_partial(
+                id, list_name="sagong", first_name="sukjun"
+            )
+        self.blog_svc.mod_author_partial(id, first_name="sukjun")
 
+        # 읽은 뒤에 변경되었으므로 이전 author 로는 update 할 수 없다.
+        author.first_name = "stale"
+        with self.assertRaises(VersionConflict):
+            self.blog_svc.mod_author(author)
+
+        author = self.blog_svc.get_author_by_id(id)
         author.first_name = "hello"
         author.last_name = "world"
 
@@ -116,3 +149,704 @@ class BlotServiceTestCase(unittest.TestCase):
 
         posts = self.blog_svc.get_posts_by_category_name("javascript")
         assert len(posts) == 5
+
+    def test_tags_batch(self):
+        author_id = self.blog_svc.add_author("tag@example.com", "tagger")
+        author = self.blog_svc.get_author_by_id(author_id)
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = self.blog_svc.db.engine
+        sqlalchemy.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            tags = [f"tag{idx}" for idx in range(20)]
+            post_id = self.blog_svc.add_post("title", "article", author, tags=tags)
+        finally:
+            sqlalchemy.event.remove(
+                engine, "before_cursor_execute", before_cursor_execute
+            )
+        tag_selects = [st for st in statements if "FROM blog_tag" in st]
+        assert len(tag_selects) == 2
+
+        post = self.blog_svc.get_post_by_id(post_id)
+        assert sorted(tag.name for tag in post.tags) == sorted(tags)
+
+        # 이미 있는 tag 와 새로운 tag 섞어서 수정
+        new_tags = ["tag0", "tag1", "new", "new"]
+        assert self.blog_svc.mod_post_partial(post_id, new_tags=new_tags)
+        post = self.blog_svc.get_post_by_id(post_id)
+        assert sorted(tag.name for tag in post.tags) == ["new", "tag0", "tag1"]
+        assert len(self.blog_svc.get_tags()) == 21
+
+    def test_bulk_import(self):
+        def records():
+            yield {"type": "category", "name": "python"}
+            for idx in range(10):
+                yield {"type": "author", "email": f"{idx}@example.com", "name": f"a{idx}"}
+            for idx in range(95):
+                yield {
+                    "type": "post",
+                    "title": f"title {idx}",
+                    "article": "article",
+                    "author_email": f"{idx % 10}@example.com",
+                    "category": "python",
+                    "tags": ["pip", f"tag{idx % 3}"],
+                }
+            yield {"type": "post", "title": "x", "author_email": "nobody@example.com"}
+            # 잘못된 record 는 batch 를 실패시키지 않고 skipped 에 남는다.
+            yield {"type": "author", "name": "no email"}
+            yield {"type": "post", "title": "x", "date_published": "yesterday"}
+            yield {"type": "post", "title": "x", "tags": "not a list"}
+
+        post_inserts = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO blog_post "):
+                post_inserts.append(executemany)
+
+        engine = self.blog_svc.db.engine
+        sqlalchemy.event.listen(engine, "before_cursor_execute", count)
+        try:
+            report = self.blog_svc.bulk_import(records(), batch_size=20)
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", count)
+        # post 는 batch 마다 executemany 한번으로 입력한다.
+        assert post_inserts == [True] * 6
+        assert len(report.batches) == 6
+        assert not report.errors
+        assert sum(batch.posts for batch in report.batches) == 95
+        assert report.batches[-1].skipped == [
+            "author without email",
+            "invalid tags: 'not a list'",
+            "unknown author: nobody@example.com",
+            "invalid date_published: 'yesterday'",
+        ]
+        assert report.rows_per_sec > 0
+
+        author = self.blog_svc.get_author_by_email("3@example.com")
+        posts = self.blog_svc.get_posts_by_author(author, limit=20)
+        assert len(posts) == 10
+        post = self.blog_svc.get_post_by_id(posts[0].id)
+        assert post.category.name == "python"
+        assert sorted(tag.name for tag in post.tags)[0] == "pip"
+        assert len(self.blog_svc.get_tags()) == 4
+
+        # 중복 author 는 unique 충돌을 무시한다.
+        report = self.blog_svc.bulk_import(
+            [{"type": "author", "email": "3@example.com", "name": "dup"}]
+        )
+        assert not report.errors
+
+        # export 한 ISO 문자열 date_published 를 그대로 다시 입력할 수 있다.
+        exported = next(iter(self.blog_svc.export_posts(batch_size=1)))
+        report = self.blog_svc.bulk_import(
+            [dict(exported, type="post", date_published="2021-03-04T05:06:07+09:00")]
+        )
+        assert (report.batches[0].posts, report.batches[0].skipped) == (1, [])
+        (post,) = self.blog_svc.get_archive_posts(2021, 3)
+        assert post.date_published == datetime.datetime(2021, 3, 3, 20, 6, 7)
+
+    def test_posts_page(self):
+        author_id = self.blog_svc.add_author("page@example.com", "pager")
+        author = self.blog_svc.get_author_by_id(author_id)
+        self.blog_svc.add_category("python")
+        category = self.blog_svc.get_category_by_name("python")
+        post_ids = [
+            self.blog_svc.add_post(f"title {idx}", "article", author, category)
+            for idx in range(7)
+        ]
+
+        for order_by in ["id", "date_published"]:
+            ids, cursor = [], None
+            while True:
+                page = self.blog_svc.get_posts_by_author_page(
+                    author, limit=3, cursor=cursor, order_by=order_by
+                )
+                ids.extend(post.id for post in page)
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert ids == list(reversed(post_ids))
+
+        # 다음 page 는 (author_id, date_published, id) index 에서 cursor 위치를 바로 찾는다.
+        statements = []
+        engine = self.blog_svc.db.engine
+        record = lambda *args: statements.append(args[2:4])  # noqa: E731
+        page = self.blog_svc.get_posts_by_author_page(
+            author, limit=3, order_by="date_published"
+        )
+        sqlalchemy.event.listen(engine, "before_cursor_execute", record)
+        try:
+            self.blog_svc.get_posts_by_author_page(
+                author, limit=3, cursor=page.next_cursor, order_by="date_published"
+            )
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", record)
+        plan = explain(engine, *statements[0])
+        assert plan[0].startswith(
+            "SEARCH blog_post USING INDEX ix_blog_post_author_id_date_published_id "
+            "(author_id=? AND date_published<?)"
+        ), plan
+
+        page = self.blog_svc.get_posts_by_category_name_page("python", limit=5)
+        assert [post.id for post in page] == list(reversed(post_ids))[:5]
+        page = self.blog_svc.get_posts_by_category_name_page(
+            "python", limit=5, cursor=page.next_cursor
+        )
+        assert [post.id for post in page] == list(reversed(post_ids))[5:]
+        assert page.next_cursor is None
+
+        with self.assertRaises(InvalidCursor):
+            self.blog_svc.get_posts_by_author_page(author, cursor="garbage")
+
+    def test_archive(self):
+        dates = [
+            datetime.datetime(2020, 12, 31, 23),
+            datetime.datetime(2021, 1, 1),
+            datetime.datetime(2021, 1, 15),
+            datetime.datetime(2021, 1, 15),
+            datetime.datetime(2021, 3, 2),
+        ]
+        self.blog_svc.bulk_import(
+            [
+                {"type": "post", "title": f"t{idx}", "date_published": date}
+                for idx, date in enumerate(dates)
+            ]
+        )
+        post_id = self.blog_svc.add_post("now", "a", None)
+
+        months = self.blog_svc.get_archive_months(2021)
+        assert [(m.month, m.post_count) for m in months] == [(3, 1), (1, 3)]
+        now = datetime.datetime.utcnow()
+        assert str(self.blog_svc.get_archive_months()[0]) == f"{now:%Y-%m} (1)"
+
+        page = self.blog_svc.get_archive_posts(2021, 1, limit=2)
+        assert [post.title for post in page] == ["t3", "t2"]
+        page = self.blog_svc.get_archive_posts(2021, 1, limit=2, cursor=page.next_cursor)
+        assert [post.title for post in page] == ["t1"]
+        assert page.next_cursor is None
+        page = self.blog_svc.get_archive_posts(2020, limit=5)
+        assert [post.title for post in page] == ["t0"]
+        with self.assertRaises(InvalidArchiveDate):
+            self.blog_svc.get_archive_posts(2021, 13)
+        with self.assertRaises(InvalidArchiveDate):
+            self.blog_svc.get_archive_posts(0)
+
+        page = self.blog_svc.get_recent_posts(limit=4)
+        assert [post.id for post in page][0] == post_id
+        assert [post.title for post in page][1:] == ["t4", "t3", "t2"]
+        page = self.blog_svc.get_recent_posts(limit=4, cursor=page.next_cursor)
+        assert [post.title for post in page] == ["t1", "t0"]
+
+        with self.blog_svc.db.session_scope() as s:
+            s.execute("DELETE FROM blog_post_month WHERE month = 3")
+            s.execute("UPDATE blog_post_month SET post_count = 9 WHERE month = 1")
+        assert self.blog_svc.reconcile_post_counts()["months"] == 2
+        months = self.blog_svc.get_archive_months(2021)
+        assert [(m.month, m.post_count) for m in months] == [(3, 1), (1, 3)]
+
+    def test_cache(self):
+        class GetOnlyCache(CacheBackend):
+            def get(self, key):
+                return MISSING
+
+        # 구현하지 않은 method 가 있으면 만들 때 실패한다.
+        with self.assertRaises(TypeError):
+            GetOnlyCache()
+
+        cache = MemoryCache(maxsize=2)
+        blog_svc = BlogService(cache=cache)
+        author_id = blog_svc.add_author("cache@example.com", "cached")
+
+        author = blog_svc.get_author_by_id(author_id)
+        author.name = "changed locally"
+        author = blog_svc.get_author_by_id(author_id)
+        assert author.name == "cached"
+        assert cache.stats()["hits"] == 1
+
+        assert blog_svc.get_author_by_email("cache@example.com").id == author_id
+        blog_svc.mod_author_partial(author_id, name="renamed")
+        assert blog_svc.get_author_by_id(author_id).name == "renamed"
+        assert blog_svc.get_author_by_email("cache@example.com").name == "renamed"
+
+        post_id = blog_svc.add_post("title", "article", author, tags=["a"])
+        assert blog_svc.get_post_by_id(post_id).author.name == "renamed"
+        blog_svc.mod_post_partial(post_id, new_title="new title", new_tags=["b"])
+        post = blog_svc.get_post_by_id(post_id)
+        assert post.title == "new title"
+        assert [tag.name for tag in post.tags] == ["b"]
+        blog_svc.mod_author_partial(author_id, name="again")
+        assert blog_svc.get_post_by_id(post_id).author.name == "again"
+
+        assert cache.stats()["size"] <= 2
+        assert cache.stats()["evictions"] > 0
+
+        with self.assertRaises(CategoryNotExist):
+            blog_svc.get_category_by_name("cached")
+        blog_svc.add_category("cached")
+        assert blog_svc.get_category_by_name("cached").name == "cached"
+
+    def test_post_page_cache(self):
+        page_cache = PostPageCache(maxsize=2, mmap_size=4096)
+        blog_svc = BlogService(page_cache=page_cache)
+        author_id = blog_svc.add_author("page@example.com", "page")
+        author = blog_svc.get_author_by_id(author_id)
+        category = blog_svc.get_category_by_id(blog_svc.add_category("python"))
+        post_ids = [
+            blog_svc.add_post(f"t{idx}", f"a{idx}", author, category, ["a", "b"])
+            for idx in range(4)
+        ]
+        with self.assertRaises(PostNotExist):
+            blog_svc.get_post_page(0)
+
+        page = blog_svc.get_post_page(post_ids[0])
+        assert str(page) == str(blog_svc.get_post_by_id(post_ids[0]))
+        assert page.tag_names == ["a", "b"]
+
+        queries = []
+        engine = blog_svc.db.engine
+        count = lambda *args: queries.append(args[2])  # noqa: E731
+        for post_id in post_ids:
+            blog_svc.get_post_page(post_id)
+        # memory 에서 밀려난 page 는 mmap tier 에서 읽는다.
+        sqlalchemy.event.listen(engine, "before_cursor_execute", count)
+        try:
+            for idx, post_id in enumerate(post_ids):
+                assert blog_svc.get_post_page(post_id).title == f"t{idx}"
+            assert queries == []
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", count)
+        stats = blog_svc.page_cache_stats()
+        assert stats["size"] == 2
+        assert stats["mmap_hits"] > 0
+
+        blog_svc.mod_post_partial(post_ids[0], new_title="new", new_tags=["c"])
+        page = blog_svc.get_post_page(post_ids[0])
+        assert (page.title, page.tag_names) == ("new", ["c"])
+        blog_svc.mod_author_partial(author_id, name="renamed")
+        assert all(
+            blog_svc.get_post_page(post_id).author_name == "renamed"
+            for post_id in post_ids
+        )
+        blog_svc.add_comment(post_ids[1], author, "comment")
+        assert blog_svc.get_post_page(post_ids[1]).comment_count == 1
+
+        # 읽는 동안 바뀌어서 지워진 post 의 이전 page 는 저장하지 않는다.
+        page_cache.clear()
+        generation = page_cache.generation()
+        with blog_svc.db.session_scope(read_only=True) as s:
+            old_page = load_pages(s, [post_ids[2]])[post_ids[2]]
+        blog_svc.mod_post_partial(post_ids[2], new_title="changed")
+        page_cache.set(old_page, generation)
+        assert page_cache.stats()["stale_sets"] == 1
+        assert blog_svc.get_post_page(post_ids[2]).title == "changed"
+
+        # 다른 process 의 변경은 ttl 이 지나면 반영된다.
+        blog_svc = BlogService(page_cache=PostPageCache(ttl=0))
+        assert blog_svc.get_post_page(post_ids[3]).title == "t3"
+        assert blog_svc.get_post_page(post_ids[3]).title == "t3"
+        assert blog_svc.page_cache_stats()["expirations"] == 1
+
+    def test_view_counter(self):
+        counter = ViewCounter(self.blog_svc.db, flush_size=5)
+        blog_svc = BlogService(view_counter=counter)
+        author = blog_svc.get_author_by_id(blog_svc.add_author("v@example.com", "v"))
+        post_ids = [blog_svc.add_post(f"t{idx}", "a", author) for idx in range(3)]
+
+        blog_svc.add_view(post_ids[1], 2)
+        blog_svc.add_view(post_ids[2])
+        assert counter.pending() == {post_ids[1]: 2, post_ids[2]: 1}
+        # flush_size 에 도달하면 flush
+        blog_svc.add_view(post_ids[1], 2)
+        assert counter.pending() == {}
+
+        blog_svc.add_view(post_ids[0])
+        counter.stop()
+        posts = blog_svc.get_most_viewed_posts(limit=2)
+        assert [post.id for post in posts] == [post_ids[1], post_ids[2]]
+        assert [post.views for post in posts] == [4, 1]
+        # 조회수는 post 수정이 아니므로 updated_at 은 그대로 둔다.
+        assert all(post.updated_at is None for post in posts)
+
+    def test_comments(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("c@example.com", "commenter")
+        )
+        post_ids = [self.blog_svc.add_post(f"t{idx}", "a", author) for idx in range(3)]
+        comment_ids = [
+            self.blog_svc.add_comment(post_ids[0], author, f"comment {idx}")
+            for idx in range(5)
+        ]
+        self.blog_svc.add_comment(post_ids[1], author, "other")
+        with self.assertRaises(PostNotExist):
+            self.blog_svc.add_comment(0, author, "nothing")
+
+        assert self.blog_svc.get_post_by_id(post_ids[0]).comment_count == 5
+
+        page = self.blog_svc.get_comments(post_ids[0], limit=3)
+        assert [comment.id for comment in page] == comment_ids[:3]
+        assert page[0].author.name == "commenter"
+        page = self.blog_svc.get_comments(post_ids[0], limit=3, cursor=page.next_cursor)
+        assert [comment.id for comment in page] == comment_ids[3:]
+        assert page.next_cursor is None
+
+        comments = self.blog_svc.get_comments_by_posts(post_ids)
+        assert [len(comments[post_id]) for post_id in post_ids] == [5, 1, 0]
+        comments = self.blog_svc.get_comments_by_posts(post_ids, limit_per_post=2)
+        assert [comment.id for comment in comments[post_ids[0]]] == comment_ids[:2]
+
+        assert self.blog_svc.delete_comment(comment_ids[0])
+        post = self.blog_svc.get_post_by_id(post_ids[0])
+        assert post.comment_count == 4
+        # comment 는 post 수정이 아니므로 updated_at 은 그대로 둔다.
+        assert post.updated_at is None
+        with self.assertRaises(CommentNotExist):
+            self.blog_svc.delete_comment(comment_ids[0])
+
+    def test_search_posts(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("s@example.com", "searcher")
+        )
+        python_id = self.blog_svc.add_post(
+            "python packaging", "how to use pip and wheel " * 20, author
+        )
+        self.blog_svc.add_post("javascript", "npm is like pip for javascript", author)
+        for idx in range(3):
+            self.blog_svc.add_post(f"pip tip {idx}", "pip install", author)
+
+        page = self.blog_svc.search_posts("pip", limit=3)
+        assert len(page) == 3
+        page2 = self.blog_svc.search_posts("pip", limit=3, cursor=page.next_cursor)
+        assert len(page2) == 2
+        assert page2.next_cursor is None
+        assert not {result.id for result in page} & {result.id for result in page2}
+
+        results = self.blog_svc.search_posts("wheel pip")
+        assert [result.id for result in results] == [python_id]
+        assert results[0].title == "python packaging"
+        assert len(results[0].snippet) < 200
+
+        # 수정하면 index 도 변경
+        self.blog_svc.mod_post_partial(python_id, new_article="only setuptools now")
+        assert len(self.blog_svc.search_posts("wheel")) == 0
+        assert len(self.blog_svc.search_posts("setuptools")) == 1
+        assert len(self.blog_svc.search_posts("(*")) == 0
+
+        self.blog_svc.db.rebuild_search_index()
+        assert len(self.blog_svc.search_posts("setuptools")) == 1
+
+    def test_post_summaries(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("sum@example.com", "summarizer")
+        )
+        self.blog_svc.add_category("python")
+        category = self.blog_svc.get_category_by_name("python")
+        post_ids = [
+            self.blog_svc.add_post(
+                f"title {idx}", "x" * 1000, author, category, ["b", f"a{idx}"]
+            )
+            for idx in range(4)
+        ]
+
+        page = self.blog_svc.get_post_summaries_by_author(author, limit=3)
+        assert [summary.id for summary in page] == list(reversed(post_ids))[:3]
+        summary = page[0]
+        assert summary.author_name == "summarizer"
+        assert summary.category_name == "python"
+        assert summary.tag_names == ["a3", "b"]
+        assert summary.excerpt is None
+        page = self.blog_svc.get_post_summaries_by_author(
+            author, limit=3, cursor=page.next_cursor
+        )
+        assert [summary.id for summary in page] == post_ids[:1]
+
+        page = self.blog_svc.get_post_summaries_by_category_name(
+            "python", limit=10, excerpt_length=10
+        )
+        assert len(page) == 4
+        assert page[0].excerpt == "x" * 10
+
+        summary = self.blog_svc.get_post_summary(post_ids[0])
+        assert summary.title == "title 0"
+        with self.assertRaises(PostNotExist):
+            self.blog_svc.get_post_summary(0)
+        assert self.blog_svc.get_post_article(post_ids[0]) == "x" * 1000
+
+    def test_load_profiles(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("p@example.com", "profiler")
+        )
+        post_id = self.blog_svc.add_post("title", "article", author, tags=["a", "b"])
+
+        post = self.blog_svc.get_posts_by_author(author, profile="summary")[0]
+        assert post.tags == []
+        assert post.author.name == "profiler"
+        with self.assertRaises(sqlalchemy.orm.exc.DetachedInstanceError):
+            post.article
+
+        post = self.blog_svc.get_posts_by_author_page(author, profile="card")[0]
+        assert sorted(tag.name for tag in post.tags) == ["a", "b"]
+
+        post = self.blog_svc.get_post_by_id(post_id)
+        assert post.article == "article"
+        assert len(post.tags) == 2
+        # 잘못된 profile 은 cursor 가 있는 method 에서도 InvalidProfile 이다.
+        for call in [
+            lambda: self.blog_svc.get_post_by_id(post_id, profile="unknown"),
+            lambda: self.blog_svc.get_posts_by_author(author, profile="unknown"),
+            lambda: self.blog_svc.get_posts_by_author_page(author, profile="unknown"),
+            lambda: self.blog_svc.get_recent_posts(profile="unknown"),
+        ]:
+            with self.assertRaises(InvalidProfile):
+                call()
+
+    def test_query_profiler(self):
+        profiler = self.blog_svc.db.enable_profiling(
+            QueryProfiler(n_plus_one_threshold=3)
+        )
+        try:
+            author = self.blog_svc.get_author_by_id(
+                self.blog_svc.add_author("q@example.com", "q")
+            )
+            post_id = self.blog_svc.add_post(
+                "t", "a", author, tags=[f"tag{idx}" for idx in range(10)]
+            )
+            for _ in range(3):
+                self.blog_svc.get_post_summary(post_id)
+
+            stats = self.blog_svc.query_stats()
+            # tag 갯수와 상관없이 tag SELECT, INSERT, SELECT 와 post, association INSERT,
+            # tag post_count UPDATE, 월별 post_count INSERT
+            assert stats["add_post"]["calls"] == 1
+            assert stats["add_post"]["queries"] == 7
+            assert stats["get_post_summary"]["calls"] == 3
+            assert stats["get_post_summary"]["max_queries_per_call"] == 2
+            assert profiler.n_plus_one == deque()
+
+            @profile_calls
+            class Loader(object):
+                def load_each(self, db, post_ids):
+                    with db.session_scope() as s:
+                        return [s.query(BlogPost).get(id) for id in post_ids]
+
+            Loader().load_each(self.blog_svc.db, [post_id, 0, -1])
+            assert [record["method"] for record in profiler.n_plus_one] == ["load_each"]
+            assert 'method="add_post"' in profiler.to_prometheus()
+            assert "load_each" in json.loads(profiler.to_json())["methods"]
+        finally:
+            self.blog_svc.db.disable_profiling()
+        assert self.blog_svc.query_stats() == {}
+
+    def test_post_counts(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("tc@example.com", "tc")
+        )
+        python = self.blog_svc.get_category_by_id(self.blog_svc.add_category("python"))
+        db = self.blog_svc.get_category_by_id(self.blog_svc.add_category("db"))
+        post_id = self.blog_svc.add_post("t1", "a", author, python, tags=["a", "b"])
+        self.blog_svc.add_post("t2", "a", author, python, tags=["a"])
+        self.blog_svc.mod_post_partial(post_id, new_category=db, new_tags=["a", "c"])
+        self.blog_svc.bulk_import(
+            [
+                {"type": "post", "title": "t3", "category": "db", "tags": ["c", "a"]},
+                {"type": "post", "title": "t4", "tags": ["d"]},
+            ]
+        )
+
+        counts = {tag.name: tag.post_count for tag in self.blog_svc.get_tags()}
+        assert counts == {"a": 3, "b": 0, "c": 2, "d": 1}
+        assert self.blog_svc.get_category_by_name("python").post_count == 1
+        assert self.blog_svc.get_category_by_name("db").post_count == 2
+        assert self.blog_svc.reconcile_post_counts() == {
+            "tags": 0,
+            "categories": 0,
+            "months": 0,
+        }
+
+        top = self.blog_svc.get_top_tags(2)
+        assert [tag.name for tag in top] == ["a", "c"]
+        page = self.blog_svc.get_tags_page(limit=3)
+        assert [tag.name for tag in page] == ["a", "c", "d"]
+        page = self.blog_svc.get_tags_page(limit=3, cursor=page.next_cursor)
+        assert [tag.name for tag in page] == ["b"]
+        assert page.next_cursor is None
+
+        with self.blog_svc.db.session_scope() as s:
+            s.execute("UPDATE blog_tag SET post_count = 10 WHERE name IN ('a', 'b')")
+            s.execute("UPDATE blog_category SET post_count = 10 WHERE name = 'db'")
+        assert self.blog_svc.reconcile_post_counts() == {
+            "tags": 2,
+            "categories": 1,
+            "months": 0,
+        }
+        assert [tag.name for tag in self.blog_svc.get_top_tags(1)] == ["a"]
+        assert self.blog_svc.get_top_tags(1)[0].post_count == 3
+        # post_count 는 category 수정이 아니므로 updated_at 은 그대로 둔다.
+        for name in ["python", "db"]:
+            category = self.blog_svc.get_category_by_name(name)
+            assert category.post_count == {"python": 1, "db": 2}[name]
+            assert category.updated_at is None
+
+    def test_transaction(self):
+        blog_svc = BlogService(cache=MemoryCache())
+        queries = []
+        engine = blog_svc.db.engine
+        count = lambda *args: queries.append(args[2])  # noqa: E731
+        sqlalchemy.event.listen(engine, "before_cursor_execute", count)
+        try:
+            with blog_svc.transaction():
+                author_id = blog_svc.add_author("tx@example.com", "tx")
+                category_id = blog_svc.add_category("tx")
+                executed = len(queries)
+                # 입력한 author, category 는 identity map 에서 가져온다.
+                author = blog_svc.get_author_by_id(author_id)
+                category = blog_svc.get_category_by_id(category_id)
+                assert len(queries) == executed
+
+                blog_svc.mod_author_partial(author_id, last_name="sagong")
+                post_id = blog_svc.add_post("t", "a", author, category, ["a", "b"])
+                blog_svc.mod_post_partial(post_id, new_tags=["b", "c"])
+                post = blog_svc.get_post_by_id(post_id)
+                assert author.last_name == "sagong"
+                assert sorted(tag.name for tag in post.tags) == ["b", "c"]
+                assert blog_svc.get_category_by_name("tx").post_count == 1
+                with blog_svc.independent():
+                    assert blog_svc.get_author_by_email("tx@example.com") is None
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", count)
+        assert blog_svc.get_author_by_email("tx@example.com").last_name == "sagong"
+        assert blog_svc.get_post_by_id(post_id).category.name == "tx"
+
+        with self.assertRaises(PostNotExist):
+            with blog_svc.transaction():
+                # sqlite 는 writer 가 하나라서 transaction 이 쓰기 전에 따로 commit 한다.
+                with blog_svc.independent():
+                    blog_svc.add_category("committed")
+                blog_svc.mod_author_partial(author_id, name="rolled back")
+                blog_svc.get_post_by_id(0)
+        assert blog_svc.get_author_by_id(author_id).name == "tx"
+        assert blog_svc.get_category_by_name("committed")
+
+    def test_version_conflict(self):
+        author_id = self.blog_svc.add_author("vc@example.com", "vc")
+        author = self.blog_svc.get_author_by_id(author_id)
+        assert author.version == 1
+        self.blog_svc.mod_author_partial(
+            author_id, expected_version=author.version, name="first"
+        )
+        with self.assertRaises(VersionConflict):
+            self.blog_svc.mod_author_partial(
+                author_id, expected_version=author.version, name="second"
+            )
+        author = self.blog_svc.get_author_by_id(author_id)
+        assert (author.name, author.version) == ("first", 2)
+        with self.assertRaises(AuthorNotExist):
+            self.blog_svc.mod_author_partial(0, name="nobody")
+
+        other_id = self.blog_svc.add_author("vc2@example.com", "vc2")
+        changes = {author_id: {"name": "batch"}, other_id: {"last_name": "two"}}
+        assert self.blog_svc.mod_authors_partial(changes) == 2
+        assert self.blog_svc.get_author_by_id(author_id).version == 3
+        assert self.blog_svc.get_author_by_id(other_id).last_name == "two"
+        with self.assertRaises(AuthorNotExist):
+            self.blog_svc.mod_authors_partial(
+                {other_id: {"name": "x"}, 0: {"name": "y"}}
+            )
+        assert self.blog_svc.get_author_by_id(other_id).name == "vc2"
+        with self.assertRaises(InvalidField):
+            self.blog_svc.mod_authors_partial({other_id: {"version": 10}})
+
+        python = self.blog_svc.get_category_by_id(self.blog_svc.add_category("python"))
+        post_id = self.blog_svc.add_post("title", "a", author, tags=["a", "b"])
+        version = self.blog_svc.get_post_by_id(post_id).version
+        self.blog_svc.mod_post_partial(
+            post_id, new_title="t2", new_tags=["b", "c"], expected_version=version
+        )
+        with self.assertRaises(VersionConflict):
+            self.blog_svc.mod_post_partial(
+                post_id, new_category=python, expected_version=version
+            )
+        with self.assertRaises(PostNotExist):
+            self.blog_svc.mod_post_partial(0, new_title="nothing")
+
+        post = self.blog_svc.get_post_by_id(post_id)
+        assert (post.title, post.version, post.category) == ("t2", version + 1, None)
+        assert sorted(tag.name for tag in post.tags) == ["b", "c"]
+        counts = {tag.name: tag.post_count for tag in self.blog_svc.get_tags()}
+        assert counts == {"a": 0, "b": 1, "c": 1}
+
+    def test_posts_by_tags(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("tg@example.com", "tg")
+        )
+        tag_sets = [["a"], ["a", "b"], ["b", "c"], ["a", "b", "c"], ["c"], ["a", "b"]]
+        post_ids = [
+            self.blog_svc.add_post(f"t{idx}", "a", author, tags=tags)
+            for idx, tags in enumerate(tag_sets)
+        ]
+
+        page = self.blog_svc.get_posts_by_tags(["a", "b"], mode="all", limit=2)
+        assert [post.id for post in page] == [post_ids[5], post_ids[3]]
+        page = self.blog_svc.get_posts_by_tags(
+            ["b", "a"], mode="all", cursor=page.next_cursor, limit=2
+        )
+        assert [post.id for post in page] == [post_ids[1]]
+        assert page.next_cursor is None
+
+        page = self.blog_svc.get_posts_by_tags(["c", "a", "nothing"], limit=4)
+        assert [post.id for post in page] == post_ids[5:1:-1]
+        page = self.blog_svc.get_posts_by_tags(
+            ["c", "a", "nothing"], cursor=page.next_cursor, limit=4
+        )
+        assert [post.id for post in page] == post_ids[1::-1]
+        assert page.next_cursor is None
+
+        assert len(self.blog_svc.get_posts_by_tags(["a", "nothing"], "all")) == 0
+        assert len(self.blog_svc.get_posts_by_tags(["nothing"])) == 0
+        with self.assertRaises(InvalidCursor):
+            self.blog_svc.get_posts_by_tags(["a"], mode="none")
+
+    def test_export_posts(self):
+        author = self.blog_svc.get_author_by_id(
+            self.blog_svc.add_author("ex@example.com", "exporter")
+        )
+        category = self.blog_svc.get_category_by_id(
+            self.blog_svc.add_category("python")
+        )
+        post_ids = [
+            self.blog_svc.add_post(f"t{idx}", "a", author, category, [f"tag{idx % 2}"])
+            for idx in range(5)
+        ]
+
+        posts = list(self.blog_svc.export_posts(batch_size=2))
+        assert [post["id"] for post in posts] == post_ids
+        assert posts[0]["author_email"] == "ex@example.com"
+        assert posts[0]["category"] == "python"
+        assert posts[1]["tags"] == ["tag1"]
+        resumed = self.blog_svc.export_posts(after_id=post_ids[2], batch_size=2)
+        assert [post["id"] for post in resumed] == post_ids[3:]
+
+        path = tempfile.mkdtemp()
+        report = self.blog_svc.export_posts_to(f"{path}/posts.jsonl.gz", batch_size=2)
+        assert (report.posts, report.last_id) == (5, post_ids[-1])
+        with gzip.open(f"{path}/posts.jsonl.gz", "rt") as f:
+            assert [json.loads(line)["id"] for line in f] == post_ids
+
+        report = self.blog_svc.export_posts_to(f"{path}/posts.csv", format="csv")
+        # 이어쓰기는 header 없이 append 한다.
+        post_ids.append(self.blog_svc.add_post("new", "a", author))
+        self.blog_svc.export_posts_to(
+            f"{path}/posts.csv", format="csv", after_id=report.last_id
+        )
+        with open(f"{path}/posts.csv") as f:
+            rows = list(csv.DictReader(f))
+        assert [int(row["id"]) for row in rows] == post_ids
+        assert rows[0]["tags"] == "tag0"
+        assert rows[-1]["category"] == ""
+
+        stream = io.BytesIO()
+        self.blog_svc.export_posts_to(stream, compress=True)
+        assert len(gzip.decompress(stream.getvalue()).splitlines()) == 6
@@ -0,0 +1,264 @@
+import time
+import sqlite3
+import tempfile
+import unittest
+from sqlalchemy import text
+from database import Database, IndependentWriteError
+from database.migrate import LATEST_VERSION, current_version
+from database.model import BlogAuthor
+from service.blog import BlogService, CategoryNotExist
+from service.cache import NullCache
+from service.page_cache import PostPageCache
+
+
+# 처음 commit 의 model 로 만든 sqlite schema. blog_post_tag 의 foreign key 가 바뀌어 있다.
+BASELINE_SCHEMA = """
+CREATE TABLE blog_author (
+    id INTEGER NOT NULL,
+    email VARCHAR(45),
+    name VARCHAR(45),
+    first_name VARCHAR(45),
+    last_name VARCHAR(45),
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    UNIQUE (email)
+);
+CREATE TABLE blog_category (
+    id INTEGER NOT NULL,
+    name VARCHAR(20),
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE blog_tag (
+    id INTEGER NOT NULL,
+    name VARCHAR(20),
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_blog_tag_name ON blog_tag (name);
+CREATE TABLE blog_post (
+    id INTEGER NOT NULL,
+    title VARCHAR(144),
+    article VARCHAR,
+    date_published DATETIME,
+    views INTEGER,
+    author_id INTEGER,
+    category_id INTEGER,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(author_id) REFERENCES blog_author (id),
+    FOREIGN KEY(category_id) REFERENCES blog_category (id)
+);
+CREATE TABLE blog_post_tag (
+    tag_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    PRIMARY KEY (tag_id, post_id),
+    FOREIGN KEY(tag_id) REFERENCES blog_post (id),
+    FOREIGN KEY(post_id) REFERENCES blog_tag (id)
+);
+CREATE TABLE blog_comment (
+    id INTEGER NOT NULL,
+    content VARCHAR(250),
+    author_id INTEGER,
+    post_id INTEGER,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(author_id) REFERENCES blog_author (id),
+    FOREIGN KEY(post_id) REFERENCES blog_post (id)
+);
+"""
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def test_engine_shared(self):
+        db1 = Database()
+        db2 = Database()
+        assert db1.engine is db2.engine
+        assert db1.Session is db2.Session
+
+    def test_pool_stats(self):
+        db = Database()
+        with db.session_scope() as s:
+            s.execute("SELECT 1")
+            stats = db.pool_stats()
+            assert stats["checked_out"] == 1
+        stats = db.pool_stats()
+        assert stats["checked_out"] == 0
+        assert stats["wait_count"] >= 1
+        assert stats["timeouts"] == 0
+
+    def test_read_replicas(self):
+        path = tempfile.mkdtemp()
+        replica_urls = [
+            f"sqlite:///{path}/replica1.db",
+            f"sqlite:///{path}/missing/replica2.db",
+            f"sqlite:///{path}/replica3.db",
+        ]
+        db = Database(f"sqlite:///{path}/primary.db", replica_urls)
+        db.sticky_seconds = 0
+        db.create_all()
+        with db.session_scope() as s:
+            s.add(BlogAuthor(email="r@example.com", name="primary"))
+        db.sync_replicas()
+
+        def read_name():
+            with db.session_scope(read_only=True) as s:
+                return s.query(BlogAuthor.name).scalar()
+
+        def read_file():
+            with db.session_scope(read_only=True) as s:
+                return s.get_bind().url.database
+
+        # 연결되지 않는 replica2 는 제외하고 나머지를 번갈아 사용한다.
+        assert {read_file() for _ in range(4)} == {
+            f"{path}/replica1.db",
+            f"{path}/replica3.db",
+        }
+        assert [r["healthy"] for r in db.pool_stats()["replicas"]] == [
+            True,
+            False,
+            True,
+        ]
+
+        # replica 에는 sync_replicas 전까지 반영되지 않는다.
+        with db.session_scope() as s:
+            s.query(BlogAuthor).update({"name": "changed"})
+        assert read_name() == "primary"
+        with db.use_primary():
+            assert read_name() == "changed"
+        db.sticky_seconds = 60
+        assert read_name() == "changed"
+
+    def test_upgrade(self):
+        path = f"{tempfile.mkdtemp()}/old.db"
+        conn = sqlite3.connect(path)
+        conn.executescript(BASELINE_SCHEMA)
+        # 처음 schema 의 relationship 은 tag_id 에 post id, post_id 에 tag id 를 저장했다.
+        # post 2 에 tag 1, tag 2
+        conn.executescript(
+            """
+            INSERT INTO blog_author (id, name, created_at)
+            VALUES (1, 'a', '2021-01-01 00:00:00.000000');
+            INSERT INTO blog_category (id, name, created_at)
+            VALUES (1, 'c', '2021-01-01 00:00:00.000000');
+            INSERT INTO blog_tag VALUES (1, 't1');
+            INSERT INTO blog_tag VALUES (2, 't2');
+            INSERT INTO blog_post (id, title, article, date_published, views,
+                author_id, category_id, created_at)
+            VALUES (1, 'title', 'old article', '2021-03-04 00:00:00.000000', 0, 1, 1,
+                '2021-01-01 00:00:00.000000');
+            INSERT INTO blog_post (id, title, article, date_published, views,
+                author_id, category_id, created_at)
+            VALUES (2, 'tagged', 'b', '2021-03-05 00:00:00.000000', 0, 1, 1,
+                '2021-01-01 00:00:00.000000');
+            INSERT INTO blog_post (id, title, article, date_published, views,
+                author_id, category_id, created_at)
+            VALUES (3, 'undated', 'c', NULL, 0, 1, 1, '2021-01-02 00:00:00.000000');
+            INSERT INTO blog_post_tag VALUES (2, 1);
+            INSERT INTO blog_post_tag VALUES (2, 2);
+            INSERT INTO blog_comment (id, content, author_id, post_id, created_at)
+            VALUES (1, 'c', 1, 1, '2021-01-01 00:00:00.000000');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(f"sqlite:///{path}")
+
+        def foreign_keys():
+            with db.engine.connect() as conn:
+                return conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+
+        # upgrade 전에는 바뀐 foreign key 때문에 검사하지 않는다.
+        assert foreign_keys() == 0
+        changes = db.upgrade()
+        assert foreign_keys() == 1
+        assert changes.tables == ["blog_post_month"]
+        assert "blog_post.comment_count" in changes.columns
+        assert "ix_blog_post_author_id_id" in changes.indexes
+        assert changes.versions == list(range(1, LATEST_VERSION + 1))
+        with db.engine.connect() as conn:
+            assert current_version(conn) == LATEST_VERSION
+            # data 는 그대로 두고 추가한 column 을 채운다.
+            assert conn.execute(
+                text("SELECT title, comment_count, version FROM blog_post ORDER BY id")
+            ).all() == [("title", 1, 1), ("tagged", 0, 1), ("undated", 0, 1)]
+            # 채운 값은 수정이 아니므로 updated_at 은 그대로 둔다.
+            for table in ["blog_post", "blog_category"]:
+                assert conn.execute(
+                    text(f"SELECT updated_at FROM {table} WHERE updated_at IS NOT NULL")
+                ).all() == []
+            assert conn.execute(
+                text("SELECT tag_id, post_id FROM blog_post_tag ORDER BY tag_id")
+            ).all() == [(1, 2), (2, 2)]
+            assert conn.execute(
+                text("SELECT post_count FROM blog_tag ORDER BY id")
+            ).all() == [(1,), (1,)]
+            # 비어 있는 date_published 는 created_at 으로 채우고 월별 post 수에 넣는다.
+            assert conn.execute(
+                text("SELECT date_published FROM blog_post WHERE id = 3")
+            ).scalar() == "2021-01-02 00:00:00.000000"
+            assert conn.execute(
+                text("SELECT * FROM blog_post_month ORDER BY year, month")
+            ).all() == [(2021, 1, 1), (2021, 3, 2)]
+            assert conn.execute(
+                text("SELECT rowid FROM blog_post_fts WHERE blog_post_fts MATCH 'old'")
+            ).all() == [(1,)]
+        # 이미 최신이면 아무것도 하지 않는다.
+        assert not db.upgrade()
+
+        bs = BlogService(cache=NullCache(), page_cache=PostPageCache(maxsize=0))
+        bs.db = db
+        assert [post.id for post in bs.get_posts_by_tags(["t1"])] == [2]
+        assert [tag.name for tag in bs.get_post_by_id(2).tags] == ["t1", "t2"]
+        assert bs.get_post_by_id(1).tags == []
+        author = bs.get_author_by_id(1)
+        post_id = bs.add_post("new", "article", author, tags=["t1", "t3"])
+        assert [post.id for post in bs.get_posts_by_tags(["t1"])] == [post_id, 2]
+        assert [tag.post_count for tag in bs.get_top_tags(1)] == [2]
+        ids, cursor = [], None
+        while True:
+            page = bs.get_posts_by_author_page(
+                author, limit=1, cursor=cursor, order_by="date_published"
+            )
+            ids.extend(post.id for post in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert ids == [post_id, 2, 1, 3]
+
+    def test_independent_write_after_transaction_write(self):
+        db = Database(f"sqlite:///{tempfile.mkdtemp()}/independent.db")
+        db.upgrade()
+        bs = BlogService(cache=NullCache(), page_cache=PostPageCache(maxsize=0))
+        bs.db = db
+        author_id = bs.add_author("i@example.com", "i")
+        author = bs.get_author_by_id(author_id)
+
+        # transaction 이 write 한 뒤의 independent write 는 lock 을 기다리지 않고 실패한다.
+        start = time.monotonic()
+        with self.assertRaises(IndependentWriteError):
+            with bs.transaction():
+                bs.add_post("title", "article", author)
+                with bs.independent():
+                    # read 는 바깥 transaction 을 기다리지 않는다.
+                    assert bs.get_author_by_id(author_id).name == "i"
+                    bs.add_category("python")
+        assert time.monotonic() - start < 1
+        with self.assertRaises(CategoryNotExist):
+            bs.get_category_by_name("python")
+        assert bs.get_posts_by_author(bs.get_author_by_id(author_id)) == []
+
+        # 문서의 사용법. independent write 를 먼저 하면 rollback 되어도 남는다.
+        with self.assertRaises(RuntimeError):
+            with bs.transaction():
+                with bs.independent():
+                    bs.add_category("python")
+                bs.add_post("title", "article", bs.get_author_by_id(author_id))
+                raise RuntimeError("rollback")
+        assert bs.get_category_by_name("python")
+        assert bs.get_posts_by_author(bs.get_author_by_id(author_id)) == []
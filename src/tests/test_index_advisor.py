@@ -0,0 +1,19 @@
+import os
+import tempfile
+import unittest
+from database import Database
+from index_advisor import advise
+
+
+class IndexAdvisorTestCase(unittest.TestCase):
+    def test_no_full_scans(self):
+        path = os.path.join(tempfile.mkdtemp(), "advisor.db")
+        flagged = advise(Database(f"sqlite:///{path}"))
+        assert not flagged, [str(captured) for captured in flagged]
+
+    def test_refuses_existing_database(self):
+        path = os.path.join(tempfile.mkdtemp(), "existing.db")
+        db = Database(f"sqlite:///{path}")
+        db.upgrade()
+        with self.assertRaises(ValueError):
+            advise(db)